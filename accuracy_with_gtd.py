@@ -3,9 +3,11 @@ import pandas as pd
 from datetime import datetime
 from helpers import create_result_directory, is_subdomain, extract_domain_name, pad_list, social_media_domain_main_part, extract_main_part
 import os
-from company_websites_validation import validate_agentsOutput_domains, validate_working_domains, validate_linkgrabber_domains
+from company_websites_validation import validate_agentsOutput_domains, validate_working_domains, validate_linkgrabber_domains, plan_agents_output_validation_searches
 import json
 from company_websites import process_single_website
+from search_planner import execute_search_plan
+from helpers import get_serper_costs
 import re
 
 def clean_url(url):
@@ -13,7 +15,7 @@ def clean_url(url):
     url = re.sub(r'^www\.', '', url)
     return f"https://{url}"
 
-def awgtd(df,link_grabber_data,company_name,company_website,start_time,filtered_agents_output_list):
+def awgtd(df,link_grabber_data,company_name,company_website,start_time,filtered_agents_output_list,search_plan=None):
         if True:
             print("Processing file...")
             gtd = df['GTD'].tolist()
@@ -68,6 +70,18 @@ def awgtd(df,link_grabber_data,company_name,company_website,start_time,filtered_
                         whole_process_llm_costs += exec_info.get('total_cost_USD', 0.0)
 
             company_domain = clean_url(company_website)
+
+            if search_plan is not None:
+                plan_agents_output_validation_searches(search_plan, agentsOutput, company_name, company_domain)
+                plan_credits = execute_search_plan(search_plan, log_file_paths['log'])
+                whole_process_serper_credits += plan_credits
+
+                with open(log_file_paths['serper'], 'a') as f:
+                    f.write("\n\n")
+                    f.write(f"Search plan (validating domains):\n")
+                    f.write(f"Total Credits: {plan_credits}\n")
+                    f.write(f"Total Cost in USD: {get_serper_costs(plan_credits)}\n")
+
             response = validate_agentsOutput_domains(agentsOutput, company_name, company_domain, copyright_text,
                                                      log_file_paths)
 
@@ -0,0 +1,98 @@
+import os
+import atexit
+import threading
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from playwright.sync_api import sync_playwright
+from resource_blocking import blocking_heavy_resources
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Each pool worker keeps one long-lived Chromium, so a link grab or reachability check costs a
+# navigation instead of a browser launch. Every checkout still gets a page in a fresh browser
+# context, so cookies, storage and consent state never carry over from one company's site to the next.
+# The sync Playwright API is bound to the thread that started it, hence the thread-local state.
+_pool_state = threading.local()
+
+def is_browser_headless():
+    return os.getenv('BROWSER_HEADLESS', 'true').lower() == 'true'
+
+def get_max_pages_per_browser():
+    return int(os.getenv('BROWSER_MAX_PAGES_PER_BROWSER', 100))
+
+def _get_pool_state():
+    if getattr(_pool_state, 'pid', None) != os.getpid():
+        # A forked worker inherits the parent's handles but not its Playwright connection.
+        _pool_state.pid = os.getpid()
+        _pool_state.playwright = None
+        _pool_state.browser = None
+        _pool_state.pages_served = 0
+
+        atexit.register(close_browser_pool)
+        # Pool workers leave through multiprocessing's own exit path, which skips atexit.
+        Finalize(None, close_browser_pool, exitpriority=10)
+
+    return _pool_state
+
+def _close_browser(state):
+    if state.browser is not None:
+        try:
+            state.browser.close()
+        except Exception:
+            pass
+
+    state.browser = None
+    state.pages_served = 0
+
+def _get_browser(state):
+    if state.browser is not None and (not state.browser.is_connected() or state.pages_served >= get_max_pages_per_browser()):
+        # Recycle the browser every so many pages to keep leaked renderer memory in check.
+        _close_browser(state)
+
+    if state.browser is None:
+        if state.playwright is None:
+            state.playwright = sync_playwright().start()
+
+        state.browser = state.playwright.chromium.launch(headless=is_browser_headless(), args=['--disable-http2'])
+
+    return state.browser
+
+def acquire_page():
+    state = _get_pool_state()
+    browser = _get_browser(state)
+    state.pages_served += 1
+
+    return browser.new_context().new_page()
+
+def release_page(page):
+    # Closing the context drops the page along with its cookies and storage.
+    try:
+        page.context.close()
+    except Exception:
+        pass
+
+@contextmanager
+def browser_page(allow_resources=None):
+    page = acquire_page()
+
+    try:
+        with blocking_heavy_resources(page, allow_resources):
+            yield page
+    finally:
+        release_page(page)
+
+def close_browser_pool():
+    state = _pool_state
+
+    if getattr(state, 'pid', None) != os.getpid():
+        return
+
+    _close_browser(state)
+
+    if state.playwright is not None:
+        try:
+            state.playwright.stop()
+        except Exception:
+            pass
+        state.playwright = None
@@ -1,13 +1,14 @@
 from langchain_openai import AzureChatOpenAI
+from llm_rate_limiter import get_llm_http_clients
+from llm_usage import usage_collector, llm_usage_scope
 import os
-from scrapegraphai.graphs import SmartScraperGraph
 from dotenv import load_dotenv
 import json
 from crewai import Agent, Task, Crew
-from tools import search_multiple_page
-from helpers import remove_trailing_slash, get_scrapegraph_config, tokenize_text
+from tools import search_many, search_hits_to_dicts
+from helpers import remove_trailing_slash, get_scrapegraph_config, get_page_source
+from scrape_cache import run_scraper_graph
 import json_repair
-import time
 
 load_dotenv()
 
@@ -15,7 +16,9 @@ default_llm = AzureChatOpenAI(
     azure_endpoint='',
     model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
     openai_api_version=os.getenv('OPENAI_API_VERSION'),
-    temperature=0
+    temperature=0,
+    callbacks=[usage_collector],
+    **get_llm_http_clients()
 )
 
 os.environ['AZURE_OPENAI_ENDPOINT'] = os.getenv('AZURE_OPENAI_ENDPOINT')
@@ -27,6 +30,9 @@ os.environ['AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME'] = os.getenv('AZURE_OPENAI_
 
 graph_config = get_scrapegraph_config()
 
+COMPANY_STRUCTURE_LINKS_PROMPT_VERSION = 1
+COMPANY_STRUCTURES_PROMPT_VERSION = 1
+
 subsidiary_finder_link_grabber_agent = Agent(
     role="Link Researcher",
     goal="Gather links that can help identify the subsidiaries/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.",
@@ -79,19 +85,9 @@ def get_links_for_company_structures(main_company, log_file_path, url):
             Sample Output: {sample_json_output}
             If no relevant links are found, return: {sample_json_output2}
         """
-        smart_search_graph = SmartScraperGraph(
-            prompt=prompt,
-            source = url,
-            config=graph_config,
+        return run_scraper_graph(
+            'company_structure_links', COMPANY_STRUCTURE_LINKS_PROMPT_VERSION, prompt, url, graph_config
         )
-        result = smart_search_graph.run()
-
-        graph_exec_info = smart_search_graph.get_execution_info()
-
-        return {
-            'result': result,
-            'exec_info': graph_exec_info
-        }
     except Exception as e:
         with open(log_file_path['log'], 'a') as f:
             f.write(f"Exception when getting links for company structures using Scrapegraph AI for {url}: {e}")
@@ -100,14 +96,16 @@ def get_links_for_company_structures(main_company, log_file_path, url):
 
 def get_links_for_company_structures_for_private_company(main_company, log_file_path):
     try:
-        subsidiary_finder_search_results = search_multiple_page("all subsidiaries of " + main_company, 100, 3, log_file_path)
-        brands_finder_search_results = search_multiple_page("all brands of " + main_company, 100, 3, log_file_path)
-        acquisitions_finder_search_results = search_multiple_page("all acquisitions of " + main_company, 100, 3, log_file_path)
+        subsidiary_finder_search_results, brands_finder_search_results, acquisitions_finder_search_results = search_many([
+            ("all subsidiaries of " + main_company, 100, 3),
+            ("all brands of " + main_company, 100, 3),
+            ("all acquisitions of " + main_company, 100, 3)
+        ], log_file_path)
 
         subsidiary_finder_link_grabber_task = Task(
             description=(
                 f"""
-                    ```{subsidiary_finder_search_results['all_results']}```
+                    ```{search_hits_to_dicts(subsidiary_finder_search_results['all_results'])}```
 
                     From the above provided context, your task is to gather links that can help identify the subsidiaries, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
                     Follow these steps to ensure accurate and relevant results:
@@ -155,7 +153,7 @@ def get_links_for_company_structures_for_private_company(main_company, log_file_
         brands_finder_link_grabber_task = Task(
             description=(
                 f"""
-                    ```{brands_finder_search_results['all_results']}```
+                    ```{search_hits_to_dicts(brands_finder_search_results['all_results'])}```
 
                     From the above provided context, your task is to gather links that can help identify the brands, subbrands, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
                     Follow these steps to ensure accurate and relevant results:
@@ -203,7 +201,7 @@ def get_links_for_company_structures_for_private_company(main_company, log_file_
         acquisitions_finder_link_grabber_task = Task(
                 description=(
                     f"""
-                        ```{acquisitions_finder_search_results['all_results']}```
+                        ```{search_hits_to_dicts(acquisitions_finder_search_results['all_results'])}```
 
                         From the above provided context, your task is to gather links that can help identify the acquisitions, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
                         Follow these steps to ensure accurate and relevant results:
@@ -248,159 +246,6 @@ def get_links_for_company_structures_for_private_company(main_company, log_file_
                 expected_output="A list of URLs that can help identify the acquisitions/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.",
             )
 
-        subsidiary_finder_prompt_tokens = tokenize_text(
-            f"""
-                Link Researcher
-                Gather links that can help identify the brands/sub-brands/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are a skilled web researcher with expertise in finding relevant information online.
-                Your task is to gather links that can help identify the web links that can help to find out the subsidiaries/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are proficient in using search engines like Google to find web pages related to the subsidiaries/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of companies.
-                You know how to select multiple relevant URLs from search results that are likely to contain information about the subsidiaries/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of a company.
-
-                ```{subsidiary_finder_search_results['all_results']}```
-
-                From the above provided context, your task is to gather links that can help identify the subsidiaries, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
-                Follow these steps to ensure accurate and relevant results:
-                - Select multiple relevant URLs from the provided context that are likely to contain information about the subsidiaries, entities, trusts, charitable organizations, and companies with more than 50% partnership of {main_company}.
-                - Ensure the selected links are from reputable sources such as:
-                    - Corporate Filings and Legal Documents (SEC, EDGAR)
-                    - Company Websites
-                    - Latest Annual reports of the company {main_company}
-                    - Business Databases
-                    - News and Press Releases about acquisitions/investments by the company {main_company}
-                    - Social Media and LinkedIn of the company {main_company}
-                    - Patents and Trademarks of the company {main_company}
-                    - FOIA Requests (For Government Contractors)
-                    - Networking and Industry Contacts
-                    - Legal Databases
-                    - Craft.co
-                    - Zoominfo
-                    - Pitchbook
-                    - SEC.gov
-                    - Bloomberg
-                    - Reuters
-                    - Hoovers
-                    - MarketWatch
-                    - Yahoo Finance
-                    - Forbes
-                    - Business Insider
-                    - If no relevant links are found, return "[]".
-                - Make sure, those relevant urls should be unique and not repeated.
-
-                Output the results in the following JSON format:
-                ["URL1", "URL2", "URL3"]
-
-                Example:
-                ["https://www.example.com/subsidiaries-of-alphabet", "https://www.example.com/alphabet-brands"]
-
-                Important note: Every step mentioned above must be followed to get the required results.
-                Do not provide any other texts or information in the output as it will not work with the further process.
-                Do not include ``` or any other such characters in the output.
-            """
-        )
-
-        brands_finder_prompt_tokens = tokenize_text(
-            f"""
-                Link Researcher
-                Gather links that can help identify the brands/sub-brands/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are a skilled web researcher with expertise in finding relevant information online.
-                Your task is to gather links that can help identify the web links that can help to find out the brands/sub-brands/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are proficient in using search engines like Google to find web pages related to the brands/sub-brands/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of companies.
-                You know how to select multiple relevant URLs from search results that are likely to contain information about the brands/sub-brands/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of a company.
-
-                ```{brands_finder_search_results['all_results']}```
-
-                From the above provided context, your task is to gather links that can help identify the brands, subbrands, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
-                Follow these steps to ensure accurate and relevant results:
-                - Select multiple relevant URLs from the provided context that are likely to contain information about the brands, subbrands, entities, trusts, charitable organizations, and companies with more than 50% partnership of {main_company}.
-                - Ensure the selected links are from reputable sources such as:
-                    - Corporate Filings and Legal Documents (SEC, EDGAR)
-                    - Company Websites
-                    - Latest Annual reports of the company {main_company}
-                    - Business Databases
-                    - News and Press Releases about acquisitions/investments by the company {main_company}
-                    - Social Media and LinkedIn of the company {main_company}
-                    - Patents and Trademarks of the company {main_company}
-                    - FOIA Requests (For Government Contractors)
-                    - Networking and Industry Contacts
-                    - Legal Databases
-                    - Craft.co
-                    - Zoominfo
-                    - Pitchbook
-                    - SEC.gov
-                    - Bloomberg
-                    - Reuters
-                    - Hoovers
-                    - MarketWatch
-                    - Yahoo Finance
-                    - Forbes
-                    - Business Insider
-                    - If no relevant links are found, return "[]".
-                - Make sure, those relevant urls should be unique and not repeated.
-
-                Output the results in the following JSON format:
-                ["URL1", "URL2", "URL3"]
-
-                Example:
-                ["https://www.example.com/subsidiaries-of-alphabet", "https://www.example.com/alphabet-brands"]
-
-                Important note: Every step mentioned above must be followed to get the required results.
-                Do not provide any other texts or information in the output as it will not work with the further process.
-                Do not include ``` or any other such characters in the output.
-            """
-        )
-
-        acquisitions_finder_prompt_tokens = tokenize_text(
-            f"""
-                Link Researcher
-                Gather links that can help identify the acquisitions/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are a skilled web researcher with expertise in finding relevant information online.
-                Your task is to gather links that can help identify the web links that can help to find out the acquisitions/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of the given company.
-                You are proficient in using search engines like Google to find web pages related to the acquisitions/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of companies.
-                You know how to select multiple relevant URLs from search results that are likely to contain information about the acquisitions/trusts/entities/global operations/charitable organizations/companies with more than 50% partnership of a company.
-
-                ```{acquisitions_finder_search_results['all_results']}```
-
-                From the above provided context, your task is to gather links that can help identify the acquisitions, trusts, entities, charitable organizations, and companies with more than 50% partnership of the given company.
-                Follow these steps to ensure accurate and relevant results:
-                - Select multiple relevant URLs from the provided context that are likely to contain information about the acquisitions, entities, trusts, charitable organizations, and companies with more than 50% partnership of {main_company}.
-                - Ensure the selected links are from reputable sources such as:
-                    - Corporate Filings and Legal Documents (SEC, EDGAR)
-                    - Company Websites
-                    - Latest Annual reports of the company {main_company}
-                    - Business Databases
-                    - News and Press Releases about acquisitions/investments by the company {main_company}
-                    - Social Media and LinkedIn of the company {main_company}
-                    - Patents and Trademarks of the company {main_company}
-                    - FOIA Requests (For Government Contractors)
-                    - Networking and Industry Contacts
-                    - Legal Databases
-                    - Craft.co
-                    - Zoominfo
-                    - Pitchbook
-                    - SEC.gov
-                    - Bloomberg
-                    - Reuters
-                    - Hoovers
-                    - MarketWatch
-                    - Yahoo Finance
-                    - Forbes
-                    - Business Insider
-                    - If no relevant links are found, return "[]".
-                - Make sure, those relevant urls should be unique and not repeated.
-
-                Output the results in the following JSON format:
-                ["URL1", "URL2", "URL3"]
-
-                Example:
-                ["https://www.example.com/subsidiaries-of-alphabet", "https://www.example.com/alphabet-brands"]
-
-                Important note: Every step mentioned above must be followed to get the required results.
-                Do not provide any other texts or information in the output as it will not work with the further process.
-                Do not include ``` or any other such characters in the output.
-            """
-        )
-
         trip_crew_subsidiary_research = Crew(
             agents=[
                 subsidiary_finder_link_grabber_agent,
@@ -416,34 +261,9 @@ def get_links_for_company_structures_for_private_company(main_company, log_file_
             allow_delegation=False,
             cache=True
         )
-        time.sleep(3)
-        trip_crew_subsidiary_research.kickoff()
-
-        subsidiary_finder_completions_tokens = tokenize_text(
-            f"""
-                Thought: I now can give a great answer
-                Final Answer: {str(subsidiary_finder_link_grabber_task.output.raw)}
-            """
-        )
-
-        brands_finder_completions_tokens = tokenize_text(
-            f"""
-                Thought: I now can give a great answer
-                Final Answer: {str(brands_finder_link_grabber_task.output.raw)}
-            """
-        )
-
-        acquisitions_finder_completions_tokens = tokenize_text(
-            f"""
-                Thought: I now can give a great answer
-                Final Answer: {str(acquisitions_finder_link_grabber_task.output.raw)}
-            """
-        )
 
-        llm_usage = {
-            'prompt_tokens': subsidiary_finder_prompt_tokens + brands_finder_prompt_tokens + acquisitions_finder_prompt_tokens,
-            'completion_tokens': subsidiary_finder_completions_tokens + brands_finder_completions_tokens + acquisitions_finder_completions_tokens
-        }
+        with llm_usage_scope('company_structure_links') as llm_usage:
+            trip_crew_subsidiary_research.kickoff()
 
         subsidiary_finder_links = json_repair.loads(subsidiary_finder_link_grabber_task.output.raw)
         brands_finder_links = json_repair.loads(brands_finder_link_grabber_task.output.raw)
@@ -487,19 +307,9 @@ def get_company_structures(main_company, log_file_path, url):
 
             If no subsidiaries are found then return {sample_json_output2}
         """
-        smart_search_graph = SmartScraperGraph(
-            prompt=prompt,
-            source=url,
-            config=graph_config,
+        return run_scraper_graph(
+            'company_structures', COMPANY_STRUCTURES_PROMPT_VERSION, prompt, get_page_source(url, log_file_path['log']), graph_config
         )
-        
-        result = smart_search_graph.run()
-        graph_exec_info = smart_search_graph.get_execution_info()
-
-        return {
-            'result': result,
-            'exec_info': graph_exec_info
-        }
     except Exception as e:
         with open(log_file_path['log'], 'a') as f:
             f.write(f"Exception when getting company structures using Scrapegraph AI for {url}: {e}")
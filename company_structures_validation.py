@@ -1,15 +1,19 @@
 from langchain_openai import AzureChatOpenAI
+from llm_rate_limiter import get_llm_http_clients
+from llm_usage import usage_collector, llm_usage_scope
+from structured_classifier import is_direct_classifier_enabled, classify, CompanyStructureValidation
+import json
 import json_repair
 import os
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process
 import streamlit as st
 import multiprocessing
-from helpers import process_worker_function, calculate_openai_costs, pad_list, tokenize_text
+from helpers import process_worker_function, calculate_openai_costs, pad_list
 import dill
 from functools import partial
-from tools import search_multiple_page
-import time
+from tools import search_multiple_page, search_hits_to_dicts
+from search_planner import add_planned_search
 
 load_dotenv()
 
@@ -20,101 +24,104 @@ model = AzureChatOpenAI(
     openai_api_version=os.getenv('OPENAI_API_VERSION'),
     api_key=os.getenv('AZURE_OPENAI_API_KEY'),
     model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
-    temperature=0
+    temperature=0,
+    callbacks=[usage_collector],
+    **get_llm_http_clients()
 )
 
-def process_single_company_structure_validation(main_company, subsidiary, log_file_paths):
-    try:
-        search_results = search_multiple_page(f"is {subsidiary} a part of {main_company}?", 10, 1, log_file_path=log_file_paths['log'])
-
-        company_structures_validation_researcher = Agent(
-            role='Corporate Relationship Analyst',
-            goal='Evaluate the relationship between {subsidiary} and {main_company} across multiple dimensions, including but not limited to subsidiary status, branding, acquisitions, partnerships, and organizational affiliations.',
-            verbose=True,
-            llm=model,
-            model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
-            backstory=(
-                """
-                As an expert in corporate affiliations and structures, you have developed an ability to discern complex corporate relationships using official documentation and reliable sources. You have a proven track record of accurately identifying the nature of business relationships, ensuring that all findings are grounded in verifiable data.
-                Your research is always directed towards official corporate sites or authoritative government records. This ensures that the information you gather is both relevant and legally sound. Each claim about a relationship is backed by solid evidence from trusted sources, eliminating any room for ambiguity or error.
-                Your role involves not only identifying these relationships but also documenting them in a way that can be easily understood and verified by stakeholders, ensuring clarity and accountability in corporate governance.
-                """
-            )
+def get_company_structure_validation_search_query(main_company, subsidiary):
+    return (f"is {subsidiary} a part of {main_company}?", 10, 1)
+
+def plan_company_structure_validation_searches(plan, agentsOutput, company_name):
+    for subsidiary in agentsOutput:
+        search_query, num_results, num_pages = get_company_structure_validation_search_query(company_name, subsidiary)
+        add_planned_search(plan, 'company_structure_validation', search_query, num_results, num_pages)
+
+def get_company_structure_validation_classifier_prompt(main_company, subsidiary, search_results):
+    return f"""
+Using the search results provided:
+
+{json.dumps(search_hits_to_dicts(search_results))}
+
+Determine if {subsidiary} is related to {main_company} as a subsidiary, brand, sub-brand, acquisition, trust, entity, global operation, charitable organization, or holds a significant partnership (>50% ownership).
+Focus exclusively on the information above. If no definitive information is available, answer 'N/A'. Cite the exact source that confirms the nature of the relationship.
+"""
+
+def run_company_structure_validation_classifier(main_company, subsidiary, search_results):
+    record, llm_usage = classify(
+        model,
+        "You are an expert in corporate affiliations and structures. Every claim you make about a relationship between companies is backed by a source you are given.",
+        get_company_structure_validation_classifier_prompt(main_company, subsidiary, search_results),
+        CompanyStructureValidation,
+        'company_structure_validation'
+    )
+
+    return [subsidiary, record.is_related, record.source], llm_usage
+
+def run_company_structure_validation_crew(main_company, subsidiary, search_results):
+    company_structures_validation_researcher = Agent(
+        role='Corporate Relationship Analyst',
+        goal='Evaluate the relationship between {subsidiary} and {main_company} across multiple dimensions, including but not limited to subsidiary status, branding, acquisitions, partnerships, and organizational affiliations.',
+        verbose=True,
+        llm=model,
+        model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
+        backstory=(
+            """
+            As an expert in corporate affiliations and structures, you have developed an ability to discern complex corporate relationships using official documentation and reliable sources. You have a proven track record of accurately identifying the nature of business relationships, ensuring that all findings are grounded in verifiable data.
+            Your research is always directed towards official corporate sites or authoritative government records. This ensures that the information you gather is both relevant and legally sound. Each claim about a relationship is backed by solid evidence from trusted sources, eliminating any room for ambiguity or error.
+            Your role involves not only identifying these relationships but also documenting them in a way that can be easily understood and verified by stakeholders, ensuring clarity and accountability in corporate governance.
+            """
         )
+    )
 
-        company_structures_validation_task = Task(
-            description=(
-                """
-                Using the search results provided:
-
-                {search_results}
+    company_structures_validation_task = Task(
+        description=(
+            """
+            Using the search results provided:
 
-                Determine if {subsidiary} is related to {main_company} as a subsidiary, brand, sub-brand, acquisition, trust, entity, global operation, charitable organization, or holds a significant partnership (>50% ownership).
-                Focus exclusively on the information above. Be meticulous in validating the source of each piece of data. If no definitive information is available, specify 'N/A'. Incorrect or speculative entries will result in penalties.
-                It is critical to cite the exact source that confirms the nature of the relationship. Ensure that all responses adhere to the expected output format to avoid penalties.
+            {search_results}
 
-                Sample Output:
-                ['{subsidiary}', 'Yes/No', 'Source URL']
+            Determine if {subsidiary} is related to {main_company} as a subsidiary, brand, sub-brand, acquisition, trust, entity, global operation, charitable organization, or holds a significant partnership (>50% ownership).
+            Focus exclusively on the information above. Be meticulous in validating the source of each piece of data. If no definitive information is available, specify 'N/A'. Incorrect or speculative entries will result in penalties.
+            It is critical to cite the exact source that confirms the nature of the relationship. Ensure that all responses adhere to the expected output format to avoid penalties.
 
-                Important notes:
-                - Do not provide any other texts or information in the output as it will not work with the further process.
-                - Do not include ``` or any other such characters in the output.
-                """
-            ),
-            agent=company_structures_validation_researcher,
-            expected_output="['{subsidiary}', 'Yes/No', 'Source URL']"  # Specify that a URL is expected for source verification
-        )
+            Sample Output:
+            ['{subsidiary}', 'Yes/No', 'Source URL']
 
-        prompt_tokens = tokenize_text(
-            f"""
-                Corporate Relationship Analyst.
-                Evaluate the relationship between {subsidiary} and {main_company} across multiple dimensions, including but not limited to subsidiary status, branding, acquisitions, partnerships, and organizational affiliations.
-                As an expert in corporate affiliations and structures, you have developed an ability to discern complex corporate relationships using official documentation and reliable sources. You have a proven track record of accurately identifying the nature of business relationships, ensuring that all findings are grounded in verifiable data.
-                Your research is always directed towards official corporate sites or authoritative government records. This ensures that the information you gather is both relevant and legally sound. Each claim about a relationship is backed by solid evidence from trusted sources, eliminating any room for ambiguity or error.
-                Your role involves not only identifying these relationships but also documenting them in a way that can be easily understood and verified by stakeholders, ensuring clarity and accountability in corporate governance.
-                
-                Using the search results provided:
-
-                {search_results['all_results']}
-
-                Determine if {subsidiary} is related to {main_company} as a subsidiary, brand, sub-brand, acquisition, trust, entity, global operation, charitable organization, or holds a significant partnership (>50% ownership).
-                Focus exclusively on the information above. Be meticulous in validating the source of each piece of data. If no definitive information is available, specify 'N/A'. Incorrect or speculative entries will result in penalties.
-                It is critical to cite the exact source that confirms the nature of the relationship. Ensure that all responses adhere to the expected output format to avoid penalties.
-
-                Sample Output:
-                ['{subsidiary}', 'Yes/No', 'Source URL']
-                
-                Important notes:
-                - Do not provide any other texts or information in the output as it will not work with the further process.
-                - Do not include ``` or any other such characters in the output.
+            Important notes:
+            - Do not provide any other texts or information in the output as it will not work with the further process.
+            - Do not include ``` or any other such characters in the output.
             """
-        )
-
-        validation_crew = Crew(
-            agents=[company_structures_validation_researcher],
-            tasks=[company_structures_validation_task],
-            process=Process.sequential,
-            verbose=True
-        )
-
-        time.sleep(3)
+        ),
+        agent=company_structures_validation_researcher,
+        expected_output="['{subsidiary}', 'Yes/No', 'Source URL']"  # Specify that a URL is expected for source verification
+    )
+
+    validation_crew = Crew(
+        agents=[company_structures_validation_researcher],
+        tasks=[company_structures_validation_task],
+        process=Process.sequential,
+        verbose=True
+    )
+
+    with llm_usage_scope('company_structure_validation') as llm_usage:
         results = validation_crew.kickoff({
             'subsidiary': subsidiary,
             'main_company': main_company,
-            'search_results': search_results['all_results']
+            'search_results': search_hits_to_dicts(search_results)
         })
 
-        completion_tokens = tokenize_text(f"""
-            Thought: I now can give a great answer
-            Final Answer: {str(results.raw)}
-        """)
+    return json_repair.loads(results.raw), llm_usage
 
-        llm_usage = {
-            'prompt_tokens': prompt_tokens,
-            'completion_tokens': completion_tokens
-        }
+def process_single_company_structure_validation(main_company, subsidiary, log_file_paths):
+    try:
+        search_query, num_results, num_pages = get_company_structure_validation_search_query(main_company, subsidiary)
+        search_results = search_multiple_page(search_query, num_results, num_pages, log_file_path=log_file_paths['log'])
 
-        results = json_repair.loads(results.raw)
+        if is_direct_classifier_enabled():
+            results, llm_usage = run_company_structure_validation_classifier(main_company, subsidiary, search_results['all_results'])
+        else:
+            results, llm_usage = run_company_structure_validation_crew(main_company, subsidiary, search_results['all_results'])
 
         return {
             'results': results,
@@ -1,7 +1,10 @@
 import multiprocessing
 from crewai import Agent, Task, Crew, Process
 from langchain_openai import AzureChatOpenAI
-from tools import search_multiple_page
+from llm_rate_limiter import get_llm_http_clients
+from llm_usage import usage_collector, llm_usage_scope
+from structured_classifier import is_direct_classifier_enabled, classify, SubsidiaryWebsites
+from tools import search_many, iter_search_results, get_result_domains, search_hits_to_dicts
 import os
 import json_repair
 import streamlit as st
@@ -10,10 +13,11 @@ from functools import partial
 from helpers import extract_domain_name
 from copyright import get_copyright
 import re
-from helpers import extract_year, extract_main_part, get_links, process_worker_function, tokenize_text, extract_domain_name
+from helpers import extract_year, extract_main_part, get_links, process_worker_function, extract_domain_name
 import dill
 from dotenv import load_dotenv
-import time
+from search_planner import add_planned_search
+from link_grabber import grab_links, is_async_link_grabber_enabled
 
 load_dotenv()
 
@@ -21,7 +25,9 @@ default_llm = AzureChatOpenAI(
     azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
     model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
     openai_api_version=os.getenv('OPENAI_API_VERSION'),
-    temperature=0
+    temperature=0,
+    callbacks=[usage_collector],
+    **get_llm_http_clients()
 )
 
 def process_single_website(website, log_file_path):
@@ -78,97 +84,111 @@ def process_website_and_get_copyrights(websites, log_file_paths):
         }
     }
 
-def process_subsidiary(subsidiary, main_company, sample_expert_website_researcher_output, log_file_paths):
-    try:
-        search_results1 = search_multiple_page(f"{subsidiary} a part of {main_company} official website", 10, 1, log_file_paths['log'])
-        search_results2 = search_multiple_page(f"{subsidiary} official website", 10, 1, log_file_paths['log'])
-        search_results3 = search_multiple_page(f"{subsidiary}", 10, 1, log_file_paths['log'])
+def get_subsidiary_search_queries(subsidiary, main_company):
+    return [
+        (f"{subsidiary} a part of {main_company} official website", 10, 1),
+        (f"{subsidiary} official website", 10, 1),
+        (f"{subsidiary}", 10, 1)
+    ]
+
+def plan_official_website_searches(plan, file_company_list, main_company):
+    for subsidiary in file_company_list:
+        for search_query, num_results, num_pages in get_subsidiary_search_queries(subsidiary, main_company):
+            add_planned_search(plan, 'official_websites', search_query, num_results, num_pages)
+
+def get_subsidiary_websites_classifier_prompt(subsidiary, main_company, search_results):
+    return f"""
+{search_results}
+
+Identify all potential official websites for the company {subsidiary}, which is a subsidiary of {main_company}, based on the search results provided above.
+
+Instructions:
+1. Thoroughly review each search result to ensure accuracy.
+2. Identify the most relevant and official websites associated with {subsidiary}.
+3. Consider factors such as domain authority, content relevance, and official branding.
+4. Exclude unrelated third-party profiles (e.g., Bloomberg, Meta, LinkedIn, Pitchbook, App store, Wikipedia, Encyclopedia) unless they are the primary online presence of the company.
+"""
+
+def run_subsidiary_websites_classifier(subsidiary, main_company, search_results):
+    record, llm_usage = classify(
+        default_llm,
+        "You are a meticulous web researcher who finds company websites from search results, and only gives websites you have identified correctly.",
+        get_subsidiary_websites_classifier_prompt(subsidiary, main_company, search_results),
+        SubsidiaryWebsites,
+        'subsidiary_websites'
+    )
+
+    return {subsidiary: record.websites}, llm_usage
+
+def run_subsidiary_websites_crew(subsidiary, main_company, search_results, sample_expert_website_researcher_output):
+    expert_website_researcher_agent_1 = Agent(
+        role="Expert Website Researcher",
+        goal="Accurately identify the main website of the company {company_name} , which is a part of {main_company}.",
+        verbose=True,
+        llm=default_llm,
+        model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
+        allow_delegation=False,
+        backstory="""
+            You have been a part of {main_company} for many years and have a deep understanding of the company's operations and online presence.
+            As a seasoned investigator in the digital realm, you are a skilled web researcher capable of finding accurate company websites using search engines and verifying the information.
+            With years of being with {company_name}, you are well known about the ins and outs of this company.
+            You know all the websites with copyright same as main website of these.
+            You also are expert in google searching and using sites like crunchbase, and Pitch book, etc to find the company details and get the website.
+            You are meticulus and organized, and you only provide correct and precise data i.e. websites that you have identified correctly.""",
+    )
+
+    expert_website_researcher_task_1 = Task(
+        description=(
+            """
+                {search_results}
 
-        total_serper_credits = search_results1['serper_credits'] + search_results2['serper_credits'] + search_results3['serper_credits']
+                Your task is to identify all potential official websites for the company {company_name}, which is a subsidiary of {main_company}, based on the search results provided above.
+
+                Instructions:
+                1. Thoroughly review each search result to ensure accuracy.
+                2. Identify the most relevant and official websites associated with {company_name}.
+                3. Consider factors such as domain authority, content relevance, and official branding.
+                4. Ensure the websites are possible official websites of the given subsidiary.
+                6. Exclude unrelated third-party profiles (e.g., Bloomberg, Meta, LinkedIn, Pitchbook, App store, Wikipedia, Encyclopedia) unless they are the primary online presence of the company.
+                7. List all identified websites in a clear and organized manner.
+
+                Sample Output:
+                {sample_expert_website_researcher_output}
 
-        search_results = json.dumps(search_results1['all_results'] + search_results2['all_results'] + search_results3['all_results'])
-
-        expert_website_researcher_agent_1 = Agent(
-            role="Expert Website Researcher",
-            goal="Accurately identify the main website of the company {company_name} , which is a part of {main_company}.",
-            verbose=True,
-            llm=default_llm,
-            model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
-            allow_delegation=False,
-            backstory="""
-                You have been a part of {main_company} for many years and have a deep understanding of the company's operations and online presence.
-                As a seasoned investigator in the digital realm, you are a skilled web researcher capable of finding accurate company websites using search engines and verifying the information.
-                With years of being with {company_name}, you are well known about the ins and outs of this company.
-                You know all the websites with copyright same as main website of these.
-                You also are expert in google searching and using sites like crunchbase, and Pitch book, etc to find the company details and get the website.
-                You are meticulus and organized, and you only provide correct and precise data i.e. websites that you have identified correctly.""",
-        )
-
-        expert_website_researcher_task_1 = Task(
-            description=(
-                """
-                    {search_results}
-
-                    Your task is to identify all potential official websites for the company {company_name}, which is a subsidiary of {main_company}, based on the search results provided above.
-
-                    Instructions:
-                    1. Thoroughly review each search result to ensure accuracy.
-                    2. Identify the most relevant and official websites associated with {company_name}.
-                    3. Consider factors such as domain authority, content relevance, and official branding.
-                    4. Ensure the websites are possible official websites of the given subsidiary.
-                    6. Exclude unrelated third-party profiles (e.g., Bloomberg, Meta, LinkedIn, Pitchbook, App store, Wikipedia, Encyclopedia) unless they are the primary online presence of the company.
-                    7. List all identified websites in a clear and organized manner.
-
-                    Sample Output:
-                    {sample_expert_website_researcher_output}
-
-                    Important notes:
-                    - Every set of rules and steps mentioned above must be followed to get the required results.
-                    - Do not provide any other texts or information in the output as it will not work with the further process.
-                    - Do not include ``` or any other such characters in the output.
-                """
-            ),
-            agent=expert_website_researcher_agent_1,
-            expected_output="All possible official website of the company. {company_name}",
-        )
-
-        prompt_tokens = tokenize_text(
-            f"""
-                Expert Website Researcher.
-                Accurately identify the main website of the company {subsidiary} , which is a part of {main_company}.
-            
-                You have been a part of {main_company} for many years and have a deep understanding of the company's operations and online presence.
-                As a seasoned investigator in the digital realm, you are a skilled web researcher capable of finding accurate company websites using search engines and verifying the information.
-                With years of being with {subsidiary}, you are well known about the ins and outs of this company.
-                You know all the websites with copyright same as main website of these.
-                You also are expert in google searching and using sites like crunchbase, and Pitch book, etc to find the company details and get the website.
-                You are meticulus and organized, and you only provide correct and precise data i.e. websites that you have identified correctly.
+                Important notes:
+                - Every set of rules and steps mentioned above must be followed to get the required results.
+                - Do not provide any other texts or information in the output as it will not work with the further process.
+                - Do not include ``` or any other such characters in the output.
             """
-        )
-
-        expert_website_researcher_crew_1 = Crew(
-            agents=[expert_website_researcher_agent_1],
-            tasks=[expert_website_researcher_task_1],
-            process=Process.sequential,
-            verbose=1
-        )
-        
-        time.sleep(3)
+        ),
+        agent=expert_website_researcher_agent_1,
+        expected_output="All possible official website of the company. {company_name}",
+    )
+
+    expert_website_researcher_crew_1 = Crew(
+        agents=[expert_website_researcher_agent_1],
+        tasks=[expert_website_researcher_task_1],
+        process=Process.sequential,
+        verbose=1
+    )
+    
+    with llm_usage_scope('subsidiary_websites') as llm_usage:
         results = expert_website_researcher_crew_1.kickoff(inputs={"company_name": subsidiary, "main_company": main_company, "search_results": search_results, "sample_expert_website_researcher_output": sample_expert_website_researcher_output})
 
-        completions_tokens = tokenize_text(
-            f"""
-                Thought: I now can give a great answer
-                Final Answer: {str(results.raw)}
-            """
-        )
+    return json_repair.loads(results.raw), llm_usage
 
-        results = json_repair.loads(results.raw)
+def process_subsidiary(subsidiary, main_company, sample_expert_website_researcher_output, log_file_paths):
+    try:
+        search_results1, search_results2, search_results3 = search_many(get_subsidiary_search_queries(subsidiary, main_company), log_file_paths['log'])
 
-        llm_usage = {
-            'prompt_tokens': prompt_tokens,
-            'completion_tokens': completions_tokens
-        }
+        total_serper_credits = search_results1['serper_credits'] + search_results2['serper_credits'] + search_results3['serper_credits']
+
+        search_results = json.dumps(search_hits_to_dicts(search_results1['all_results'] + search_results2['all_results'] + search_results3['all_results']))
+
+        if is_direct_classifier_enabled():
+            results, llm_usage = run_subsidiary_websites_classifier(subsidiary, main_company, search_results)
+        else:
+            results, llm_usage = run_subsidiary_websites_crew(subsidiary, main_company, search_results, sample_expert_website_researcher_output)
 
         with open(log_file_paths['crew_ai'], 'a') as f:
             f.write("\n")
@@ -194,28 +214,31 @@ def process_subsidiary(subsidiary, main_company, sample_expert_website_researche
             'serper_credits': 0
         }
 
-def process_single_domain_research(main_part, log_file_paths):
-    domain_search_results = set()
-    search_results1 = search_multiple_page(f"site:{main_part}.*", 100, 3, log_file_paths['log'])
-    search_results2 = search_multiple_page(f"site:{main_part}.*.*", 100, 3, log_file_paths['log'])
-
-    search_results = search_results1['all_results'] + search_results2['all_results']
+def get_domain_research_search_queries(main_part):
+    return [
+        (f"site:{main_part}.*", 100, 3),
+        (f"site:{main_part}.*.*", 100, 3)
+    ]
 
-    for result in search_results:
-        try:
-            domain_search_results.add(extract_domain_name(result['link']))
+def plan_domain_research_searches(plan, website_urls):
+    for main_part in set(extract_main_part(website) for website in website_urls):
+        for search_query, num_results, num_pages in get_domain_research_search_queries(main_part):
+            # Only the first page is planned; later pages depend on the adaptive yield check.
+            add_planned_search(plan, 'domain_research', search_query, num_results, 1)
 
-            if "sitelinks" in result:
-                for sitelink in result["sitelinks"]:
-                    domain_search_results.add(extract_domain_name(sitelink['link']))
-        except KeyError:
-            continue
+def process_single_domain_research(main_part, log_file_paths):
+    domain_search_results = set()
+    seen_domains = set()
+    usage = {'serper_credits': 0}
 
-    total_seper_credits = search_results1['serper_credits'] + search_results2['serper_credits']
+    # Results are streamed so the domains of one page are extracted while the next page is in flight.
+    for search_query, num_results, num_pages in get_domain_research_search_queries(main_part):
+        for result in iter_search_results(search_query, num_results, num_pages, log_file_paths['log'], usage, adaptive=True, seen_domains=seen_domains):
+            domain_search_results.update(get_result_domains(result))
 
     return {
         'domain_search_results': domain_search_results,
-        'serper_credits': total_seper_credits
+        'serper_credits': usage['serper_credits']
     }
 
 def process_domain_research(website_urls, log_file_paths):
@@ -268,6 +291,15 @@ def process_link_grabber(website_urls, log_file_paths):
     progress_bar = st.progress(0)
     progress_step = 1 / total_urls
 
+    if is_async_link_grabber_enabled():
+        finished = []
+
+        def on_result(result):
+            finished.append(result)
+            progress_bar.progress(len(finished) * progress_step)
+
+        return grab_links(website_urls, log_file_paths['log'], on_result)
+
     get_links_with_log_file = partial(get_links, log_file_path=log_file_paths['log'])
 
     serialized_function = dill.dumps(get_links_with_log_file)
@@ -280,67 +312,46 @@ def process_link_grabber(website_urls, log_file_paths):
 
     return results
 
-def process_single_copyright_research(row, log_file_paths):
-    company_name = row['Company Name']
-    copyright = row['Copyright']
-    copyright_results = set()
+def get_copyright_search_queries(company_name, copyright):
+    excluded_sites = "-linkedin -quora -instagram -youtube -facebook -twitter -pinterest -snapchat -github -whatsapp -tiktok -reddit -x.com -amazon -vimeo"
+    search_queries = [f"'{copyright}' {excluded_sites}"]
 
     year = extract_year(copyright)
 
-    copyright_result1 = search_multiple_page(
-        f"'{copyright}' -linkedin -quora -instagram -youtube -facebook -twitter -pinterest -snapchat -github -whatsapp -tiktok -reddit -x.com -amazon -vimeo", 100, 3, log_file_paths['log'])
-    
     if year is not None:
-        copyright_result2 = search_multiple_page(
-            f"'© {year} {company_name}' -linkedin -quora -instagram -youtube -facebook -twitter -pinterest -snapchat -github -whatsapp -tiktok -reddit -x.com -amazon -vimeo", 100, 3, log_file_paths['log'])
-    else:
-        copyright_result2 = {
-            'all_results': [],
-            'serper_credits': 0
-        }
+        search_queries.append(f"'© {year} {company_name}' {excluded_sites}")
 
     words = copyright.split()
     filtered_words = [word for word in words if not re.search(r'\b(group|ltd)\b', word, re.IGNORECASE)]
     filtered_copyright = ' '.join(filtered_words)
-    filtered_copyright_ran_already = False
 
     if filtered_copyright != copyright:
-        filtered_copyright_ran_already = True
-        copyright_result3 = search_multiple_page(
-            f"'{filtered_copyright}' -linkedin -quora -instagram -youtube -facebook -twitter -pinterest -snapchat -github -whatsapp -tiktok -reddit -x.com -amazon -vimeo", 100, 3, log_file_paths['log'])
-    else:
-        copyright_result3 = {
-            'all_results': [],
-            'serper_credits': 0
-        }
-
-    copyright_result4 = {
-        'all_results': [],
-        'serper_credits': 0
-    }
-
-    if ( year is not None and filtered_copyright != ("© "+ year + " " + company_name)):
-        if filtered_copyright_ran_already is False:
-            copyright_result4 = search_multiple_page(
-                f"'{filtered_copyright}' -linkedin -quora -instagram -youtube -facebook -twitter -pinterest -snapchat -github -whatsapp -tiktok -reddit -x.com -amazon -vimeo", 100, 3, log_file_paths['log'])
+        search_queries.append(f"'{filtered_copyright}' {excluded_sites}")
+    elif year is not None and filtered_copyright != ("© "+ year + " " + company_name):
+        search_queries.append(f"'{filtered_copyright}' {excluded_sites}")
 
-    copyright_result = copyright_result1['all_results'] + copyright_result2['all_results'] + copyright_result3['all_results'] + copyright_result4['all_results']
+    return [(search_query, 100, 3) for search_query in search_queries]
 
-    for result in copyright_result:
-        try:
-            copyright_results.add(extract_domain_name(result['link']))
+def plan_copyright_research_searches(plan, unique_copyrights):
+    for index, row in unique_copyrights.iterrows():
+        for search_query, num_results, num_pages in get_copyright_search_queries(row['Company Name'], row['Copyright']):
+            # Only the first page is planned; later pages depend on the adaptive yield check.
+            add_planned_search(plan, 'copyright_research', search_query, num_results, 1)
 
-            if "sitelinks" in result:
-                for sitelink in result["sitelinks"]:
-                    copyright_results.add(extract_domain_name(sitelink['link']))
-        except KeyError:
-            continue
+def process_single_copyright_research(row, log_file_paths):
+    company_name = row['Company Name']
+    copyright = row['Copyright']
+    copyright_results = set()
+    seen_domains = set()
+    usage = {'serper_credits': 0}
 
-    total_serper_credits = copyright_result1['serper_credits'] + copyright_result2['serper_credits'] + copyright_result3['serper_credits'] + copyright_result4['serper_credits']
+    for search_query, num_results, num_pages in get_copyright_search_queries(company_name, copyright):
+        for result in iter_search_results(search_query, num_results, num_pages, log_file_paths['log'], usage, adaptive=True, seen_domains=seen_domains):
+            copyright_results.update(get_result_domains(result))
 
     return {
         'copyright_results': copyright_results,
-        'serper_credits': total_serper_credits
+        'serper_credits': usage['serper_credits']
     }
 
 def process_copyright_research(unique_copyrights, log_file_paths):
@@ -1,7 +1,9 @@
 from helpers import get_scrapegraph_config
 from dotenv import load_dotenv
-from scrapegraphai.graphs import SmartScraperGraph
 from langchain_openai import AzureChatOpenAI
+from llm_rate_limiter import get_llm_http_clients
+from llm_usage import usage_collector, llm_usage_scope
+from structured_classifier import get_classifier_engine, is_direct_classifier_enabled, classify, DomainValidation
 import os
 from crewai import Agent, Task, Crew, Process
 import multiprocessing
@@ -9,12 +11,15 @@ import streamlit as st
 from functools import partial
 import dill
 from helpers import process_worker_function, extract_domain_name, is_working_domain, is_regional_domain_enhanced, translate_text, chunk_list, extract_main_part, social_media_domain_main_part, get_netloc, get_main_domain
-from tools import search_multiple_page
+from tools import search_multiple_page, search_hits_to_dicts
 import json_repair
-from helpers import calculate_openai_costs, tokenize_text, is_reachable
+from helpers import calculate_openai_costs, is_reachable, get_page_source
 import time
 import pandas as pd
 import json
+from search_planner import add_planned_search
+from scrape_cache import run_scraper_graph
+from shared_state import increment_counter, get_counters
 
 load_dotenv()
 
@@ -30,11 +35,17 @@ model = AzureChatOpenAI(
     openai_api_version=os.getenv('OPENAI_API_VERSION'),
     api_key=os.getenv('AZURE_OPENAI_API_KEY'),
     model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
-    temperature=0
+    temperature=0,
+    callbacks=[usage_collector],
+    **get_llm_http_clients()
 )
 
 graph_config = get_scrapegraph_config()
 
+WORKING_DOMAIN_PROMPT_VERSION = 1
+SEARCH_DOMAIN_OWNERSHIP_PROMPT_VERSION = 1
+LINKGRABBER_DOMAIN_OWNERSHIP_PROMPT_VERSION = 1
+
 def validate_working_single_domain(log_file_path, domain):
     try :
         is_valid_working_domain = is_working_domain(domain, log_file_path)
@@ -53,20 +64,15 @@ def validate_working_single_domain(log_file_path, domain):
             "Sample output format: {'isVisitable': 'Yes/No', 'reason': 'Explanation if No'}."
         )
         
-        smart_scraper_graph = SmartScraperGraph(
-            prompt=prompt,
-            source=domain,
-            config=graph_config,
-        )
-
-        result = smart_scraper_graph.run()
+        scrape = run_scraper_graph('working_domain', WORKING_DOMAIN_PROMPT_VERSION, prompt, get_page_source(domain, log_file_path['log']), graph_config)
+        result = scrape['result']
 
         if 'reason' in result:
             reason = result['reason']
         else:
             reason = ''
 
-        graph_exec_info = smart_scraper_graph.get_execution_info()
+        graph_exec_info = scrape['exec_info']
 
         return {
             'domain': domain,
@@ -80,261 +86,244 @@ def validate_working_single_domain(log_file_path, domain):
         print(f"Exception when validating domain using scrapegraph AI for {domain}: {e}")
         return {'domain': domain, 'isVisitable': 'No', 'reason': 'Exception when validating domain using scrapegraph AI', 'exec_info': None}
     
-def validate_single_correct_domains(log_file_paths, main_company, main_company_domain, main_copyright_text, domain):
-    try:
-        if domain == extract_domain_name(main_company_domain):
-            return {
-                'results': [domain, 'Yes', 'Main company domain', '', ''],
-                'llm_usage1': {
-                    'prompt_tokens': 0,
-                    'completion_tokens': 0
-                },
-                'llm_usage2': {
-                    'prompt_tokens': 0,
-                    'completion_tokens': 0,
-                    'total_cost_USD': 0
-                },
-                'serper_credits': 0
-            }
-
-        total_serper_credits = 0
+def get_domain_validation_search_query(main_company, domain):
+    return (f"site:{domain} a part of {main_company}?", 10, 1)
 
-        total_prompt_tokens2 = 0
-        total_completion_tokens2 = 0
-        total_cost_USD2 = 0
-
-        search_results = search_multiple_page(f"site:{domain} a part of {main_company}?", 10, 1, log_file_path=log_file_paths['log'])
-        total_serper_credits += search_results['serper_credits']
-        
-        if len(search_results['all_results']) == 0:
-            country_specific_domain = is_regional_domain_enhanced(domain)
-
-            if country_specific_domain is True:
-                translate_search_string = translate_text(f"site:{domain} a part of {main_company}?")
-
-                if translate_search_string['is_translated'] == 'Yes':
-                    search_results = search_multiple_page(translate_search_string['converted_text'], 10, 1, log_file_path=log_file_paths['log'])
-                    total_serper_credits += search_results['serper_credits']
-
-                    if len(search_results['all_results']) == 0:
-                        return {
-                            'results': [domain, 'No', 'No search results', '', ''],
-                            'llm_usage1': {
-                                'prompt_tokens': 0,
-                                'completion_tokens': 0
-                            },
-                            'llm_usage2': {
-                                'prompt_tokens': 0,
-                                'completion_tokens': 0,
-                                'total_cost_USD': 0
-                            },
-                            'serper_credits': total_serper_credits
-                        }
-                else:
-                    return {
-                        'results': [domain, 'No', 'No search results', '', ''],
-                        'llm_usage1': {
-                            'prompt_tokens': 0,
-                            'completion_tokens': 0
-                        },
-                        'llm_usage2': {
-                                'prompt_tokens': 0,
-                                'completion_tokens': 0,
-                                'total_cost_USD': 0
-                            },
-                        'serper_credits': total_serper_credits
-                    }
-            else:
-                return {
-                    'results': [domain, 'No', 'No search results', '', ''],
-                    'llm_usage1': {
-                        'prompt_tokens': 0,
-                        'completion_tokens': 0
-                    },
-                    'llm_usage2': {
-                        'prompt_tokens': 0,
-                        'completion_tokens': 0,
-                        'total_cost_USD': 0
-                    },
-                    'serper_credits': search_results['serper_credits']
-                }
-
-        domain_company_validation_researcher = Agent(
-            role='Domain Relationship Analyst',
-            goal='Validate the relationship between {domain} and {main_company}, assessing whether the domain is officially affiliated with the company. This includes investigating domain ownership, brand association, legal or business affiliations, and any partnerships or acquisitions involving the domain and the company.',
-            verbose=True,
-            llm=model,
-            model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
-            backstory=(
-                """
-                As an expert in domain ownership and corporate affiliations, you specialize in identifying the connections between domains and companies. You excel at conducting thorough research using official sources like WHOIS records, company websites, press releases, and legal documents to verify domain ownership and affiliations.
-                Your findings are grounded in verifiable data, ensuring that each conclusion about the relationship between a domain and a company is backed by solid, authoritative evidence. You prioritize clarity and accuracy, providing stakeholders with trustworthy information on domain affiliations.
-                In your role, you document the findings in a manner that is easy to understand and verify, making sure that all relationships are clearly defined and backed by strong evidence.
-                """
-            )
-        )
+def plan_agents_output_validation_searches(plan, domains, main_company, main_company_domain):
+    for domain in domains:
+        # The main company domain is accepted without a search.
+        if domain == extract_domain_name(main_company_domain):
+            continue
 
-        domain_company_validation_task = Task(
-            description=(
-                """
-                Using the search results provided:
+        search_query, num_results, num_pages = get_domain_validation_search_query(main_company, domain)
+        add_planned_search(plan, 'agents_output_validation', search_query, num_results, num_pages)
 
-                {search_results}
+def get_zero_domain_validation_usage():
+    return {
+        'llm_usage1': {
+            'prompt_tokens': 0,
+            'completion_tokens': 0
+        },
+        'llm_usage2': {
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_cost_USD': 0
+        }
+    }
 
-                Determine if the domain "{domain}" is associated with "{main_company}" through one of the following:
+def get_domain_validation_evidence(log_file_paths, main_company, main_company_domain, domain):
+    """
+    Runs the searches behind a domain's validation.
 
-                1. Official domain ownership
-                2. Entity association
-                3. Brand or sub-brand
-                4. Acquisition or partnership
+    Returns:
+        dict: {'result': ...} with the final validation result when no LLM call is needed, otherwise
+            {'search_results': [...], 'serper_credits': ...}.
+    """
+    if domain == extract_domain_name(main_company_domain):
+        return {'result': {'results': [domain, 'Yes', 'Main company domain', '', ''], **get_zero_domain_validation_usage(), 'serper_credits': 0}}
 
-                Focus on clear evidence of association, using both exact and partial matches. Consider the context and relationships described.
+    total_serper_credits = 0
 
-                **Note:** If the domain is **for sale**, return 'No'
+    search_query, num_results, num_pages = get_domain_validation_search_query(main_company, domain)
+    search_results = search_multiple_page(search_query, num_results, num_pages, log_file_path=log_file_paths['log'])
+    total_serper_credits += search_results['serper_credits']
 
-                If the relationship is valid, return 'Yes'. If not, return 'No' and provide appropriate reason for your decision.
+    if len(search_results['all_results']) == 0:
+        country_specific_domain = is_regional_domain_enhanced(domain)
 
-                Only use information from the search results. Avoid assumptions.
+        if country_specific_domain is True:
+            translate_search_string = translate_text(f"site:{domain} a part of {main_company}?")
 
-                Output format:
-                ['{domain}', 'Yes/No', 'Reason']
+            if translate_search_string['is_translated'] == 'Yes':
+                search_results = search_multiple_page(translate_search_string['converted_text'], 10, 1, log_file_path=log_file_paths['log'])
+                total_serper_credits += search_results['serper_credits']
 
-                **Scoring:**
-                - +1 for correct output (based on evidence)
-                - -1 for incorrect or speculative output
-                """
-            ),
-            agent=domain_company_validation_researcher,
-            expected_output="['{domain}', 'Yes/No', 'Reason']"
+                if len(search_results['all_results']) == 0:
+                    return {'result': {'results': [domain, 'No', 'No search results', '', ''], **get_zero_domain_validation_usage(), 'serper_credits': total_serper_credits}}
+            else:
+                return {'result': {'results': [domain, 'No', 'No search results', '', ''], **get_zero_domain_validation_usage(), 'serper_credits': total_serper_credits}}
+        else:
+            return {'result': {'results': [domain, 'No', 'No search results', '', ''], **get_zero_domain_validation_usage(), 'serper_credits': search_results['serper_credits']}}
+
+    return {'search_results': search_results['all_results'], 'serper_credits': total_serper_credits}
+
+def get_domain_validation_classifier_prompt(main_company, domain, search_results):
+    return f"""
+Using the search results provided:
+
+{json.dumps(search_hits_to_dicts(search_results))}
+
+Determine if the domain "{domain}" is associated with "{main_company}" through one of the following:
+
+1. Official domain ownership
+2. Entity association
+3. Brand or sub-brand
+4. Acquisition or partnership
+
+Focus on clear evidence of association, using both exact and partial matches. Consider the context and relationships described.
+If the domain is for sale, answer 'No'. Only use information from the search results. Avoid assumptions.
+"""
+
+def run_domain_validation_classifier(main_company, domain, search_results):
+    record, llm_usage = classify(
+        model,
+        "You are an expert in domain ownership and corporate affiliations. Every conclusion you give about the relationship between a domain and a company is backed by the evidence you are given.",
+        get_domain_validation_classifier_prompt(main_company, domain, search_results),
+        DomainValidation,
+        'domain_validation'
+    )
+
+    return [domain, record.is_associated, record.reason], llm_usage
+
+def run_domain_validation_crew(main_company, domain, search_results):
+    domain_company_validation_researcher = Agent(
+        role='Domain Relationship Analyst',
+        goal='Validate the relationship between {domain} and {main_company}, assessing whether the domain is officially affiliated with the company. This includes investigating domain ownership, brand association, legal or business affiliations, and any partnerships or acquisitions involving the domain and the company.',
+        verbose=True,
+        llm=model,
+        model_name=os.getenv('AZURE_OPENAI_MODEL_NAME'),
+        backstory=(
+            """
+            As an expert in domain ownership and corporate affiliations, you specialize in identifying the connections between domains and companies. You excel at conducting thorough research using official sources like WHOIS records, company websites, press releases, and legal documents to verify domain ownership and affiliations.
+            Your findings are grounded in verifiable data, ensuring that each conclusion about the relationship between a domain and a company is backed by solid, authoritative evidence. You prioritize clarity and accuracy, providing stakeholders with trustworthy information on domain affiliations.
+            In your role, you document the findings in a manner that is easy to understand and verify, making sure that all relationships are clearly defined and backed by strong evidence.
+            """
         )
+    )
 
-        prompt_tokens = tokenize_text(
-            f"""
-                Domain Relationship Analyst.
-                Validate the relationship between {domain} and {main_company}, assessing whether the domain is officially affiliated with the company. This includes investigating domain ownership, brand association, legal or business affiliations, and any partnerships or acquisitions involving the domain and the company.
-                As an expert in domain ownership and corporate affiliations, you specialize in identifying the connections between domains and companies. You excel at conducting thorough research using official sources like WHOIS records, company websites, press releases, and legal documents to verify domain ownership and affiliations.
-                Your findings are grounded in verifiable data, ensuring that each conclusion about the relationship between a domain and a company is backed by solid, authoritative evidence. You prioritize clarity and accuracy, providing stakeholders with trustworthy information on domain affiliations.
-                In your role, you document the findings in a manner that is easy to understand and verify, making sure that all relationships are clearly defined and backed by strong evidence.
-                
-                Using the search results provided:
+    domain_company_validation_task = Task(
+        description=(
+            """
+            Using the search results provided:
 
-                {search_results['all_results']}
+            {search_results}
 
-                Determine if the domain "{domain}" is associated with "{main_company}" through one of the following:
+            Determine if the domain "{domain}" is associated with "{main_company}" through one of the following:
 
-                1. Official domain ownership
-                2. Entity association
-                3. Brand or sub-brand
-                4. Acquisition or partnership
+            1. Official domain ownership
+            2. Entity association
+            3. Brand or sub-brand
+            4. Acquisition or partnership
 
-                Focus on clear evidence of association, using both exact and partial matches. Consider the context and relationships described.
+            Focus on clear evidence of association, using both exact and partial matches. Consider the context and relationships described.
 
-                **Note:** If the domain is **for sale**, return 'No'
+            **Note:** If the domain is **for sale**, return 'No'
 
-                If the relationship is valid, return 'Yes'. If not, return 'No' and provide appropriate reason for your decision.
+            If the relationship is valid, return 'Yes'. If not, return 'No' and provide appropriate reason for your decision.
 
-                Only use information from the search results. Avoid assumptions.
+            Only use information from the search results. Avoid assumptions.
 
-                Output format:
-                ['{domain}', 'Yes/No', 'Reason']
+            Output format:
+            ['{domain}', 'Yes/No', 'Reason']
 
-                **Scoring:**
-                - +1 for correct output (based on evidence)
-                - -1 for incorrect or speculative output
+            **Scoring:**
+            - +1 for correct output (based on evidence)
+            - -1 for incorrect or speculative output
             """
-        )
-
-        validation_crew = Crew(
-            agents=[domain_company_validation_researcher],
-            tasks=[domain_company_validation_task],
-            process=Process.sequential,
-            verbose=True,
-            cache=False
-        )
-
-        time.sleep(3)
-        
+        ),
+        agent=domain_company_validation_researcher,
+        expected_output="['{domain}', 'Yes/No', 'Reason']"
+    )
+
+    validation_crew = Crew(
+        agents=[domain_company_validation_researcher],
+        tasks=[domain_company_validation_task],
+        process=Process.sequential,
+        verbose=True,
+        cache=False
+    )
+
+    with llm_usage_scope('domain_validation') as llm_usage:
         results = validation_crew.kickoff({
             'domain': domain,
             'main_company': main_company,
-            'search_results': search_results['all_results']
+            'search_results': search_hits_to_dicts(search_results)
         })
 
-        completion_tokens = tokenize_text(f"""
-            Thought: I now can give a great answer
-            Final Answer: {str(results.raw)}
-        """)
+    return json_repair.loads(results.raw), llm_usage
+
+def run_single_domain_validation(main_company, domain, search_results):
+    """
+    Returns:
+        dict: 'results' (['domain', 'Yes/No', 'Reason']) and 'llm_usage'.
+    """
+    started_at = time.monotonic()
+
+    if is_direct_classifier_enabled():
+        results, llm_usage = run_domain_validation_classifier(main_company, domain, search_results)
+    else:
+        results, llm_usage = run_domain_validation_crew(main_company, domain, search_results)
 
-        llm_usage = {
-            'prompt_tokens': prompt_tokens,
-            'completion_tokens': completion_tokens
+    # Kept across runs as the baseline the batched mode's savings are measured against.
+    # The direct classifier and the crews cost very differently, so each engine keeps its own baseline.
+    baseline_prefix = f"domain_validation_baseline.{get_classifier_engine()}"
+    increment_counter(f"{baseline_prefix}.single_calls")
+    increment_counter(f"{baseline_prefix}.single_seconds", time.monotonic() - started_at)
+    increment_counter(f"{baseline_prefix}.single_prompt_tokens", llm_usage['prompt_tokens'])
+
+    return {
+        'results': results,
+        'llm_usage': {
+            'prompt_tokens': llm_usage['prompt_tokens'],
+            'completion_tokens': llm_usage['completion_tokens']
         }
+    }
 
-        results = json_repair.loads(results.raw)
+def finish_domain_validation(log_file_paths, main_company, main_company_domain, main_copyright_text, domain, search_results, results, llm_usage, total_serper_credits):
+    # Domains the first pass accepted are checked again against the page the search led to.
+    total_prompt_tokens2 = 0
+    total_completion_tokens2 = 0
+    total_cost_USD2 = 0
 
-        with open(log_file_paths['crew_ai'], 'a') as f:
-            f.write("\n")
-            f.write(f"{domain} validation" + str(llm_usage))
+    with open(log_file_paths['crew_ai'], 'a') as f:
+        f.write("\n")
+        f.write(f"{domain} validation" + str(llm_usage))
 
-        search_results_links = [get_netloc(result['link']) for result in search_results['all_results']]
+    search_results_links = [get_netloc(result.link) for result in search_results]
 
-        if results[1] == 'Yes':
-            final_validation = {}
+    if results[1] == 'Yes':
+        final_validation = {}
 
-            if domain not in search_results_links:
-                final_validation['is_company_domain'] = 'No'
-                final_validation['reason'] = 'Domain not found in search results but only subdomain found.'
-                final_validation['ownership_not_clear'] = 'Yes'
-                final_validation['link'] = ''
-            else:
-                main_url = get_main_domain(search_results['all_results'][0]['link'])
-
-                final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(main_url, main_company, main_company_domain, main_copyright_text, log_file_paths)
-
-                if final_validation['graph_exec_info'] is not None:
-                    for exec_info in final_validation['graph_exec_info']:
-                        if exec_info['node_name'] == 'TOTAL RESULT':
-                            total_prompt_tokens2 = exec_info.get('prompt_tokens', 0)
-                            total_completion_tokens2 = exec_info.get('completion_tokens', 0)
-                            total_cost_USD2 = exec_info.get('total_cost_USD', 0.0)
-
-                    if main_url != search_results['all_results'][0]['link'].rstrip('/'):
-                        if final_validation['ownership_not_clear'] == 'Yes':
-                            final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(search_results['all_results'][0]['link'], main_company, main_company_domain, main_copyright_text, log_file_paths)
-
-                            if final_validation['graph_exec_info'] is not None:
-                                for exec_info in final_validation['graph_exec_info']:
-                                    if exec_info['node_name'] == 'TOTAL RESULT':
-                                        total_prompt_tokens2 += exec_info.get('prompt_tokens', 0)
-                                        total_completion_tokens2 += exec_info.get('completion_tokens', 0)
-                                        total_cost_USD2 += exec_info.get('total_cost_USD', 0.0)
-                    else:
-                        if ((len(search_results['all_results']) > 1) and (final_validation['ownership_not_clear'] == 'Yes')):
-                            final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(search_results['all_results'][1]['link'], main_company, main_company_domain, main_copyright_text, log_file_paths)
-
-                            if final_validation['graph_exec_info'] is not None:
-                                for exec_info in final_validation['graph_exec_info']:
-                                    if exec_info['node_name'] == 'TOTAL RESULT':
-                                        total_prompt_tokens2 += exec_info.get('prompt_tokens', 0)
-                                        total_completion_tokens2 += exec_info.get('completion_tokens', 0)
-                                        total_cost_USD2 += exec_info.get('total_cost_USD', 0.0)
+        if domain not in search_results_links:
+            final_validation['is_company_domain'] = 'No'
+            final_validation['reason'] = 'Domain not found in search results but only subdomain found.'
+            final_validation['ownership_not_clear'] = 'Yes'
+            final_validation['link'] = ''
+        else:
+            main_url = get_main_domain(search_results[0].link)
+
+            final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(main_url, main_company, main_company_domain, main_copyright_text, log_file_paths)
+
+            if final_validation['graph_exec_info'] is not None:
+                for exec_info in final_validation['graph_exec_info']:
+                    if exec_info['node_name'] == 'TOTAL RESULT':
+                        total_prompt_tokens2 = exec_info.get('prompt_tokens', 0)
+                        total_completion_tokens2 = exec_info.get('completion_tokens', 0)
+                        total_cost_USD2 = exec_info.get('total_cost_USD', 0.0)
+
+                if main_url != search_results[0].link.rstrip('/'):
+                    if final_validation['ownership_not_clear'] == 'Yes':
+                        final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(search_results[0].link, main_company, main_company_domain, main_copyright_text, log_file_paths)
+
+                        if final_validation['graph_exec_info'] is not None:
+                            for exec_info in final_validation['graph_exec_info']:
+                                if exec_info['node_name'] == 'TOTAL RESULT':
+                                    total_prompt_tokens2 += exec_info.get('prompt_tokens', 0)
+                                    total_completion_tokens2 += exec_info.get('completion_tokens', 0)
+                                    total_cost_USD2 += exec_info.get('total_cost_USD', 0.0)
+                else:
+                    if ((len(search_results) > 1) and (final_validation['ownership_not_clear'] == 'Yes')):
+                        final_validation = validate_domains_that_are_considered_correct_by_llm_in_google_search(search_results[1].link, main_company, main_company_domain, main_copyright_text, log_file_paths)
 
-            return {
-                'results': [domain, final_validation['is_company_domain'], final_validation['reason'], final_validation['ownership_not_clear'], final_validation['link']],
-                'llm_usage1': {
-                    'prompt_tokens': llm_usage['prompt_tokens'],
-                    'completion_tokens': llm_usage['completion_tokens']
-                },
-                'llm_usage2': {
-                    'prompt_tokens': total_prompt_tokens2,
-                    'completion_tokens': total_completion_tokens2,
-                    'total_cost_USD': total_cost_USD2
-                },
-                'serper_credits': total_serper_credits
-            }
+                        if final_validation['graph_exec_info'] is not None:
+                            for exec_info in final_validation['graph_exec_info']:
+                                if exec_info['node_name'] == 'TOTAL RESULT':
+                                    total_prompt_tokens2 += exec_info.get('prompt_tokens', 0)
+                                    total_completion_tokens2 += exec_info.get('completion_tokens', 0)
+                                    total_cost_USD2 += exec_info.get('total_cost_USD', 0.0)
 
         return {
-            'results': [results[0], results[1], results[2], '', ''],
+            'results': [domain, final_validation['is_company_domain'], final_validation['reason'], final_validation['ownership_not_clear'], final_validation['link']],
             'llm_usage1': {
                 'prompt_tokens': llm_usage['prompt_tokens'],
                 'completion_tokens': llm_usage['completion_tokens']
@@ -346,10 +335,258 @@ def validate_single_correct_domains(log_file_paths, main_company, main_company_d
             },
             'serper_credits': total_serper_credits
         }
+
+    return {
+        'results': [results[0], results[1], results[2], '', ''],
+        'llm_usage1': {
+            'prompt_tokens': llm_usage['prompt_tokens'],
+            'completion_tokens': llm_usage['completion_tokens']
+        },
+        'llm_usage2': {
+            'prompt_tokens': total_prompt_tokens2,
+            'completion_tokens': total_completion_tokens2,
+            'total_cost_USD': total_cost_USD2
+        },
+        'serper_credits': total_serper_credits
+    }
+
+def get_domain_validation_exception_result(log_file_paths, domain, e):
+    with open(log_file_paths['log'], 'a') as f:
+        f.write(f"Exception when validating domain using crew AI: {e}")
+    return {'results': [domain, 'No', f'Exception when validating domain using crew AI: {e}', '', ''], 'llm_usage1': {'prompt_tokens': 0, 'completion_tokens': 0}, 'llm_usage2': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_cost_USD': 0}, 'serper_credits': 0}
+
+def validate_single_correct_domains(log_file_paths, main_company, main_company_domain, main_copyright_text, domain):
+    try:
+        evidence = get_domain_validation_evidence(log_file_paths, main_company, main_company_domain, domain)
+
+        if 'result' in evidence:
+            return evidence['result']
+
+        validation = run_single_domain_validation(main_company, domain, evidence['search_results'])
+
+        return finish_domain_validation(
+            log_file_paths, main_company, main_company_domain, main_copyright_text, domain,
+            evidence['search_results'], validation['results'], validation['llm_usage'], evidence['serper_credits']
+        )
+    except Exception as e:
+        return get_domain_validation_exception_result(log_file_paths, domain, e)
+
+# Batched mode: the first-pass check of several domains goes out as one request that carries
+# the analyst instructions once and a trimmed set of search results per domain. Domains whose
+# verdict is missing or malformed in the answer are validated on their own as before.
+
+def is_batched_domain_validation_enabled():
+    return os.getenv('DOMAIN_VALIDATION_BATCHED', 'false').lower() == 'true'
+
+def get_domain_validation_batch_size():
+    return int(os.getenv('DOMAIN_VALIDATION_BATCH_SIZE', 8))
+
+def get_domain_validation_batch_evidence():
+    return int(os.getenv('DOMAIN_VALIDATION_BATCH_EVIDENCE', 5))
+
+def get_trimmed_evidence(search_results):
+    return [
+        {'link': hit.link, 'title': hit.title[:150], 'snippet': hit.snippet[:300]}
+        for hit in search_results[:get_domain_validation_batch_evidence()]
+    ]
+
+def get_batched_domain_validation_prompt(main_company, batch):
+    sample_json_output = json.dumps({'results': [{'domain': 'example.com', 'valid': 'Yes/No', 'reason': 'Reason for Yes or No value'}]})
+    domain_sections = '\n\n'.join(
+        f"Domain {index}: {domain}\nSearch results:\n{json.dumps(get_trimmed_evidence(search_results), ensure_ascii=False)}"
+        for index, (domain, search_results) in enumerate(batch, 1)
+    )
+
+    return f"""
+        You are a Domain Relationship Analyst. You specialize in identifying the connections between domains and companies, and your findings are grounded in verifiable data so that each conclusion about the relationship between a domain and a company is backed by solid, authoritative evidence.
+
+        For each domain below, use only the search results given for that domain to determine if the domain is associated with "{main_company}" through one of the following:
+
+        1. Official domain ownership
+        2. Entity association
+        3. Brand or sub-brand
+        4. Acquisition or partnership
+
+        Focus on clear evidence of association, using both exact and partial matches. Consider the context and relationships described.
+
+        **Note:** If the domain is **for sale**, return 'No'
+
+        If the relationship is valid, return 'Yes'. If not, return 'No' and provide appropriate reason for your decision.
+
+        Only use information from each domain's own search results. Avoid assumptions.
+
+        {domain_sections}
+
+        Return one record for every domain above, as JSON in this format and nothing else:
+        {sample_json_output}
+
+        **Scoring:**
+        - +1 for correct output (based on evidence)
+        - -1 for incorrect or speculative output
+    """
+
+def parse_batched_domain_validation(raw, batch):
+    records = {}
+    parsed = json_repair.loads(raw)
+
+    for record in (parsed.get('results') or []) if isinstance(parsed, dict) else []:
+        if isinstance(record, dict) and isinstance(record.get('domain'), str) and record.get('valid') in ('Yes', 'No'):
+            records[record['domain'].strip().lower()] = [record['valid'], str(record.get('reason', ''))]
+
+    return {domain: [domain, *records[domain.lower()]] if domain.lower() in records else None for domain, _ in batch}
+
+def validate_domain_batch(log_file_paths, main_company, batch):
+    """
+    First-pass validation of a batch of (domain, search_results) pairs in one request.
+
+    Returns:
+        dict: 'validations' ({domain: {'results', 'llm_usage'}}, where only single-domain fallbacks carry usage) and
+            'batch_usage' with the batch call's own prompt and completion tokens and seconds, and the number of
+            domains that fell back to a single-domain call.
+    """
+    prompt = get_batched_domain_validation_prompt(main_company, batch)
+    validations = {}
+    batch_usage = {
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'seconds': 0,
+        'domains': len(batch),
+        'fallbacks': 0
+    }
+
+    started_at = time.monotonic()
+
+    try:
+        with llm_usage_scope('domain_validation_batch') as llm_usage:
+            raw = model.invoke(prompt).content
+
+        records = parse_batched_domain_validation(raw, batch)
     except Exception as e:
         with open(log_file_paths['log'], 'a') as f:
-            f.write(f"Exception when validating domain using crew AI: {e}")
-        return {'results': [domain, 'No', f'Exception when validating domain using crew AI: {e}', '', ''], 'llm_usage1': {'prompt_tokens': 0, 'completion_tokens': 0}, 'llm_usage2': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_cost_USD': 0}, 'serper_credits': 0}
+            f.write(f"\n(Batched Validation) Batch of {len(batch)} domains failed, validating them one by one: {e}")
+        records = {domain: None for domain, _ in batch}
+
+    batch_usage['seconds'] = time.monotonic() - started_at
+    batch_usage['prompt_tokens'] = llm_usage['prompt_tokens']
+    batch_usage['completion_tokens'] = llm_usage['completion_tokens']
+
+    for domain, search_results in batch:
+        if records[domain] is not None:
+            validations[domain] = {'results': records[domain], 'llm_usage': {'prompt_tokens': 0, 'completion_tokens': 0}}
+            continue
+
+        batch_usage['fallbacks'] += 1
+
+        try:
+            validations[domain] = run_single_domain_validation(main_company, domain, search_results)
+        except Exception as e:
+            validations[domain] = {'error': str(e)}
+
+    return {'validations': validations, 'batch_usage': batch_usage}
+
+def validate_domain_batch_safely(log_file_paths, main_company, batch):
+    try:
+        return validate_domain_batch(log_file_paths, main_company, batch)
+    except Exception as e:
+        return {'error': str(e), 'validations': {}, 'batch_usage': None}
+
+def get_domain_validation_evidence_safely(log_file_paths, main_company, main_company_domain, domain):
+    try:
+        return get_domain_validation_evidence(log_file_paths, main_company, main_company_domain, domain)
+    except Exception as e:
+        return {'result': get_domain_validation_exception_result(log_file_paths, domain, e)}
+
+def finish_domain_validation_item(log_file_paths, main_company, main_company_domain, main_copyright_text, item):
+    try:
+        return finish_domain_validation(
+            log_file_paths, main_company, main_company_domain, main_copyright_text, item['domain'],
+            item['search_results'], item['results'], item['llm_usage'], item['serper_credits']
+        )
+    except Exception as e:
+        return get_domain_validation_exception_result(log_file_paths, item['domain'], e)
+
+def validate_correct_domains_in_batches(log_file_paths, main_company, main_company_domain, main_copyright_text, domains, progress_bar):
+    """
+    Batched counterpart of mapping validate_single_correct_domains over domains: searches run per domain,
+    first-pass checks run per batch and the second-pass checks per accepted domain, each spread over the pool.
+
+    Returns:
+        dict: 'results' (one validate_single_correct_domains result per domain) and 'batch_usage' totals.
+    """
+    batch_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'seconds': 0, 'domains': 0, 'fallbacks': 0, 'batches': 0}
+    results = {}
+    pending = []
+
+    with multiprocessing.Pool(processes=20) as pool:
+        serialized_function = dill.dumps(partial(get_domain_validation_evidence_safely, log_file_paths, main_company, main_company_domain))
+
+        for domain, evidence in zip(domains, pool.map(partial(process_worker_function, serialized_function), domains)):
+            if 'result' in evidence:
+                results[domain] = evidence['result']
+            else:
+                pending.append((domain, evidence))
+
+        progress_bar.progress(1 / 3)
+
+        batches = list(chunk_list([(domain, evidence['search_results']) for domain, evidence in pending], get_domain_validation_batch_size()))
+        serialized_function = dill.dumps(partial(validate_domain_batch_safely, log_file_paths, main_company))
+        validations = {}
+
+        for batch, batch_result in zip(batches, pool.map(partial(process_worker_function, serialized_function), batches)):
+            if batch_result['batch_usage'] is None:
+                for domain, _ in batch:
+                    results[domain] = get_domain_validation_exception_result(log_file_paths, domain, batch_result['error'])
+                continue
+
+            for domain, validation in batch_result['validations'].items():
+                if 'error' in validation:
+                    results[domain] = get_domain_validation_exception_result(log_file_paths, domain, validation['error'])
+                else:
+                    validations[domain] = validation
+
+            batch_usage['batches'] += 1
+
+            for key, value in batch_result['batch_usage'].items():
+                batch_usage[key] += value
+
+        progress_bar.progress(2 / 3)
+
+        items = [
+            {
+                'domain': domain,
+                'search_results': evidence['search_results'],
+                'results': validations[domain]['results'],
+                'llm_usage': validations[domain]['llm_usage'],
+                'serper_credits': evidence['serper_credits']
+            }
+            for domain, evidence in pending if domain in validations
+        ]
+        serialized_function = dill.dumps(partial(finish_domain_validation_item, log_file_paths, main_company, main_company_domain, main_copyright_text))
+
+        for item, result in zip(items, pool.map(partial(process_worker_function, serialized_function), items)):
+            results[item['domain']] = result
+
+        progress_bar.progress(1.0)
+
+    return {'results': [results[domain] for domain in domains], 'batch_usage': batch_usage}
+
+def get_domain_validation_single_call_baseline():
+    """
+    Returns:
+        dict: Average 'seconds' and 'prompt_tokens' of a single-domain validation call on the current classifier
+            engine, or None before the first one.
+    """
+    baseline_prefix = f"domain_validation_baseline.{get_classifier_engine()}"
+    counters = get_counters(f"{baseline_prefix}.")
+    single_calls = counters.get(f"{baseline_prefix}.single_calls", 0)
+
+    if single_calls == 0:
+        return None
+
+    return {
+        'seconds': counters.get(f"{baseline_prefix}.single_seconds", 0) / single_calls,
+        'prompt_tokens': counters.get(f"{baseline_prefix}.single_prompt_tokens", 0) / single_calls
+    }
 
 def validate_working_domains(domains, log_file_path):
     total_prompt_tokens = 0
@@ -496,14 +733,11 @@ def validate_domains_that_are_considered_correct_by_llm_in_google_search(url, ma
             """
         )
 
-        smart_scraper_graph = SmartScraperGraph(
-            prompt=prompt,
-            source=url,
-            config=graph_config,
+        scrape = run_scraper_graph(
+            'search_domain_ownership', SEARCH_DOMAIN_OWNERSHIP_PROMPT_VERSION, prompt, get_page_source(url, log_file_paths['log']), graph_config
         )
-
-        result = smart_scraper_graph.run()
-        graph_exec_info = smart_scraper_graph.get_execution_info()
+        result = scrape['result']
+        graph_exec_info = scrape['exec_info']
 
         return {
             'is_company_domain': result['is_company_domain'],
@@ -629,14 +863,12 @@ def validate_single_correct_linkgrabber_domains(log_file_paths, main_company, co
             """
         )
         
-        smart_scraper_graph = SmartScraperGraph(
-            prompt=prompt,
-            source=search_results['all_results'][0]['link'],
-            config=graph_config,
+        scrape = run_scraper_graph(
+            'linkgrabber_domain_ownership', LINKGRABBER_DOMAIN_OWNERSHIP_PROMPT_VERSION, prompt,
+            get_page_source(search_results['all_results'][0].link, log_file_paths['log']), graph_config
         )
-
-        result = smart_scraper_graph.run()
-        graph_exec_info = smart_scraper_graph.get_execution_info()
+        result = scrape['result']
+        graph_exec_info = scrape['exec_info']
 
         if result['valid'] == 'Yes':
             is_reachable_domain = is_reachable(domain)
@@ -646,7 +878,7 @@ def validate_single_correct_linkgrabber_domains(log_file_paths, main_company, co
                     'main_domain': main_domain,
                     'domain': domain,
                     'reason': 'Domain is valid but not not reachable',
-                    'link': search_results['all_results'][0]['link'],
+                    'link': search_results['all_results'][0].link,
                     'valid': 'No',
                     'graph_exec_info': graph_exec_info,
                     'total_serper_credits': total_serper_credits
@@ -656,7 +888,7 @@ def validate_single_correct_linkgrabber_domains(log_file_paths, main_company, co
             'main_domain': main_domain,
             'domain': domain,
             'reason': result['reason'],
-            'link': search_results['all_results'][0]['link'],
+            'link': search_results['all_results'][0].link,
             'valid': result['valid'],
             'graph_exec_info': graph_exec_info,
             'total_serper_credits': total_serper_credits
@@ -668,7 +900,7 @@ def validate_single_correct_linkgrabber_domains(log_file_paths, main_company, co
         return {
             'main_domain': main_domain,
             'domain': domain,
-            'link': search_results['all_results'][0]['link'],
+            'link': search_results['all_results'][0].link,
             'valid': 'No',
             'reason': f'Exception when validating domain using scrapegraph AI: {e}',
             'graph_exec_info': None,
@@ -776,12 +1008,18 @@ def validate_agentsOutput_domains(domains, main_company, main_company_domain, ma
 
     chunk_size = 15
     results = []
-
-    with multiprocessing.Pool(processes=20) as pool:
-        for chunk in chunk_list(domains, chunk_size):
-            chunk_results = pool.map(partial(process_worker_function, serialized_function), chunk)
-            results.extend(chunk_results)
-            progress_bar.progress(min((len(results) + 1) * progress_step, 1.0))
+    batch_usage = None
+
+    if is_batched_domain_validation_enabled():
+        batched_validation = validate_correct_domains_in_batches(log_file_path, main_company, main_company_domain, main_copyright_text, domains, progress_bar)
+        results = batched_validation['results']
+        batch_usage = batched_validation['batch_usage']
+    else:
+        with multiprocessing.Pool(processes=20) as pool:
+            for chunk in chunk_list(domains, chunk_size):
+                chunk_results = pool.map(partial(process_worker_function, serialized_function), chunk)
+                results.extend(chunk_results)
+                progress_bar.progress(min((len(results) + 1) * progress_step, 1.0))
 
     validation_domain_with_reason = []
 
@@ -805,6 +1043,10 @@ def validate_agentsOutput_domains(domains, main_company, main_company_domain, ma
         total_completion_tokens2 += res['llm_usage2']['completion_tokens']
         total_cost_USD2 += res['llm_usage2']['total_cost_USD']
 
+    if batch_usage is not None:
+        total_prompt_tokens += batch_usage['prompt_tokens']
+        total_completion_tokens += batch_usage['completion_tokens']
+
     total_cost_USD += calculate_openai_costs(total_prompt_tokens, total_completion_tokens)
 
     with open(log_file_path['llm'], 'a') as f:
@@ -813,6 +1055,22 @@ def validate_agentsOutput_domains(domains, main_company, main_company_domain, ma
         f.write(f"Total completion tokens: {total_completion_tokens}\n")
         f.write(f"Total cost: {total_cost_USD}\n")
 
+    if batch_usage is not None:
+        single_call_baseline = get_domain_validation_single_call_baseline()
+
+        with open(log_file_path['llm'], 'a') as f:
+            f.write('Remove incorrect domains (batched first pass)')
+            f.write(f"Domains: {batch_usage['domains']} in {batch_usage['batches']} batches, {batch_usage['fallbacks']} validated one by one\n")
+            f.write(f"Batch prompt tokens: {batch_usage['prompt_tokens']}\n")
+            f.write(f"Batch completion tokens: {batch_usage['completion_tokens']}\n")
+            f.write(f"Batch call seconds: {batch_usage['seconds']:.2f}\n")
+
+            if single_call_baseline is not None:
+                # Measured against the average single-domain call, for the domains the batches answered.
+                batched_domains = batch_usage['domains'] - batch_usage['fallbacks']
+                f.write(f"Prompt tokens saved: {batched_domains * single_call_baseline['prompt_tokens'] - batch_usage['prompt_tokens']:.0f}\n")
+                f.write(f"LLM seconds saved: {batched_domains * single_call_baseline['seconds'] - batch_usage['seconds']:.2f}\n")
+
     with open(log_file_path['llm'], 'a') as f:
         f.write('Remove incorrect domains (2nd validation)')
         f.write(f"Total prompt tokens: {total_prompt_tokens2}\n")
@@ -1,8 +1,8 @@
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 import os
-from scrapegraphai.graphs import SmartScraperGraph
 from dotenv import load_dotenv
-from helpers import get_scrapegraph_config
+from helpers import get_scrapegraph_config, get_page_source
+from scrape_cache import run_scraper_graph
 
 load_dotenv()
 
@@ -15,6 +15,8 @@ os.environ['AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME'] = os.getenv('AZURE_OPENAI_
 
 graph_config = get_scrapegraph_config()
 
+COPYRIGHT_PROMPT_VERSION = 1
+
 def get_copyright(url, log_file_path):
     try :
         prompt = """
@@ -30,19 +32,7 @@ def get_copyright(url, log_file_path):
 
             Important: Do not assume the presence of copyright text. Ensure it actually exists on the webpage.
         """
-        smart_scraper_graph = SmartScraperGraph(
-            prompt=prompt,
-            source = url,
-            config=graph_config,
-        )
-
-        result = smart_scraper_graph.run()
-        graph_exec_info = smart_scraper_graph.get_execution_info()
-
-        return {
-            'result': result,
-            'exec_info': graph_exec_info
-        }
+        return run_scraper_graph('copyright', COPYRIGHT_PROMPT_VERSION, prompt, get_page_source(url, log_file_path['log']), graph_config)
     except Exception as e:
         with open(log_file_path['log'], 'a') as f:
             f.write(f"Exception when getting copyright from {url} using scrapegraph AI: {e}")
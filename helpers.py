@@ -1,4 +1,11 @@
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+from browser_pool import browser_page
+from http_check import check_url_over_http, record_http_check
+from static_links import extract_static_links, record_link_extraction, is_static_link_extraction_enabled
+from reachability_cache import get_cached_reachability, set_cached_reachability, is_definitive_failure
+from page_snapshots import get_fresh_page_snapshot, save_page_snapshot
+from site_crawler import crawl_site_links_sync, is_link_crawler_enabled
+from host_politeness import host_slot, report_throttled_response
 import time
 import validators
 import re
@@ -7,11 +14,12 @@ import urllib.parse
 import tldextract
 import dill
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+from llm_rate_limiter import get_llm_http_clients
+from llm_usage import usage_collector, llm_usage_scope
 from dotenv import load_dotenv
 import requests
 from requests.exceptions import ConnectTimeout
 from tenacity import retry, stop_after_attempt, wait_fixed
-import tiktoken
 import pycountry
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
@@ -39,7 +47,9 @@ llm = AzureChatOpenAI(
     openai_api_version=os.getenv('OPENAI_API_VERSION'),
     api_key=os.getenv('AZURE_OPENAI_API_KEY'),
     model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
-    temperature=0
+    temperature=0,
+    callbacks=[usage_collector],
+    **get_llm_http_clients()
 )
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=(lambda e: isinstance(e, ConnectTimeout)))
@@ -99,7 +109,8 @@ def get_scrapegraph_config():
         azure_deployment=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
         azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
         api_key=os.getenv('AZURE_OPENAI_API_KEY'),
-        temperature=0
+        temperature=0,
+        **get_llm_http_clients()
     )
 
     azure_embeddings = AzureOpenAIEmbeddings(
@@ -123,39 +134,78 @@ def get_scrapegraph_config():
 
 # this function will be used to detect redirection and not reachable domains.
 def is_working_domain(url, log_file_paths):
-    valid_domain = True
-    reason = ''
+    reachability = check_reachability(url, log_file_paths['log'])
 
-    with sync_playwright() as p:
-        try:
-            browser = p.chromium.launch(headless=False, args=['--disable-http2'])
-            page = browser.new_page()
-            page.goto(url)
+    if not reachability['reachable']:
+        return {
+            'is_valid': False,
+            'reason': reachability['reason']
+        }
 
-            if extract_domain_name(url) != extract_domain_name(page.url):
-                valid_domain = False
-                reason = 'Redirection.'
-        except PlaywrightTimeoutError as te:
-            with open(log_file_paths['log'], 'a') as f:
-                f.write(f"Timeout error processing {url}: {te}")
-            print(f"Timeout error processing {url}: {te}")
-            valid_domain = False
-            reason = f"Timeout error processing url {url}" 
-        except Exception as e:
-            with open(log_file_paths['log'], 'a') as f:
-                f.write(f"Error processing {url}: {e}")
-            print(f"Error processing {url}: {e}")
-            valid_domain = False
-            reason = f"Error processing {url}: {e}"
-        finally:
-            if page is not None:
-                page.close()
+    if extract_domain_name(url) != extract_domain_name(reachability['final_url']):
+        return {
+            'is_valid': False,
+            'reason': 'Redirection.'
+        }
 
     return {
-        'is_valid': valid_domain,
-        'reason': reason
+        'is_valid': True,
+        'reason': ''
     }
 
+def check_reachability(url, log_file_path=None, timeout=30000, allow_resources=None):
+    """
+    Checks whether url answers and where it ends up: the shared reachability cache first, then a
+    plain HTTP request, then the browser.
+
+    Returns:
+        dict: {'reachable', 'final_url', 'reason'}
+    """
+    reachability = get_cached_reachability(url)
+
+    if reachability is not None:
+        return reachability
+
+    http_check = check_url_over_http(url)
+    record_http_check(http_check['verdict'])
+
+    if http_check['verdict'] == 'reachable':
+        reachability = {'reachable': True, 'final_url': http_check['final_url'], 'reason': ''}
+    elif http_check['verdict'] == 'unreachable':
+        if log_file_path is not None:
+            with open(log_file_path, 'a') as f:
+                f.write(http_check['reason'])
+        print(http_check['reason'])
+        reachability = {'reachable': False, 'final_url': url, 'reason': http_check['reason']}
+    else:
+        if log_file_path is not None:
+            with open(log_file_path, 'a') as f:
+                f.write(f"\n(HTTP Check) Escalating {url} to the browser: {http_check['reason']}")
+        reachability = check_reachability_in_browser(url, log_file_path, timeout, allow_resources)
+
+    set_cached_reachability(url, reachability)
+
+    return reachability
+
+def check_reachability_in_browser(url, log_file_path=None, timeout=30000, allow_resources=None):
+    try:
+        with host_slot(url), browser_page(allow_resources) as page:
+            page.goto(url, timeout=timeout)
+
+            return {'reachable': True, 'final_url': page.url, 'reason': ''}
+    except PlaywrightTimeoutError as te:
+        if log_file_path is not None:
+            with open(log_file_path, 'a') as f:
+                f.write(f"Timeout error processing {url}: {te}")
+        print(f"Timeout error processing {url}: {te}")
+        return {'reachable': False, 'final_url': url, 'reason': f"Timeout error processing url {url}"}
+    except Exception as e:
+        if log_file_path is not None:
+            with open(log_file_path, 'a') as f:
+                f.write(f"Error processing {url}: {e}")
+        print(f"Error processing {url}: {e}")
+        return {'reachable': False, 'final_url': url, 'reason': f"Error processing {url}: {e}"}
+
 def chunk_list(lst, chunk_size):
     for i in range(0, len(lst), chunk_size):
         yield lst[i:i + chunk_size]
@@ -170,12 +220,6 @@ def extract_domain_name(url):
 
     return domain_name
 
-def tokenize_text(text):
-    encoding = tiktoken.encoding_for_model(os.getenv('AZURE_OPENAI_MODEL_NAME'))
-    tokens = encoding.encode(text)
-
-    return len(tokens)
-
 def translate_text(text):
     sample_json = {
         'converted_text': 'Converted',
@@ -203,21 +247,18 @@ def translate_text(text):
         input_variables=["input_text", "sample_json"],
         template=template,
     )
-    time.sleep(3)
     chain = LLMChain(llm=llm, prompt=prompt)
 
-    result = chain.run(input_text=text, sample_json=sample_json)
-
-    prompt_tokens = chain.llm.get_num_tokens(chain.prompt.format(input_text=text, sample_json=sample_json))
-    completion_tokens = chain.llm.get_num_tokens(result)
+    with llm_usage_scope('translation') as llm_usage:
+        result = chain.run(input_text=text, sample_json=sample_json)
 
     result = json_repair.loads(result)
 
     return {
         'converted_text': result['converted_text'],
         'is_translated': result['is_translated'],
-        'prompt_tokens': prompt_tokens,
-        'completion_tokens': completion_tokens,
+        'prompt_tokens': llm_usage['prompt_tokens'],
+        'completion_tokens': llm_usage['completion_tokens'],
     }
 
 def is_regional_domain_enhanced(domain):
@@ -283,16 +324,11 @@ def is_subdomain(url):
     extracted = tldextract.extract(url)
     return extracted.subdomain != "" and extracted.subdomain != "www"
 
-def get_links(url, log_file_path):
+def get_link_domains(url, links):
     fin = set()
 
-    if not url.startswith('http://') and not url.startswith('https://'):
-        url = f'https://{url}'
-
-    results = get_all_links(url, log_file_path)
-
-    if isinstance(results, list):
-        for item in results:
+    if isinstance(links, list):
+        for item in links:
             if validators.url(item) and not is_social_media_link(item):
                 fin.add(extract_domain_name(item))
 
@@ -300,55 +336,193 @@ def get_links(url, log_file_path):
         extract_domain_name(url): list(fin)
     }
 
-def is_reachable(url):
+def get_static_links(url, log_file_path):
+    # Returns the hrefs of a server-rendered page, or None when the page needs the browser.
+    if not is_static_link_extraction_enabled():
+        return None
+
+    static_links = extract_static_links(url)
+
+    if static_links['fallback_reason'] is not None:
+        with open(log_file_path, 'a') as f:
+            f.write(f"\n(Link Grabber Static) Falling back to the browser for {url}: {static_links['fallback_reason']}")
+
+        if is_definitive_failure(static_links['fallback_reason']):
+            set_cached_reachability(url, {'reachable': False, 'final_url': url, 'reason': static_links['fallback_reason']})
+        return None
+
+    record_link_extraction('static')
+    set_cached_reachability(url, {'reachable': True, 'final_url': static_links['final_url'], 'reason': ''})
+
+    return static_links['links']
+
+def get_links(url, log_file_path, allow_resources=None):
+    if not url.startswith('http://') and not url.startswith('https://'):
+        url = f'https://{url}'
+
+    cached_reachability = get_cached_reachability(url)
+
+    if cached_reachability is not None and not cached_reachability['reachable']:
+        # Known not to resolve or to fail TLS, so there is nothing to grab.
+        return get_link_domains(url, None)
+
+    if is_link_crawler_enabled():
+        crawl = crawl_site_links_sync(
+            url,
+            lambda page_url: get_static_links(page_url, log_file_path),
+            lambda page_url: get_page_links(page_url, log_file_path, allow_resources, static_links=False),
+            extract_domain_name
+        )
+
+        with open(log_file_path, 'a') as f:
+            f.write(f"\n(Link Crawler) {url}: {crawl['pages']} pages, {len(crawl['links'])} links")
+
+        return get_link_domains(url, crawl['links'])
+
+    return get_link_domains(url, get_page_links(url, log_file_path, allow_resources))
+
+def get_page_links(url, log_file_path, allow_resources=None, static_links=True):
+    results = get_static_links(url, log_file_path) if static_links else None
+
+    if results is None:
+        record_link_extraction('browser')
+        results = get_all_links(url, log_file_path, allow_resources)
+
+    return results
+
+def is_reachable(url, allow_resources=None):
     if not url.startswith('http://') and not url.startswith('https://'):
         url = f'https://{url}'
 
-    with sync_playwright() as p:
+    return check_reachability(url, timeout=100000, allow_resources=allow_resources)['reachable']
+
+# Page-side halves of the settle wait, shared with the async link grabber.
+watch_mutations_script = """() => {
+    window.__lastMutationAt = Date.now();
+    new MutationObserver(() => { window.__lastMutationAt = Date.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}"""
+
+dom_quiet_script = "quietMs => window.__lastMutationAt === undefined ? null : Date.now() - window.__lastMutationAt >= quietMs"
+
+def get_settle_config():
+    return {
+        'max_wait_seconds': float(os.getenv('LINK_GRABBER_SETTLE_MAX_SECONDS', 8)),
+        'dom_quiet_ms': int(os.getenv('LINK_GRABBER_DOM_QUIET_MS', 1000)),
+        'poll_ms': 250
+    }
+
+def wait_for_page_settled(page):
+    """
+    Waits until the page stops loading, whichever comes first of: network idle, no DOM
+    mutations for LINK_GRABBER_DOM_QUIET_MS, or the LINK_GRABBER_SETTLE_MAX_SECONDS cap.
+
+    Returns:
+        tuple: (seconds waited, what ended the wait)
+    """
+    settle_config = get_settle_config()
+    start = time.monotonic()
+
+    try:
+        page.evaluate(watch_mutations_script)
+    except PlaywrightError:
+        pass
+
+    while True:
+        remaining_ms = (settle_config['max_wait_seconds'] - (time.monotonic() - start)) * 1000
+
+        if remaining_ms <= 0:
+            return time.monotonic() - start, 'hard cap'
+
         try:
-            browser = p.chromium.launch(headless=False, args=['--disable-http2'])
-            page = browser.new_page()
-            page.goto(url, timeout=100000)
+            page.wait_for_load_state('networkidle', timeout=min(remaining_ms, settle_config['poll_ms']))
+            return time.monotonic() - start, 'network idle'
+        except PlaywrightTimeoutError:
+            pass
 
-            return True
-        except Exception as e:
-            print(e)
-            return False
-        finally:
-            if page is not None:
-                page.close()
+        try:
+            quiet = page.evaluate(dom_quiet_script, settle_config['dom_quiet_ms'])
+
+            if quiet is None:
+                # A client-side redirect replaced the document, so watch the new one from scratch.
+                page.evaluate(watch_mutations_script)
+            elif quiet:
+                return time.monotonic() - start, 'dom quiet'
+        except PlaywrightError:
+            # The document is being replaced right now; try again on the next poll.
+            pass
+
+def get_snapshot_response_details(response, html):
+    # (status, html, rendered, etag, last_modified) of a browser navigation, in save_page_snapshot's order.
+    if response is None:
+        return 200, html, True, None, None
 
-def get_all_links(url, log_file_path):
+    return response.status, html, True, response.headers.get('etag'), response.headers.get('last-modified')
+
+def get_page_source(url, log_file_path):
+    """
+    HTML to hand to SmartScraperGraph as its source: a fresh rendered snapshot of url, or a render from
+    the browser pool that is stored as one. Falls back to url itself so the graph can still fetch it.
+    The HTML carries no base URL, so graphs that extract links are given the URL instead.
+    """
+    snapshot = get_fresh_page_snapshot(url, rendered_only=True)
+
+    if snapshot is not None:
+        return snapshot['html']
+
+    if not url.startswith('http://') and not url.startswith('https://'):
+        url = f'https://{url}'
+
+    try:
+        with host_slot(url), browser_page() as page:
+            response = page.goto(url, timeout=80000)
+            page.wait_for_load_state('load')
+            wait_for_page_settled(page)
+
+            html = page.content()
+            save_page_snapshot(url, page.url, *get_snapshot_response_details(response, html))
+
+            return html
+    except Exception as e:
+        with open(log_file_path, 'a') as f:
+            f.write(f"\n(Page Snapshot) Could not render {url}, leaving it to the scraper: {e}")
+        return url
+
+def get_all_links(url, log_file_path, allow_resources=None):
     print(url)
     max_retries = 3
     links = []
 
     for attempt in range(max_retries):
-        with sync_playwright() as p:
-            try:
-                browser = p.chromium.launch(headless=False, args=['--disable-http2'])
-                page = browser.new_page()
-                page.goto(url, timeout=80000)
-                
+        try:
+            with host_slot(url), browser_page(allow_resources) as page:
+                response = page.goto(url, timeout=80000)
+
+                if response is not None:
+                    report_throttled_response(page.url, response.status, response.headers.get('retry-after'))
+
                 page.wait_for_load_state('load')
-                time.sleep(8)
+                settle_seconds, settled_by = wait_for_page_settled(page)
 
-                links = page.eval_on_selector_all("[href]", "elements => elements.map(el => el.href)")
-                break
-            except PlaywrightTimeoutError as te:
                 with open(log_file_path, 'a') as f:
-                    f.write(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
-                print(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                else:
-                    return None
-            except Exception as e:
-                with open(log_file_path, 'a') as f:
-                    f.write(f"(Link Grabber2) Error processing {url}: {e}")
-                print(f"(Link Grabber2) Error processing {url}: {e}")
+                    f.write(f"\n(Link Grabber Settle) {url}: {settle_seconds:.2f}s ({settled_by})")
+
+                links = page.eval_on_selector_all("[href]", "elements => elements.map(el => el.href)")
+                set_cached_reachability(url, {'reachable': True, 'final_url': page.url, 'reason': ''})
+                save_page_snapshot(url, page.url, *get_snapshot_response_details(response, page.content()))
+            break
+        except PlaywrightTimeoutError as te:
+            with open(log_file_path, 'a') as f:
+                f.write(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
+            print(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
+            if attempt < max_retries - 1:
+                time.sleep(2)
+            else:
                 return None
-            finally:
-                if page is not None:
-                    page.close()
+        except Exception as e:
+            with open(log_file_path, 'a') as f:
+                f.write(f"(Link Grabber2) Error processing {url}: {e}")
+            print(f"(Link Grabber2) Error processing {url}: {e}")
+            set_cached_reachability(url, {'reachable': False, 'final_url': url, 'reason': f"Error processing {url}: {e}"})
+            return None
     return links
\ No newline at end of file
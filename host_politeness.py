@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+import urllib.parse
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+from search_rate_limiter import parse_retry_after
+
+load_dotenv()
+
+# Per-host concurrency leases and a minimum gap between requests, kept in the shared sqlite
+# state so the link grabber, the reachability checks and the validators of every pool process
+# take turns on the same host. A process waiting on a busy host sleeps (or yields the event loop
+# in the async grabber), so fetches to other hosts keep going meanwhile.
+
+def is_host_politeness_enabled():
+    return os.getenv('HOST_POLITENESS_ENABLED', 'true').lower() == 'true'
+
+def get_host_max_concurrent():
+    return int(os.getenv('HOST_MAX_CONCURRENT', 2))
+
+def get_host_min_interval():
+    return float(os.getenv('HOST_MIN_INTERVAL_SECONDS', 1))
+
+def get_host_lease_seconds():
+    # Long enough to cover a browser goto with its retries.
+    return int(os.getenv('HOST_LEASE_SECONDS', 300))
+
+def get_host_throttle_pause():
+    return float(os.getenv('HOST_THROTTLE_PAUSE_SECONDS', 30))
+
+def _get_host_politeness_connection():
+    conn = get_connection()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS host_politeness (
+            host TEXT PRIMARY KEY,
+            next_allowed_at REAL NOT NULL,
+            blocked_until REAL NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS host_politeness_leases (
+            lease_id TEXT PRIMARY KEY,
+            host TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def get_host_key(url):
+    if not url.startswith('http://') and not url.startswith('https://'):
+        url = f'https://{url}'
+
+    host = (urllib.parse.urlparse(url).hostname or '').lower().rstrip('.')
+
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+
+    return host
+
+def try_acquire_host_slot(host, lease_id):
+    """
+    Takes one concurrency lease on host if one is free and the host's spacing and back-off allow it.
+
+    Returns:
+        float: 0 when the slot was acquired, otherwise the number of seconds to wait before trying again.
+    """
+    conn = _get_host_politeness_connection()
+    now = time.time()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT next_allowed_at, blocked_until FROM host_politeness WHERE host = ?', (host,)).fetchone()
+        next_allowed_at, blocked_until = row if row is not None else (0, 0)
+
+        conn.execute('DELETE FROM host_politeness_leases WHERE expires_at < ?', (now,))
+        active_requests = conn.execute('SELECT COUNT(*) FROM host_politeness_leases WHERE host = ?', (host,)).fetchone()[0]
+
+        if blocked_until > now or next_allowed_at > now:
+            wait_seconds = max(blocked_until, next_allowed_at) - now
+        elif active_requests >= get_host_max_concurrent():
+            wait_seconds = 0.25
+        else:
+            wait_seconds = 0
+            conn.execute('INSERT INTO host_politeness_leases (lease_id, host, expires_at) VALUES (?, ?, ?)', (lease_id, host, now + get_host_lease_seconds()))
+            conn.execute(
+                'INSERT OR REPLACE INTO host_politeness (host, next_allowed_at, blocked_until) VALUES (?, ?, ?)',
+                (host, now + get_host_min_interval(), blocked_until)
+            )
+    finally:
+        conn.execute('COMMIT')
+
+    return wait_seconds
+
+def release_host_slot(lease_id):
+    conn = _get_host_politeness_connection()
+    conn.execute('DELETE FROM host_politeness_leases WHERE lease_id = ?', (lease_id,))
+
+def record_host_wait(wait_seconds):
+    increment_counter('host_politeness.waits')
+    increment_counter('host_politeness.wait_seconds', wait_seconds)
+
+@contextmanager
+def host_slot(url):
+    if not is_host_politeness_enabled():
+        yield
+        return
+
+    host = get_host_key(url)
+    lease_id = uuid.uuid4().hex
+    started_at = time.monotonic()
+    waited = False
+
+    while True:
+        wait_seconds = try_acquire_host_slot(host, lease_id)
+
+        if wait_seconds == 0:
+            break
+
+        waited = True
+        # A little jitter keeps the 20 workers of a pool from retrying in lockstep.
+        time.sleep(wait_seconds + random.uniform(0, 0.1))
+
+    if waited:
+        record_host_wait(time.monotonic() - started_at)
+
+    try:
+        yield
+    finally:
+        release_host_slot(lease_id)
+
+@asynccontextmanager
+async def host_slot_async(url):
+    if not is_host_politeness_enabled():
+        yield
+        return
+
+    host = get_host_key(url)
+    lease_id = uuid.uuid4().hex
+    started_at = time.monotonic()
+    waited = False
+
+    while True:
+        wait_seconds = try_acquire_host_slot(host, lease_id)
+
+        if wait_seconds == 0:
+            break
+
+        waited = True
+        await asyncio.sleep(wait_seconds + random.uniform(0, 0.1))
+
+    if waited:
+        record_host_wait(time.monotonic() - started_at)
+
+    try:
+        yield
+    finally:
+        release_host_slot(lease_id)
+
+def report_host_throttled(url, retry_after=None):
+    # Being throttled by a host pauses every process's requests to it, not just the one that was rejected.
+    if not is_host_politeness_enabled():
+        return
+
+    pause_seconds = parse_retry_after(retry_after)
+    pause_seconds = pause_seconds if pause_seconds is not None else get_host_throttle_pause()
+    conn = _get_host_politeness_connection()
+    now = time.time()
+
+    conn.execute(
+        'INSERT INTO host_politeness (host, next_allowed_at, blocked_until) VALUES (?, ?, ?) '
+        'ON CONFLICT(host) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)',
+        (get_host_key(url), now, now + min(pause_seconds, get_host_lease_seconds()))
+    )
+
+    increment_counter('host_politeness.throttled_responses')
+
+def report_throttled_response(url, status, retry_after=None):
+    # A bare 503 is as often a bot challenge as an overloaded server, so it only counts with a Retry-After.
+    if status == 429 or (status == 503 and retry_after):
+        report_host_throttled(url, retry_after)
+
+def get_host_politeness_stats():
+    counters = get_counters('host_politeness.')
+
+    return {
+        'waits': int(counters.get('host_politeness.waits', 0)),
+        'wait_seconds': counters.get('host_politeness.wait_seconds', 0),
+        'throttled_responses': int(counters.get('host_politeness.throttled_responses', 0))
+    }
+
+def reset_host_politeness_stats():
+    reset_counters('host_politeness.')
@@ -0,0 +1,118 @@
+import os
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from shared_state import increment_counter, get_counters, reset_counters
+from host_politeness import host_slot, report_throttled_response
+
+load_dotenv()
+
+# Whether a domain answers, and where its redirects end up, can usually be read off a plain
+# HTTP request. The browser is only needed when the page decides that in JavaScript.
+
+_session_state = {
+    'pid': None,
+    'session': None
+}
+
+browser_headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+challenge_markers = [
+    'cf-chl', 'challenge-platform', 'just a moment...', 'attention required', 'captcha', 'ddos-guard',
+    'checking your browser', 'enable javascript and cookies', '_incapsula_resource', 'px-captcha'
+]
+
+client_redirect_patterns = [
+    re.compile(r'<meta[^>]+http-equiv=["\']?refresh', re.IGNORECASE),
+    re.compile(r'(window\.|document\.|top\.)?location(\.href)?\s*=\s*["\']', re.IGNORECASE),
+    re.compile(r'location\.(replace|assign)\s*\(', re.IGNORECASE)
+]
+
+def get_http_session():
+    if _session_state['pid'] != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=int(os.getenv('HTTP_CHECK_POOL_SIZE', 20)), pool_maxsize=int(os.getenv('HTTP_CHECK_POOL_SIZE', 20)))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(browser_headers)
+
+        _session_state['pid'] = os.getpid()
+        _session_state['session'] = session
+
+    return _session_state['session']
+
+def get_escalation_reason(response, body):
+    text = body.lower()
+
+    if response.status_code in (403, 429, 503) and any(marker in text for marker in challenge_markers):
+        return 'JS challenge'
+
+    if any(pattern.search(body) for pattern in client_redirect_patterns):
+        return 'client-side redirect'
+
+    if len(text.strip()) == 0:
+        return 'empty body'
+
+    if '<body' in text and len(re.sub(r'<script.*?</script>|<style.*?</style>|<[^>]+>|\s', '', text, flags=re.DOTALL)) == 0:
+        # An empty shell that only fills itself in with scripts.
+        return 'empty body'
+
+    return None
+
+def check_url_over_http(url):
+    """
+    Fetches url with redirects followed and the body capped at HTTP_CHECK_MAX_BYTES.
+
+    Returns:
+        dict: 'verdict' is 'reachable', 'unreachable' or 'escalate'; 'final_url' is where the redirects ended;
+            'reason' explains an unreachable or escalate verdict.
+    """
+    timeout = float(os.getenv('HTTP_CHECK_TIMEOUT_SECONDS', 15))
+    max_bytes = int(os.getenv('HTTP_CHECK_MAX_BYTES', 262144))
+
+    try:
+        with host_slot(url), get_http_session().get(url, timeout=timeout, allow_redirects=True, stream=True) as response:
+            body = b''
+            for chunk in response.iter_content(chunk_size=16384):
+                body += chunk
+                if len(body) >= max_bytes:
+                    break
+
+            body = body[:max_bytes].decode(response.encoding or 'utf-8', errors='ignore')
+            escalation_reason = get_escalation_reason(response, body)
+            final_url = response.url
+            report_throttled_response(final_url, response.status_code, response.headers.get('Retry-After'))
+    except requests.exceptions.ConnectionError as e:
+        # A name that does not resolve fails the same way in a browser; anything else may be
+        # a client fingerprinting block that a real browser gets past.
+        if 'Name or service not known' in str(e) or 'NameResolutionError' in str(e) or 'nodename nor servname' in str(e):
+            return {'verdict': 'unreachable', 'final_url': url, 'reason': f"Error processing {url}: {e}"}
+
+        return {'verdict': 'escalate', 'final_url': url, 'reason': f"connection error: {e}"}
+    except requests.exceptions.RequestException as e:
+        return {'verdict': 'escalate', 'final_url': url, 'reason': f"request error: {e}"}
+
+    if escalation_reason is not None:
+        return {'verdict': 'escalate', 'final_url': final_url, 'reason': escalation_reason}
+
+    return {'verdict': 'reachable', 'final_url': final_url, 'reason': ''}
+
+def record_http_check(verdict):
+    increment_counter(f'http_check.{verdict}')
+
+def get_http_check_stats():
+    counters = get_counters('http_check.')
+
+    return {
+        'reachable': int(counters.get('http_check.reachable', 0)),
+        'unreachable': int(counters.get('http_check.unreachable', 0)),
+        'escalated': int(counters.get('http_check.escalate', 0))
+    }
+
+def reset_http_check_stats():
+    reset_counters('http_check.')
@@ -8,13 +8,26 @@ from functools import partial
 from helpers import create_result_directory, extract_domain_name, get_main_domain, process_worker_function, calculate_openai_costs, get_serper_costs, pad_list
 from datetime import datetime
 import pandas as pd
-from company_structures_validation import validate_company_structure
-from company_websites import get_official_websites, process_website_and_get_copyrights, process_copyright_research, process_domain_research, process_link_grabber
+from company_structures_validation import validate_company_structure, plan_company_structure_validation_searches
+from company_websites import get_official_websites, process_website_and_get_copyrights, process_copyright_research, process_domain_research, process_link_grabber, plan_official_website_searches, plan_copyright_research_searches, plan_domain_research_searches
 import dill
 import numpy as np
 from company_websites_validation import validate_agentsOutput_domains, validate_linkgrabber_domains
 import json
 from accuracy_with_gtd import awgtd
+from search_cache import get_cache_stats, reset_cache_stats
+from search_single_flight import get_single_flight_stats, reset_single_flight_stats
+from search_rate_limiter import get_rate_limit_stats, reset_rate_limit_stats
+from resource_blocking import get_resource_blocking_stats, reset_resource_blocking_stats
+from http_check import get_http_check_stats, reset_http_check_stats
+from static_links import get_link_extraction_stats, reset_link_extraction_stats
+from reachability_cache import get_reachability_cache_stats, reset_reachability_cache_stats
+from page_snapshots import get_page_snapshot_stats, reset_page_snapshot_stats
+from host_politeness import get_host_politeness_stats, reset_host_politeness_stats
+from scrape_cache import get_scrape_cache_stats, reset_scrape_cache_stats
+from llm_rate_limiter import get_llm_rate_limit_stats, reset_llm_rate_limit_stats
+from llm_usage import get_llm_usage_stats, reset_llm_usage_stats
+from search_planner import create_search_plan, execute_search_plan, get_search_plan_report, close_search_plan
 
 load_dotenv()
 
@@ -32,6 +45,8 @@ with st.form(key="company_search"):
     submit_button = st.form_submit_button(label="Submit")
 
 if submit_button:
+    search_plan = None
+
     try:
         if cik_number:
             url = f"{base_url}{api_version}catalyst/sec/company?search={company_name}&cik_number={cik_number}&page=1&page_size=100"
@@ -59,12 +74,27 @@ with st.form(key="company_details_search"):
     submit_button = st.form_submit_button(label="Submit")
 
 if submit_button:
+    search_plan = None
+
     try:
         start_time = datetime.now()
         folder_name = datetime.now().strftime("%Y%m%d%H%M%S")
         result_directory = f"{company_name}_{folder_name}"
         final_results_directory = f"final_results/{result_directory}"
         log_file_paths = create_result_directory(result_directory, 'final_results')
+        reset_cache_stats()
+        reset_single_flight_stats()
+        reset_rate_limit_stats()
+        reset_resource_blocking_stats()
+        reset_http_check_stats()
+        reset_link_extraction_stats()
+        reset_reachability_cache_stats()
+        reset_page_snapshot_stats()
+        reset_host_politeness_stats()
+        reset_scrape_cache_stats()
+        reset_llm_rate_limit_stats()
+        reset_llm_usage_stats()
+        search_plan = create_search_plan()
 
         if uploaded_file is not None:
             st.write(f"File '{uploaded_file.name}' has been uploaded successfully.")
@@ -211,6 +241,16 @@ if submit_button:
 
             company_structure_set = export_df['Company Structure'].tolist()
 
+            plan_company_structure_validation_searches(search_plan, company_structure_set, company_name)
+            plan_credits = execute_search_plan(search_plan, log_file_paths['log'])
+            whole_process_serper_credits += plan_credits
+
+            with open(log_file_paths['serper'], 'a') as f:
+                f.write("\n\n")
+                f.write(f"Search plan (validating subsidiaries):\n")
+                f.write(f"Total Credits: {plan_credits}\n")
+                f.write(f"Total Cost in USD: {get_serper_costs(plan_credits)}\n")
+
             valid_subsidiaries = validate_company_structure(company_structure_set, company_name, log_file_paths)
 
             export_df = pd.DataFrame({
@@ -267,6 +307,16 @@ if submit_button:
             filtered_agents_output_list = export_df['Company Structure'].tolist()
 
         st.write("###### Finding official websites for the subsidiaries")
+        plan_official_website_searches(search_plan, filtered_agents_output_list, company_name)
+        plan_credits = execute_search_plan(search_plan, log_file_paths['log'])
+        whole_process_serper_credits += plan_credits
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Search plan (official websites):\n")
+            f.write(f"Total Credits: {plan_credits}\n")
+            f.write(f"Total Cost in USD: {get_serper_costs(plan_credits)}\n")
+
         websites = get_official_websites(filtered_agents_output_list, company_name, company_website, log_file_paths)
         total_cost_USD = calculate_openai_costs(websites['llm_usage']['prompt_tokens'], websites['llm_usage']['completion_tokens'])
 
@@ -326,6 +376,25 @@ if submit_button:
         data = export_df[['Company Name', 'Copyright']]
         data_cleaned = data.replace('N/A', np.nan).dropna(subset=['Copyright'])
 
+        df = pd.read_excel(os.path.join(final_results_directory, 'website_research_agent' + '.xlsx'))
+        websites_research_data = df['Website URL'].tolist()
+
+        unique_urls = set()
+
+        for entry in websites_research_data:
+            unique_urls.add(get_main_domain(entry.rstrip('/')))
+
+        plan_copyright_research_searches(search_plan, data_cleaned)
+        plan_domain_research_searches(search_plan, unique_urls)
+        plan_credits = execute_search_plan(search_plan, log_file_paths['log'])
+        whole_process_serper_credits += plan_credits
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Search plan (copyright and domain search):\n")
+            f.write(f"Total Credits: {plan_credits}\n")
+            f.write(f"Total Cost in USD: {get_serper_costs(plan_credits)}\n")
+
         copyright_research = process_copyright_research(data_cleaned, log_file_paths)
         with open(log_file_paths['serper'], 'a') as f:
             f.write("\n\n")
@@ -338,14 +407,6 @@ if submit_button:
         df = pd.DataFrame(copyright_research['copyright_results'], columns=['Website URL'])
         df.to_excel(os.path.join(final_results_directory, 'copyright_research_agent' + '.xlsx'), index=False, header=True)
 
-        df = pd.read_excel(os.path.join(final_results_directory, 'website_research_agent' + '.xlsx'))
-        websites_research_data = df['Website URL'].tolist()
-
-        unique_urls = set()
-
-        for entry in websites_research_data:
-            unique_urls.add(get_main_domain(entry.rstrip('/')))
-
         st.write("###### Find websites using domain search")
         domain_research = process_domain_research(unique_urls, log_file_paths)
 
@@ -402,8 +463,136 @@ if submit_button:
 
 
 
-        awgtd(validation_df,link_grabber_results,company_name,company_website,start_time,filtered_agents_output_list)
+        awgtd(validation_df,link_grabber_results,company_name,company_website,start_time,filtered_agents_output_list,search_plan)
+
+        cache_stats = get_cache_stats()
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Serper response cache:\n")
+            f.write(f"Cache Hits: {cache_stats['hits']}\n")
+            f.write(f"Cache Misses: {cache_stats['misses']}\n")
+            f.write(f"Cache Evictions: {cache_stats['evictions']}\n")
+            f.write(f"Served From Search Plan: {cache_stats['plan_hits']}\n")
+            f.write(f"Cache Entries: {cache_stats['entries']}\n")
+
+        single_flight_stats = get_single_flight_stats()
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Serper in-flight query deduplication:\n")
+            f.write(f"HTTP Calls: {single_flight_stats['http_calls']}\n")
+            f.write(f"Calls Saved: {single_flight_stats['saved_calls']}\n")
+
+        rate_limit_stats = get_rate_limit_stats()
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Serper rate limiting:\n")
+            f.write(f"Throttled Requests: {rate_limit_stats['throttled_requests']}\n")
+            f.write(f"429 Responses: {rate_limit_stats['rate_limited_responses']}\n")
+
+        search_plan_report = get_search_plan_report(search_plan)
+
+        with open(log_file_paths['serper'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Run-wide search plan:\n")
+            f.write(f"Queries Requested: {search_plan_report['requested']}\n")
+            f.write(f"Queries Sent: {search_plan_report['sent']}\n")
+            f.write(f"Queries Eliminated: {search_plan_report['eliminated']}\n")
+            f.write(f"Queries Requested By Stage: {search_plan_report['requested_by_stage']}\n")
+            f.write(f"Total Credits: {search_plan_report['serper_credits']}\n")
+
+        resource_blocking_stats = get_resource_blocking_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Browser resource blocking:\n")
+            f.write(f"Enabled: {resource_blocking_stats['enabled']}\n")
+            f.write(f"Pages: {resource_blocking_stats['pages']}\n")
+            f.write(f"Allowed Requests: {resource_blocking_stats['allowed_requests']}\n")
+            f.write(f"Blocked Requests: {resource_blocking_stats['blocked_requests']}\n")
+            f.write(f"Average Page Seconds: {resource_blocking_stats['average_page_seconds']:.2f}\n")
+
+        http_check_stats = get_http_check_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Reachability checks:\n")
+            f.write(f"Answered Over HTTP (Reachable): {http_check_stats['reachable']}\n")
+            f.write(f"Answered Over HTTP (Unreachable): {http_check_stats['unreachable']}\n")
+            f.write(f"Escalated To Browser: {http_check_stats['escalated']}\n")
+
+        link_extraction_stats = get_link_extraction_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Link extraction:\n")
+            f.write(f"Static HTML: {link_extraction_stats['static']}\n")
+            f.write(f"Browser: {link_extraction_stats['browser']}\n")
+
+        reachability_cache_stats = get_reachability_cache_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Reachability cache:\n")
+            f.write(f"Cache Hits: {reachability_cache_stats['hits']}\n")
+            f.write(f"Cache Misses: {reachability_cache_stats['misses']}\n")
+            f.write(f"Cache Entries: {reachability_cache_stats['entries']}\n")
+
+        page_snapshot_stats = get_page_snapshot_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Page snapshots:\n")
+            f.write(f"Snapshot Hits: {page_snapshot_stats['hits']}\n")
+            f.write(f"Snapshot Misses: {page_snapshot_stats['misses']}\n")
+            f.write(f"Revalidated (304): {page_snapshot_stats['revalidated']}\n")
+            f.write(f"Snapshots Written: {page_snapshot_stats['writes']}\n")
+            f.write(f"Evictions: {page_snapshot_stats['evictions']}\n")
+            f.write(f"Snapshots Stored: {page_snapshot_stats['entries']} ({page_snapshot_stats['bytes']} compressed bytes)\n")
+
+        host_politeness_stats = get_host_politeness_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Host politeness:\n")
+            f.write(f"Requests Delayed: {host_politeness_stats['waits']}\n")
+            f.write(f"Total Delay Seconds: {host_politeness_stats['wait_seconds']:.2f}\n")
+            f.write(f"Throttled Responses (429/503): {host_politeness_stats['throttled_responses']}\n")
+
+        scrape_cache_stats = get_scrape_cache_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Scraper answer cache:\n")
+            f.write(f"Cache Hits: {scrape_cache_stats['hits']}\n")
+            f.write(f"Cache Misses: {scrape_cache_stats['misses']}\n")
+            f.write(f"Cache Evictions: {scrape_cache_stats['evictions']}\n")
+            f.write(f"Cache Entries: {scrape_cache_stats['entries']}\n")
+            f.write(f"Prompt Tokens Saved: {scrape_cache_stats['saved_prompt_tokens']}\n")
+            f.write(f"Completion Tokens Saved: {scrape_cache_stats['saved_completion_tokens']}\n")
+            f.write(f"Cost Saved (USD): {scrape_cache_stats['saved_cost_USD']:.4f}\n")
+
+        llm_rate_limit_stats = get_llm_rate_limit_stats()
+
+        with open(log_file_paths['log'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Azure OpenAI rate limiting:\n")
+            f.write(f"Queued Requests: {llm_rate_limit_stats['throttled_requests']}\n")
+            f.write(f"Total Queue Seconds: {llm_rate_limit_stats['wait_seconds']:.2f}\n")
+            f.write(f"429 Responses: {llm_rate_limit_stats['rate_limited_responses']}\n")
+
+        with open(log_file_paths['llm'], 'a') as f:
+            f.write("\n\n")
+            f.write(f"Reported LLM usage by stage:\n")
+
+            for stage, usage in get_llm_usage_stats().items():
+                f.write(f"{stage}: {usage['calls']} calls, {usage['prompt_tokens']} prompt tokens, {usage['completion_tokens']} completion tokens, cost {calculate_openai_costs(usage['prompt_tokens'], usage['completion_tokens'])}\n")
 
     except Exception as e:
         st.error(f"An error occurred: {e}")
-
+    finally:
+        # A failed run must not leave the plan's pages behind.
+        if search_plan is not None:
+            close_search_plan(search_plan)
@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+from dotenv import load_dotenv
+from helpers import extract_domain_name, get_link_domains, get_static_links, get_settle_config, watch_mutations_script, dom_quiet_script, get_snapshot_response_details
+from static_links import record_link_extraction
+from reachability_cache import get_cached_reachability, set_cached_reachability
+from page_snapshots import save_page_snapshot
+from site_crawler import crawl_site_links, is_link_crawler_enabled
+from browser_pool import is_browser_headless
+from resource_blocking import blocking_heavy_resources_async
+from host_politeness import host_slot_async, report_throttled_response
+
+load_dotenv()
+
+# Link grabbing on a single Chromium: many pages spread over a few browser contexts,
+# driven from one event loop under a concurrency limit. Memory grows with the number of
+# open pages rather than with one browser per pool process.
+
+def get_link_grabber_concurrency():
+    return int(os.getenv('LINK_GRABBER_CONCURRENCY', 24))
+
+def get_link_grabber_contexts():
+    return int(os.getenv('LINK_GRABBER_CONTEXTS', 4))
+
+def is_async_link_grabber_enabled():
+    return os.getenv('LINK_GRABBER_ENGINE', 'async') == 'async'
+
+async def wait_for_page_settled_async(page):
+    settle_config = get_settle_config()
+    start = time.monotonic()
+
+    try:
+        await page.evaluate(watch_mutations_script)
+    except PlaywrightError:
+        pass
+
+    while True:
+        remaining_ms = (settle_config['max_wait_seconds'] - (time.monotonic() - start)) * 1000
+
+        if remaining_ms <= 0:
+            return time.monotonic() - start, 'hard cap'
+
+        try:
+            await page.wait_for_load_state('networkidle', timeout=min(remaining_ms, settle_config['poll_ms']))
+            return time.monotonic() - start, 'network idle'
+        except PlaywrightTimeoutError:
+            pass
+
+        try:
+            quiet = await page.evaluate(dom_quiet_script, settle_config['dom_quiet_ms'])
+
+            if quiet is None:
+                await page.evaluate(watch_mutations_script)
+            elif quiet:
+                return time.monotonic() - start, 'dom quiet'
+        except PlaywrightError:
+            pass
+
+async def get_all_links_async(context, url, log_file_path, allow_resources=None):
+    max_retries = 3
+    links = []
+
+    for attempt in range(max_retries):
+        page = None
+
+        try:
+            page = await context.new_page()
+
+            async with blocking_heavy_resources_async(page, allow_resources):
+                response = await page.goto(url, timeout=80000)
+
+                if response is not None:
+                    report_throttled_response(page.url, response.status, response.headers.get('retry-after'))
+
+                await page.wait_for_load_state('load')
+                settle_seconds, settled_by = await wait_for_page_settled_async(page)
+
+                with open(log_file_path, 'a') as f:
+                    f.write(f"\n(Link Grabber Settle) {url}: {settle_seconds:.2f}s ({settled_by})")
+
+                links = await page.eval_on_selector_all("[href]", "elements => elements.map(el => el.href)")
+                set_cached_reachability(url, {'reachable': True, 'final_url': page.url, 'reason': ''})
+                save_page_snapshot(url, page.url, *get_snapshot_response_details(response, await page.content()))
+            break
+        except PlaywrightTimeoutError as te:
+            with open(log_file_path, 'a') as f:
+                f.write(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
+            print(f"(Link Grabber2) Timeout error processing {url} on attempt {attempt + 1}: {te}")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(2)
+            else:
+                return None
+        except Exception as e:
+            with open(log_file_path, 'a') as f:
+                f.write(f"(Link Grabber2) Error processing {url}: {e}")
+            print(f"(Link Grabber2) Error processing {url}: {e}")
+            set_cached_reachability(url, {'reachable': False, 'final_url': url, 'reason': f"Error processing {url}: {e}"})
+            return None
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except PlaywrightError:
+                    pass
+
+    return links
+
+async def grab_links_async(urls, log_file_path, on_result=None, allow_resources=None):
+    semaphore = asyncio.Semaphore(get_link_grabber_concurrency())
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=is_browser_headless(), args=['--disable-http2'])
+
+        try:
+            contexts = [await browser.new_context() for _ in range(get_link_grabber_contexts())]
+
+            async def grab_url(index, url):
+                cached_reachability = get_cached_reachability(url)
+
+                if cached_reachability is not None and not cached_reachability['reachable']:
+                    return get_link_domains(url, None)
+
+                context = contexts[index % len(contexts)]
+
+                async def fetch_page_links(page_url):
+                    links = await asyncio.to_thread(get_static_links, page_url, log_file_path)
+
+                    if links is None:
+                        record_link_extraction('browser')
+
+                        # The host slot is taken before a browser slot so pages waiting on a busy
+                        # host do not hold up pages of other hosts.
+                        async with host_slot_async(page_url), semaphore:
+                            print(page_url)
+                            links = await get_all_links_async(context, page_url, log_file_path, allow_resources)
+
+                    return links
+
+                if is_link_crawler_enabled():
+                    crawl = await crawl_site_links(url, fetch_page_links, extract_domain_name)
+                    links = crawl['links']
+
+                    with open(log_file_path, 'a') as f:
+                        f.write(f"\n(Link Crawler) {url}: {crawl['pages']} pages, {len(links)} links")
+                else:
+                    links = await fetch_page_links(url)
+
+                return get_link_domains(url, links)
+
+            async def grab(index, url):
+                if not url.startswith('http://') and not url.startswith('https://'):
+                    url = f'https://{url}'
+
+                # A failure is kept to its own URL, as it was when every URL ran in its own pool task.
+                try:
+                    result = await grab_url(index, url)
+                except Exception as e:
+                    with open(log_file_path, 'a') as f:
+                        f.write(f"\n(Link Grabber) Error grabbing links of {url}: {e}")
+                    result = get_link_domains(url, None)
+
+                if on_result is not None:
+                    try:
+                        on_result(result)
+                    except Exception as e:
+                        with open(log_file_path, 'a') as f:
+                            f.write(f"\n(Link Grabber) Error recording links of {url}: {e}")
+
+                return result
+
+            return await asyncio.gather(*[grab(index, url) for index, url in enumerate(urls)])
+        finally:
+            await browser.close()
+
+def grab_links(urls, log_file_path, on_result=None, allow_resources=None):
+    """
+    Async counterpart of running get_links over a process pool.
+
+    Returns:
+        list: One {main_domain: [domains]} dict per URL, in the order of urls.
+    """
+    return asyncio.run(grab_links_async(list(urls), log_file_path, on_result, allow_resources))
@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import httpx
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+from search_rate_limiter import parse_retry_after
+
+load_dotenv()
+
+# Requests-per-minute and tokens-per-minute buckets per Azure OpenAI deployment, kept in the
+# shared sqlite state so every pool process draws from the same quota. The buckets hold ten
+# seconds' worth of quota, the window Azure enforces its limits over. Callers that find the
+# budget short queue in arrival order instead of racing, and the remaining-quota and
+# Retry-After headers of every response pull the buckets back in line with what Azure counts.
+# The check runs in an httpx event hook, so crews, chains and scraper graphs are all covered
+# by building their AzureChatOpenAI with get_llm_http_clients().
+
+deployment_pattern = re.compile(r'/deployments/([^/]+)/')
+
+def is_llm_rate_limit_enabled():
+    return os.getenv('LLM_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+
+def get_max_requests_per_minute():
+    return float(os.getenv('AZURE_OPENAI_MAX_RPM', 300))
+
+def get_max_tokens_per_minute():
+    return float(os.getenv('AZURE_OPENAI_MAX_TPM', 50000))
+
+def get_estimated_completion_tokens():
+    return int(os.getenv('AZURE_OPENAI_ESTIMATED_COMPLETION_TOKENS', 500))
+
+def get_queue_ticket_seconds():
+    # A waiter refreshes its ticket on every poll, so a ticket this old belongs to a dead process.
+    return 30
+
+def _get_llm_rate_limiter_connection():
+    conn = get_connection()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_rate_limits (
+            deployment TEXT PRIMARY KEY,
+            requests REAL NOT NULL,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            blocked_until REAL NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_rate_limit_queue (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            deployment TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def get_bucket_capacity():
+    return get_max_requests_per_minute() / 6, get_max_tokens_per_minute() / 6
+
+def get_request_deployment(request):
+    match = deployment_pattern.search(request.url.path)
+    return match.group(1) if match else os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', '')
+
+def estimate_request_tokens(request):
+    # Roughly four characters a token for the prompt, plus the completion the request allows for.
+    try:
+        body = json.loads(request.content or b'{}')
+    except ValueError:
+        return get_estimated_completion_tokens()
+
+    prompt_characters = sum(len(json.dumps(message.get('content', ''))) for message in body.get('messages', []))
+    completion_tokens = body.get('max_tokens') or get_estimated_completion_tokens()
+
+    return prompt_characters / 4 + completion_tokens
+
+def get_refilled_buckets(row, now):
+    request_capacity, token_capacity = get_bucket_capacity()
+
+    if row is None:
+        return request_capacity, token_capacity, 0
+
+    requests = min(request_capacity, row[0] + (now - row[2]) * get_max_requests_per_minute() / 60)
+    tokens = min(token_capacity, row[1] + (now - row[2]) * get_max_tokens_per_minute() / 60)
+
+    return requests, tokens, row[3]
+
+def try_acquire_llm_budget(deployment, estimated_tokens, ticket_id=None):
+    """
+    Takes one request and estimated_tokens tokens from the deployment's buckets if it is this caller's turn
+    and both have enough left.
+
+    Returns:
+        tuple: (wait_seconds, ticket_id). wait_seconds is 0 when the budget was taken; otherwise the caller
+            waits and tries again with the returned queue ticket.
+    """
+    conn = _get_llm_rate_limiter_connection()
+    now = time.time()
+    _, token_capacity = get_bucket_capacity()
+    # A request bigger than the whole bucket would never fit, so it waits for a full one instead.
+    estimated_tokens = min(estimated_tokens, token_capacity)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM llm_rate_limit_queue WHERE expires_at < ?', (now,))
+
+        if ticket_id is not None:
+            conn.execute('UPDATE llm_rate_limit_queue SET expires_at = ? WHERE ticket_id = ?', (now + get_queue_ticket_seconds(), ticket_id))
+
+        head = conn.execute('SELECT MIN(ticket_id) FROM llm_rate_limit_queue WHERE deployment = ?', (deployment,)).fetchone()[0]
+        row = conn.execute('SELECT requests, tokens, updated_at, blocked_until FROM llm_rate_limits WHERE deployment = ?', (deployment,)).fetchone()
+        requests, tokens, blocked_until = get_refilled_buckets(row, now)
+
+        if head is not None and head != ticket_id:
+            wait_seconds = 0.1
+        elif blocked_until > now:
+            wait_seconds = blocked_until - now
+        elif requests < 1 or tokens < estimated_tokens:
+            wait_seconds = max((1 - requests) * 60 / get_max_requests_per_minute(), (estimated_tokens - tokens) * 60 / get_max_tokens_per_minute())
+        else:
+            requests -= 1
+            tokens -= estimated_tokens
+            wait_seconds = 0
+
+        if wait_seconds == 0:
+            if ticket_id is not None:
+                conn.execute('DELETE FROM llm_rate_limit_queue WHERE ticket_id = ?', (ticket_id,))
+                ticket_id = None
+        elif ticket_id is None:
+            ticket_id = conn.execute(
+                'INSERT INTO llm_rate_limit_queue (deployment, expires_at) VALUES (?, ?)', (deployment, now + get_queue_ticket_seconds())
+            ).lastrowid
+
+        conn.execute(
+            'INSERT OR REPLACE INTO llm_rate_limits (deployment, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)',
+            (deployment, requests, tokens, now, blocked_until)
+        )
+    finally:
+        conn.execute('COMMIT')
+
+    return wait_seconds, ticket_id
+
+def record_llm_wait(wait_seconds):
+    increment_counter('llm_rate_limit.throttled_requests')
+    increment_counter('llm_rate_limit.wait_seconds', wait_seconds)
+
+def wait_for_llm_budget(request):
+    if not is_llm_rate_limit_enabled():
+        return
+
+    deployment = get_request_deployment(request)
+    estimated_tokens = estimate_request_tokens(request)
+    started_at = time.monotonic()
+    ticket_id = None
+
+    while True:
+        wait_seconds, ticket_id = try_acquire_llm_budget(deployment, estimated_tokens, ticket_id)
+
+        if wait_seconds == 0:
+            break
+
+        # A little jitter keeps the 20 workers of a pool from polling in lockstep.
+        time.sleep(min(wait_seconds, 1) + random.uniform(0, 0.05))
+
+    if time.monotonic() - started_at > 0.05:
+        record_llm_wait(time.monotonic() - started_at)
+
+async def wait_for_llm_budget_async(request):
+    if not is_llm_rate_limit_enabled():
+        return
+
+    deployment = get_request_deployment(request)
+    estimated_tokens = estimate_request_tokens(request)
+    started_at = time.monotonic()
+    ticket_id = None
+
+    while True:
+        wait_seconds, ticket_id = try_acquire_llm_budget(deployment, estimated_tokens, ticket_id)
+
+        if wait_seconds == 0:
+            break
+
+        await asyncio.sleep(min(wait_seconds, 1) + random.uniform(0, 0.05))
+
+    if time.monotonic() - started_at > 0.05:
+        record_llm_wait(time.monotonic() - started_at)
+
+def get_retry_after_seconds(headers):
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+
+    return parse_retry_after(headers.get('retry-after'))
+
+def apply_rate_limit_headers(response):
+    """
+    Lowers the deployment's buckets to the remaining quota Azure reports, and on a 429 pauses every
+    process on the deployment until the Retry-After has passed.
+    """
+    if not is_llm_rate_limit_enabled():
+        return
+
+    remaining_requests = response.headers.get('x-ratelimit-remaining-requests')
+    remaining_tokens = response.headers.get('x-ratelimit-remaining-tokens')
+    rate_limited = response.status_code == 429
+
+    if remaining_requests is None and remaining_tokens is None and not rate_limited:
+        return
+
+    conn = _get_llm_rate_limiter_connection()
+    deployment = get_request_deployment(response.request)
+    now = time.time()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT requests, tokens, updated_at, blocked_until FROM llm_rate_limits WHERE deployment = ?', (deployment,)).fetchone()
+        requests, tokens, blocked_until = get_refilled_buckets(row, now)
+
+        try:
+            if remaining_requests is not None:
+                requests = min(requests, float(remaining_requests))
+            if remaining_tokens is not None:
+                tokens = min(tokens, float(remaining_tokens))
+        except ValueError:
+            pass
+
+        if rate_limited:
+            retry_after_seconds = get_retry_after_seconds(response.headers)
+            pause_seconds = retry_after_seconds if retry_after_seconds is not None else float(os.getenv('AZURE_OPENAI_RATE_LIMIT_PAUSE_SECONDS', 10))
+            requests, tokens = 0, 0
+            blocked_until = max(blocked_until, now + pause_seconds)
+
+        conn.execute(
+            'INSERT OR REPLACE INTO llm_rate_limits (deployment, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)',
+            (deployment, requests, tokens, now, blocked_until)
+        )
+    finally:
+        conn.execute('COMMIT')
+
+    if rate_limited:
+        increment_counter('llm_rate_limit.rate_limited_responses')
+
+async def apply_rate_limit_headers_async(response):
+    apply_rate_limit_headers(response)
+
+def get_llm_http_clients():
+    """
+    Returns:
+        dict: 'http_client' and 'http_async_client' keyword arguments for AzureChatOpenAI that run every
+            request through the shared rate governor.
+    """
+    timeout = httpx.Timeout(float(os.getenv('AZURE_OPENAI_TIMEOUT_SECONDS', 600)), connect=10)
+
+    return {
+        'http_client': httpx.Client(
+            timeout=timeout,
+            event_hooks={'request': [wait_for_llm_budget], 'response': [apply_rate_limit_headers]}
+        ),
+        'http_async_client': httpx.AsyncClient(
+            timeout=timeout,
+            event_hooks={'request': [wait_for_llm_budget_async], 'response': [apply_rate_limit_headers_async]}
+        )
+    }
+
+def get_llm_rate_limit_stats():
+    counters = get_counters('llm_rate_limit.')
+
+    return {
+        'throttled_requests': int(counters.get('llm_rate_limit.throttled_requests', 0)),
+        'wait_seconds': counters.get('llm_rate_limit.wait_seconds', 0),
+        'rate_limited_responses': int(counters.get('llm_rate_limit.rate_limited_responses', 0))
+    }
+
+def reset_llm_rate_limit_stats():
+    reset_counters('llm_rate_limit.')
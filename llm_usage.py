@@ -0,0 +1,83 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from shared_state import increment_counter, get_counters, reset_counters
+
+# Token usage as the API reports it on each response, rather than counted again from prompt
+# text. The crew and chain LLMs carry usage_collector as a callback; whatever they return
+# inside llm_usage_scope(stage) is added to that scope, and to the run's per-stage totals.
+
+_active_scopes = contextvars.ContextVar('llm_usage_scopes', default=())
+
+def get_response_usage(response):
+    token_usage = (response.llm_output or {}).get('token_usage') or {}
+
+    if token_usage:
+        return token_usage.get('prompt_tokens', 0), token_usage.get('completion_tokens', 0)
+
+    prompt_tokens = 0
+    completion_tokens = 0
+
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+            prompt_tokens += usage_metadata.get('input_tokens', 0)
+            completion_tokens += usage_metadata.get('output_tokens', 0)
+
+    return prompt_tokens, completion_tokens
+
+class LLMUsageCollector(BaseCallbackHandler):
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs):
+        scopes = _active_scopes.get()
+
+        if not scopes:
+            return
+
+        prompt_tokens, completion_tokens = get_response_usage(response)
+
+        with self.lock:
+            for scope in scopes:
+                scope['prompt_tokens'] += prompt_tokens
+                scope['completion_tokens'] += completion_tokens
+                scope['calls'] += 1
+
+usage_collector = LLMUsageCollector()
+
+@contextmanager
+def llm_usage_scope(stage):
+    """
+    Collects the usage of every LLM response received inside the block.
+
+    Yields:
+        dict: 'prompt_tokens', 'completion_tokens' and 'calls', filled in as responses arrive.
+    """
+    usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'calls': 0}
+    token = _active_scopes.set(_active_scopes.get() + (usage,))
+
+    try:
+        yield usage
+    finally:
+        _active_scopes.reset(token)
+        increment_counter(f'llm_usage.{stage}.prompt_tokens', usage['prompt_tokens'])
+        increment_counter(f'llm_usage.{stage}.completion_tokens', usage['completion_tokens'])
+        increment_counter(f'llm_usage.{stage}.calls', usage['calls'])
+
+def get_llm_usage_stats():
+    """
+    Returns:
+        dict: {stage: {'prompt_tokens', 'completion_tokens', 'calls'}} for the stages run since the last reset.
+    """
+    stats = {}
+
+    for name, value in get_counters('llm_usage.').items():
+        stage, field = name[len('llm_usage.'):].rsplit('.', 1)
+        stats.setdefault(stage, {'prompt_tokens': 0, 'completion_tokens': 0, 'calls': 0})[field] = int(value)
+
+    return stats
+
+def reset_llm_usage_stats():
+    reset_counters('llm_usage.')
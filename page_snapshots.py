@@ -0,0 +1,201 @@
+import os
+import time
+import zlib
+import hashlib
+import urllib.parse
+import requests
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+from http_check import get_http_session
+from host_politeness import host_slot, report_throttled_response
+
+load_dotenv()
+
+SNAPSHOT_DB_NAME = 'page_snapshots.db'
+
+# Page HTML is stored once per distinct content (many domains redirect to the same page) and
+# looked up through a per-URL index that also keeps the final URL, status and validators, so the
+# link grabber, copyright extraction and the validators all share one fetch per freshness window.
+
+def is_page_snapshot_enabled():
+    return os.getenv('PAGE_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+
+def get_page_snapshot_ttl():
+    return int(os.getenv('PAGE_SNAPSHOT_TTL_SECONDS', 24 * 60 * 60))
+
+def get_page_snapshot_max_bytes():
+    return int(os.getenv('PAGE_SNAPSHOT_MAX_BYTES', 512 * 1024 * 1024))
+
+def _get_snapshot_connection():
+    conn = get_connection(SNAPSHOT_DB_NAME)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS page_snapshot_urls (
+            url_key TEXT PRIMARY KEY,
+            final_url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            rendered INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            last_accessed_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS page_snapshot_contents (
+            content_hash TEXT PRIMARY KEY,
+            html BLOB NOT NULL,
+            size INTEGER NOT NULL
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS page_snapshot_urls_last_accessed_at ON page_snapshot_urls (last_accessed_at)')
+    return conn
+
+def normalize_snapshot_url(url):
+    if not url.startswith('http://') and not url.startswith('https://'):
+        url = f'https://{url}'
+
+    parsed_url = urllib.parse.urlparse(url)
+    path = parsed_url.path or '/'
+
+    return urllib.parse.urlunparse((parsed_url.scheme.lower(), parsed_url.netloc.lower(), path, parsed_url.params, parsed_url.query, ''))
+
+def get_page_snapshot(url):
+    """
+    Returns:
+        dict: {'url', 'final_url', 'status', 'html', 'rendered', 'etag', 'last_modified', 'fresh'} or None.
+    """
+    if not is_page_snapshot_enabled():
+        return None
+
+    conn = _get_snapshot_connection()
+    url_key = normalize_snapshot_url(url)
+
+    row = conn.execute("""
+        SELECT u.final_url, u.status, c.html, u.rendered, u.etag, u.last_modified, u.fetched_at
+        FROM page_snapshot_urls u JOIN page_snapshot_contents c ON c.content_hash = u.content_hash
+        WHERE u.url_key = ?
+    """, (url_key,)).fetchone()
+
+    if row is None:
+        return None
+
+    conn.execute('UPDATE page_snapshot_urls SET last_accessed_at = ? WHERE url_key = ?', (time.time(), url_key))
+
+    return {
+        'url': url_key,
+        'final_url': row[0],
+        'status': row[1],
+        'html': zlib.decompress(row[2]).decode('utf-8'),
+        'rendered': bool(row[3]),
+        'etag': row[4],
+        'last_modified': row[5],
+        'fresh': time.time() - row[6] <= get_page_snapshot_ttl()
+    }
+
+def save_page_snapshot(url, final_url, status, html, rendered=False, etag=None, last_modified=None):
+    if not is_page_snapshot_enabled():
+        return
+
+    conn = _get_snapshot_connection()
+    compressed = zlib.compress(html.encode('utf-8'), 6)
+    content_hash = hashlib.sha256(compressed).hexdigest()
+    now = time.time()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('INSERT OR IGNORE INTO page_snapshot_contents (content_hash, html, size) VALUES (?, ?, ?)', (content_hash, compressed, len(compressed)))
+        conn.execute(
+            'INSERT OR REPLACE INTO page_snapshot_urls (url_key, final_url, status, content_hash, rendered, etag, last_modified, fetched_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (normalize_snapshot_url(url), final_url, status, content_hash, int(rendered), etag, last_modified, now, now)
+        )
+    finally:
+        conn.execute('COMMIT')
+
+    increment_counter('page_snapshots.writes')
+    evict_page_snapshots(conn)
+
+def touch_page_snapshot(url):
+    conn = _get_snapshot_connection()
+    now = time.time()
+    conn.execute('UPDATE page_snapshot_urls SET fetched_at = ?, last_accessed_at = ? WHERE url_key = ?', (now, now, normalize_snapshot_url(url)))
+
+def revalidate_page_snapshot(snapshot):
+    # A stale snapshot is still good if the server answers 304 to its validators.
+    if not snapshot['etag'] and not snapshot['last_modified']:
+        return False
+
+    headers = {}
+    if snapshot['etag']:
+        headers['If-None-Match'] = snapshot['etag']
+    if snapshot['last_modified']:
+        headers['If-Modified-Since'] = snapshot['last_modified']
+
+    try:
+        with host_slot(snapshot['url']), get_http_session().get(snapshot['url'], headers=headers, timeout=float(os.getenv('HTTP_CHECK_TIMEOUT_SECONDS', 15)), allow_redirects=True, stream=True) as response:
+            not_modified = response.status_code == 304
+            report_throttled_response(response.url, response.status_code, response.headers.get('Retry-After'))
+    except requests.exceptions.RequestException:
+        return False
+
+    if not_modified:
+        touch_page_snapshot(snapshot['url'])
+        increment_counter('page_snapshots.revalidated')
+
+    return not_modified
+
+def get_fresh_page_snapshot(url, rendered_only=False):
+    """
+    Args:
+        rendered_only (bool): Skip snapshots of the raw HTTP response, which lack whatever the page builds with JavaScript.
+    """
+    snapshot = get_page_snapshot(url)
+
+    if snapshot is None or (rendered_only and not snapshot['rendered']):
+        increment_counter('page_snapshots.misses')
+        return None
+
+    if snapshot['fresh'] or revalidate_page_snapshot(snapshot):
+        increment_counter('page_snapshots.hits')
+        return snapshot
+
+    increment_counter('page_snapshots.misses')
+    return None
+
+def evict_page_snapshots(conn=None):
+    conn = conn or _get_snapshot_connection()
+
+    total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM page_snapshot_contents').fetchone()[0]
+    overflow = total_bytes - get_page_snapshot_max_bytes()
+
+    while overflow > 0:
+        row = conn.execute('SELECT url_key FROM page_snapshot_urls ORDER BY last_accessed_at ASC LIMIT 1').fetchone()
+
+        if row is None:
+            break
+
+        conn.execute('DELETE FROM page_snapshot_urls WHERE url_key = ?', (row[0],))
+        freed = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM page_snapshot_contents WHERE content_hash NOT IN (SELECT content_hash FROM page_snapshot_urls)'
+        ).fetchone()[0]
+        conn.execute('DELETE FROM page_snapshot_contents WHERE content_hash NOT IN (SELECT content_hash FROM page_snapshot_urls)')
+
+        overflow -= freed
+        increment_counter('page_snapshots.evictions')
+
+def get_page_snapshot_stats():
+    counters = get_counters('page_snapshots.')
+    conn = _get_snapshot_connection()
+
+    return {
+        'hits': int(counters.get('page_snapshots.hits', 0)),
+        'misses': int(counters.get('page_snapshots.misses', 0)),
+        'revalidated': int(counters.get('page_snapshots.revalidated', 0)),
+        'writes': int(counters.get('page_snapshots.writes', 0)),
+        'evictions': int(counters.get('page_snapshots.evictions', 0)),
+        'entries': conn.execute('SELECT COUNT(*) FROM page_snapshot_urls').fetchone()[0],
+        'bytes': conn.execute('SELECT COALESCE(SUM(size), 0) FROM page_snapshot_contents').fetchone()[0]
+    }
+
+def reset_page_snapshot_stats():
+    reset_counters('page_snapshots.')
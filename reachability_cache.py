@@ -0,0 +1,114 @@
+import os
+import time
+import urllib.parse
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+
+load_dotenv()
+
+CACHE_DB_NAME = 'reachability_cache.db'
+
+# Failures that a retry minutes later would hit again, so they are worth remembering.
+# Timeouts and resets are left out on purpose.
+definitive_failure_markers = [
+    'ERR_NAME_NOT_RESOLVED', 'Name or service not known', 'NameResolutionError', 'nodename nor servname', 'No address associated with hostname',
+    'ERR_CERT_', 'ERR_SSL_', 'ERR_BAD_SSL_CLIENT_AUTH_CERT'
+]
+
+def is_reachability_cache_enabled():
+    return os.getenv('REACHABILITY_CACHE_ENABLED', 'true').lower() == 'true'
+
+def get_reachability_cache_ttl():
+    return int(os.getenv('REACHABILITY_CACHE_TTL_SECONDS', 24 * 60 * 60))
+
+def get_reachability_cache_negative_ttl():
+    return int(os.getenv('REACHABILITY_CACHE_NEGATIVE_TTL_SECONDS', 60 * 60))
+
+def _get_reachability_cache_connection():
+    conn = get_connection(CACHE_DB_NAME)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reachability_cache (
+            domain_key TEXT PRIMARY KEY,
+            reachable INTEGER NOT NULL,
+            final_url TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def get_reachability_key(url):
+    if not url.startswith('http://') and not url.startswith('https://'):
+        url = f'https://{url}'
+
+    netloc = (urllib.parse.urlparse(url).hostname or '').lower().rstrip('.')
+
+    if netloc.startswith('www.'):
+        netloc = netloc[len('www.'):]
+
+    return netloc
+
+def is_definitive_failure(reason):
+    return any(marker in reason for marker in definitive_failure_markers)
+
+def get_cached_reachability(url):
+    """
+    Returns:
+        dict: {'reachable', 'final_url', 'reason'} from an earlier check of the same domain, or None.
+    """
+    if not is_reachability_cache_enabled():
+        return None
+
+    conn = _get_reachability_cache_connection()
+    domain_key = get_reachability_key(url)
+
+    row = conn.execute('SELECT reachable, final_url, reason, expires_at FROM reachability_cache WHERE domain_key = ?', (domain_key,)).fetchone()
+
+    if row is None or row[3] < time.time():
+        if row is not None:
+            conn.execute('DELETE FROM reachability_cache WHERE domain_key = ?', (domain_key,))
+        increment_counter('reachability_cache.misses')
+        return None
+
+    increment_counter('reachability_cache.hits')
+
+    return {
+        'reachable': bool(row[0]),
+        'final_url': row[1],
+        'reason': row[2]
+    }
+
+def set_cached_reachability(url, reachability):
+    # Only successes and definitive failures are cached; anything else is checked again next time.
+    if not is_reachability_cache_enabled():
+        return
+
+    if reachability['reachable']:
+        ttl = get_reachability_cache_ttl()
+    elif is_definitive_failure(reachability['reason']):
+        ttl = get_reachability_cache_negative_ttl()
+    else:
+        return
+
+    conn = _get_reachability_cache_connection()
+    now = time.time()
+
+    conn.execute(
+        'INSERT OR REPLACE INTO reachability_cache (domain_key, reachable, final_url, reason, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (get_reachability_key(url), int(reachability['reachable']), reachability['final_url'], reachability['reason'], now, now + ttl)
+    )
+    conn.execute('DELETE FROM reachability_cache WHERE expires_at < ?', (now,))
+
+def get_reachability_cache_stats():
+    counters = get_counters('reachability_cache.')
+    total_entries = _get_reachability_cache_connection().execute('SELECT COUNT(*) FROM reachability_cache').fetchone()[0]
+
+    return {
+        'hits': int(counters.get('reachability_cache.hits', 0)),
+        'misses': int(counters.get('reachability_cache.misses', 0)),
+        'entries': total_entries
+    }
+
+def reset_reachability_cache_stats():
+    reset_counters('reachability_cache.')
@@ -0,0 +1,145 @@
+import os
+import time
+import urllib.parse
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+from shared_state import increment_counter, get_counters, reset_counters
+
+load_dotenv()
+
+# Link grabbing only needs the DOM and reachability checks only need the document to load,
+# so images, media, fonts, stylesheets and trackers are aborted before they are downloaded.
+
+blocked_resource_types = ['image', 'media', 'font', 'stylesheet']
+
+tracker_domains = [
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
+    'adservice.google.com', 'connect.facebook.net', 'hotjar.com', 'clarity.ms', 'segment.io', 'segment.com', 'mixpanel.com',
+    'scorecardresearch.com', 'quantserve.com', 'taboola.com', 'outbrain.com', 'criteo.com', 'adnxs.com', 'bing.com/bat',
+    'nr-data.net', 'newrelic.com', 'fullstory.com', 'mouseflow.com', 'crazyegg.com', 'hubspot.com', 'linkedin.com/px', 'ads-twitter.com'
+]
+
+def is_resource_blocking_enabled():
+    return os.getenv('RESOURCE_BLOCKING_ENABLED', 'true').lower() == 'true'
+
+def get_allowed_resources(allow_resources=None):
+    allowed = [item.strip() for item in os.getenv('RESOURCE_BLOCKING_ALLOW', '').split(',') if item.strip()]
+
+    if allow_resources:
+        allowed.extend(allow_resources)
+
+    return allowed
+
+def get_blocked_reason(resource_type, url, allow_resources=None):
+    """
+    Decides whether a request should be aborted.
+
+    Args:
+        allow_resources (list): Resource types (e.g. 'stylesheet') or URL fragments (e.g. 'fonts.googleapis.com') to let through.
+
+    Returns:
+        str: The resource type or 'tracker' when the request should be blocked, otherwise None.
+    """
+    # The page itself is never blocked, even when the company being checked is on the tracker list.
+    if resource_type == 'document':
+        return None
+
+    allowed = get_allowed_resources(allow_resources)
+
+    if resource_type in allowed or any(item in url for item in allowed):
+        return None
+
+    if resource_type in blocked_resource_types:
+        return resource_type
+
+    parsed_url = urllib.parse.urlparse(url)
+    target = f"{parsed_url.netloc}{parsed_url.path}"
+
+    if any(tracker in target for tracker in tracker_domains):
+        return 'tracker'
+
+    return None
+
+def create_blocking_stats():
+    return {'blocked': {}, 'allowed': 0}
+
+def count_request(stats, blocked_reason):
+    if blocked_reason is None:
+        stats['allowed'] += 1
+    else:
+        stats['blocked'][blocked_reason] = stats['blocked'].get(blocked_reason, 0) + 1
+
+def record_blocking_stats(stats, page_seconds):
+    # Flushed once per page instead of once per request to keep the shared sqlite quiet.
+    for reason, count in stats['blocked'].items():
+        increment_counter(f'resource_blocking.blocked.{reason}', count)
+
+    increment_counter('resource_blocking.allowed', stats['allowed'])
+    increment_counter('resource_blocking.pages', 1)
+    increment_counter('resource_blocking.page_seconds', page_seconds)
+
+@contextmanager
+def blocking_heavy_resources(page, allow_resources=None):
+    stats = create_blocking_stats()
+    start = time.monotonic()
+
+    def handle_route(route):
+        blocked_reason = get_blocked_reason(route.request.resource_type, route.request.url, allow_resources)
+        count_request(stats, blocked_reason)
+
+        if blocked_reason is None:
+            route.continue_()
+        else:
+            route.abort()
+
+    if is_resource_blocking_enabled():
+        page.route('**/*', handle_route)
+
+    try:
+        yield stats
+    finally:
+        if is_resource_blocking_enabled() and not page.is_closed():
+            # Pages go back to the browser pool, so the handler must not outlive this call.
+            page.unroute_all(behavior='ignoreErrors')
+
+        record_blocking_stats(stats, time.monotonic() - start)
+
+@asynccontextmanager
+async def blocking_heavy_resources_async(page, allow_resources=None):
+    stats = create_blocking_stats()
+    start = time.monotonic()
+
+    async def handle_route(route):
+        blocked_reason = get_blocked_reason(route.request.resource_type, route.request.url, allow_resources)
+        count_request(stats, blocked_reason)
+
+        if blocked_reason is None:
+            await route.continue_()
+        else:
+            await route.abort()
+
+    if is_resource_blocking_enabled():
+        await page.route('**/*', handle_route)
+
+    try:
+        yield stats
+    finally:
+        record_blocking_stats(stats, time.monotonic() - start)
+
+def get_resource_blocking_stats():
+    counters = get_counters('resource_blocking.')
+    pages = int(counters.get('resource_blocking.pages', 0))
+
+    return {
+        'enabled': is_resource_blocking_enabled(),
+        'pages': pages,
+        'allowed_requests': int(counters.get('resource_blocking.allowed', 0)),
+        'blocked_requests': {
+            name[len('resource_blocking.blocked.'):]: int(value)
+            for name, value in counters.items() if name.startswith('resource_blocking.blocked.')
+        },
+        'average_page_seconds': counters.get('resource_blocking.page_seconds', 0) / pages if pages else 0
+    }
+
+def reset_resource_blocking_stats():
+    reset_counters('resource_blocking.')
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+from scrapegraphai.graphs import SmartScraperGraph
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+
+load_dotenv()
+
+CACHE_DB_NAME = 'scrape_cache.db'
+
+# SmartScraperGraph answers are kept per (prompt template and version, rendered prompt, page
+# content, model deployment), so a rerun over pages that have not changed costs no LLM call.
+# Each caller keeps a *_PROMPT_VERSION constant per template next to its prompt. Bump it when the
+# wording changes, so answers given to the old wording are not reused.
+
+usage_fields = ['total_tokens', 'prompt_tokens', 'completion_tokens', 'successful_requests', 'total_cost_USD']
+
+def is_scrape_cache_enabled():
+    return os.getenv('SCRAPE_CACHE_ENABLED', 'true').lower() == 'true'
+
+def is_scrape_cache_bypassed():
+    # Forces fresh LLM calls while still storing their answers for later runs.
+    return os.getenv('SCRAPE_CACHE_BYPASS', 'false').lower() == 'true'
+
+def get_scrape_cache_ttl():
+    return int(os.getenv('SCRAPE_CACHE_TTL_SECONDS', 30 * 24 * 60 * 60))
+
+def get_scrape_cache_max_entries():
+    return int(os.getenv('SCRAPE_CACHE_MAX_ENTRIES', 20000))
+
+def _get_scrape_cache_connection():
+    conn = get_connection(CACHE_DB_NAME)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_cache (
+            cache_key TEXT PRIMARY KEY,
+            template TEXT NOT NULL,
+            result TEXT NOT NULL,
+            exec_info TEXT,
+            created_at REAL NOT NULL,
+            last_accessed_at REAL NOT NULL
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS scrape_cache_last_accessed_at ON scrape_cache (last_accessed_at)')
+    return conn
+
+def is_page_source(source):
+    return not source.startswith('http://') and not source.startswith('https://')
+
+def get_scrape_cache_key(template, template_version, prompt, source):
+    payload = json.dumps({
+        'template': template,
+        'version': template_version,
+        'prompt': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+        'page': hashlib.sha256(source.encode('utf-8')).hexdigest(),
+        'deployment': os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_total_usage(exec_info):
+    for node_info in exec_info or []:
+        if node_info.get('node_name') == 'TOTAL RESULT':
+            return node_info
+
+    return {}
+
+def get_cached_scrape(cache_key):
+    conn = _get_scrape_cache_connection()
+    now = time.time()
+
+    row = conn.execute('SELECT result, exec_info, created_at FROM scrape_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+
+    if row is None or now - row[2] > get_scrape_cache_ttl():
+        if row is not None:
+            conn.execute('DELETE FROM scrape_cache WHERE cache_key = ?', (cache_key,))
+        increment_counter('scrape_cache.misses')
+        return None
+
+    conn.execute('UPDATE scrape_cache SET last_accessed_at = ? WHERE cache_key = ?', (now, cache_key))
+
+    exec_info = json.loads(row[1]) if row[1] is not None else None
+    total_usage = get_total_usage(exec_info)
+
+    increment_counter('scrape_cache.hits')
+    increment_counter('scrape_cache.saved_prompt_tokens', total_usage.get('prompt_tokens', 0))
+    increment_counter('scrape_cache.saved_completion_tokens', total_usage.get('completion_tokens', 0))
+    increment_counter('scrape_cache.saved_cost_USD', total_usage.get('total_cost_USD', 0.0))
+
+    # Served from the cache, so the usage the callers add up is zero for this run.
+    for node_info in exec_info or []:
+        for field in usage_fields:
+            if field in node_info:
+                node_info[field] = 0
+
+    return {'result': json.loads(row[0]), 'exec_info': exec_info}
+
+def set_cached_scrape(cache_key, template, scrape):
+    conn = _get_scrape_cache_connection()
+    now = time.time()
+
+    conn.execute(
+        'INSERT OR REPLACE INTO scrape_cache (cache_key, template, result, exec_info, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (cache_key, template, json.dumps(scrape['result']), json.dumps(scrape['exec_info'], default=str) if scrape['exec_info'] is not None else None, now, now)
+    )
+
+    evict_scrape_cache_entries(conn)
+
+def evict_scrape_cache_entries(conn=None):
+    conn = conn or _get_scrape_cache_connection()
+
+    conn.execute('DELETE FROM scrape_cache WHERE created_at < ?', (time.time() - get_scrape_cache_ttl(),))
+
+    total_entries = conn.execute('SELECT COUNT(*) FROM scrape_cache').fetchone()[0]
+    overflow = total_entries - get_scrape_cache_max_entries()
+
+    if overflow > 0:
+        conn.execute(
+            'DELETE FROM scrape_cache WHERE cache_key IN (SELECT cache_key FROM scrape_cache ORDER BY last_accessed_at ASC LIMIT ?)',
+            (overflow,)
+        )
+        increment_counter('scrape_cache.evictions', overflow)
+
+def run_scraper_graph(template, template_version, prompt, source, config):
+    """
+    Runs a SmartScraperGraph over source, or returns the stored answer for the same template version,
+    prompt, page and deployment. Only page HTML is cached; a URL source is always scraped live since
+    the page behind it is unknown.
+
+    Returns:
+        dict: 'result' (the graph's parsed answer) and 'exec_info' (its execution info, with zero usage on a cache hit).
+    """
+    cacheable = is_scrape_cache_enabled() and is_page_source(source)
+    cache_key = get_scrape_cache_key(template, template_version, prompt, source) if cacheable else None
+
+    if cacheable and not is_scrape_cache_bypassed():
+        scrape = get_cached_scrape(cache_key)
+
+        if scrape is not None:
+            return scrape
+
+    smart_scraper_graph = SmartScraperGraph(
+        prompt=prompt,
+        source=source,
+        config=config,
+    )
+
+    scrape = {
+        'result': smart_scraper_graph.run(),
+        'exec_info': smart_scraper_graph.get_execution_info()
+    }
+
+    if cacheable:
+        set_cached_scrape(cache_key, template, scrape)
+
+    return scrape
+
+def get_scrape_cache_stats():
+    counters = get_counters('scrape_cache.')
+    total_entries = _get_scrape_cache_connection().execute('SELECT COUNT(*) FROM scrape_cache').fetchone()[0]
+
+    return {
+        'hits': int(counters.get('scrape_cache.hits', 0)),
+        'misses': int(counters.get('scrape_cache.misses', 0)),
+        'evictions': int(counters.get('scrape_cache.evictions', 0)),
+        'saved_prompt_tokens': int(counters.get('scrape_cache.saved_prompt_tokens', 0)),
+        'saved_completion_tokens': int(counters.get('scrape_cache.saved_completion_tokens', 0)),
+        'saved_cost_USD': counters.get('scrape_cache.saved_cost_USD', 0.0),
+        'entries': total_entries
+    }
+
+def reset_scrape_cache_stats():
+    reset_counters('scrape_cache.')
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+
+load_dotenv()
+
+CACHE_DB_NAME = 'serper_cache.db'
+
+def is_cache_enabled():
+    return os.getenv('SERPER_CACHE_ENABLED', 'true').lower() == 'true'
+
+def get_cache_ttl():
+    return int(os.getenv('SERPER_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60))
+
+def get_cache_max_entries():
+    return int(os.getenv('SERPER_CACHE_MAX_ENTRIES', 50000))
+
+def _get_cache_connection():
+    conn = get_connection(CACHE_DB_NAME)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS serper_cache (
+            cache_key TEXT PRIMARY KEY,
+            search_query TEXT NOT NULL,
+            num_results INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_accessed_at REAL NOT NULL
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS serper_cache_last_accessed_at ON serper_cache (last_accessed_at)')
+    return conn
+
+def normalize_query(search_query):
+    # Search is case-insensitive and ignores sentence punctuation, so "Acme, Inc." and "ACME Inc" are the same query.
+    # Dots inside a token are kept because they matter for site: and domain searches.
+    normalized = search_query.casefold()
+    normalized = re.sub(r'[,;!?]', ' ', normalized)
+    normalized = re.sub(r'\.(?=\s|$)', ' ', normalized)
+    return ' '.join(normalized.split())
+
+def get_cache_key(search_query, num_results, page):
+    payload = json.dumps({'q': normalize_query(search_query), 'num': num_results, 'page': page}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_response(search_query, num_results, page):
+    if not is_cache_enabled():
+        return None
+
+    conn = _get_cache_connection()
+    cache_key = get_cache_key(search_query, num_results, page)
+    now = time.time()
+
+    row = conn.execute('SELECT response, created_at FROM serper_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+
+    if row is None or now - row[1] > get_cache_ttl():
+        if row is not None:
+            conn.execute('DELETE FROM serper_cache WHERE cache_key = ?', (cache_key,))
+        increment_counter('serper_cache.misses')
+        return None
+
+    conn.execute('UPDATE serper_cache SET last_accessed_at = ? WHERE cache_key = ?', (now, cache_key))
+    increment_counter('serper_cache.hits')
+
+    response = json.loads(row[0])
+    # Served from the cache, so no Serper credits are spent on this page.
+    response['credits'] = 0
+
+    return response
+
+def set_cached_response(search_query, num_results, page, response):
+    if not is_cache_enabled():
+        return
+
+    conn = _get_cache_connection()
+    cache_key = get_cache_key(search_query, num_results, page)
+    now = time.time()
+
+    conn.execute(
+        'INSERT OR REPLACE INTO serper_cache (cache_key, search_query, num_results, page, response, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (cache_key, search_query, num_results, page, json.dumps(response), now, now)
+    )
+
+    evict_cache_entries(conn)
+
+def evict_cache_entries(conn=None):
+    conn = conn or _get_cache_connection()
+
+    conn.execute('DELETE FROM serper_cache WHERE created_at < ?', (time.time() - get_cache_ttl(),))
+
+    total_entries = conn.execute('SELECT COUNT(*) FROM serper_cache').fetchone()[0]
+    overflow = total_entries - get_cache_max_entries()
+
+    if overflow > 0:
+        conn.execute(
+            'DELETE FROM serper_cache WHERE cache_key IN (SELECT cache_key FROM serper_cache ORDER BY last_accessed_at ASC LIMIT ?)',
+            (overflow,)
+        )
+        increment_counter('serper_cache.evictions', overflow)
+
+# The pages a run's search plan fetched are kept apart from the cache until the run closes the plan,
+# so the stages are served them even with the cache disabled or the cache entry already evicted.
+# Only the run's own plan serves them: its id travels to the pool workers in SEARCH_PLAN_ID, which
+# they inherit from the process that opened the plan.
+
+def get_plan_response_ttl():
+    # Only a plan left open by a run that crashed outlives this.
+    return int(os.getenv('SEARCH_PLAN_RESPONSE_TTL_SECONDS', 24 * 60 * 60))
+
+def _get_plan_responses_connection():
+    conn = get_connection(CACHE_DB_NAME)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_plan_responses (
+            plan_id TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (plan_id, cache_key)
+        )
+    """)
+    return conn
+
+def set_planned_response(plan_id, search_query, num_results, page, response):
+    conn = _get_plan_responses_connection()
+
+    conn.execute(
+        'INSERT OR REPLACE INTO search_plan_responses (plan_id, cache_key, response, created_at) VALUES (?, ?, ?, ?)',
+        (plan_id, get_cache_key(search_query, num_results, page), json.dumps(response), time.time())
+    )
+
+def get_active_search_plan_id():
+    return os.getenv('SEARCH_PLAN_ID')
+
+def get_planned_response(search_query, num_results, page):
+    plan_id = get_active_search_plan_id()
+
+    if not plan_id:
+        return None
+
+    conn = _get_plan_responses_connection()
+
+    row = conn.execute(
+        'SELECT response FROM search_plan_responses WHERE plan_id = ? AND cache_key = ?',
+        (plan_id, get_cache_key(search_query, num_results, page))
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    increment_counter('serper_cache.plan_hits')
+
+    response = json.loads(row[0])
+    # The plan already paid for this page.
+    response['credits'] = 0
+
+    return response
+
+def clear_planned_responses(plan_id):
+    conn = _get_plan_responses_connection()
+    conn.execute('DELETE FROM search_plan_responses WHERE plan_id = ? OR created_at < ?', (plan_id, time.time() - get_plan_response_ttl()))
+
+def get_cache_stats():
+    counters = get_counters('serper_cache.')
+    total_entries = _get_cache_connection().execute('SELECT COUNT(*) FROM serper_cache').fetchone()[0]
+
+    return {
+        'hits': int(counters.get('serper_cache.hits', 0)),
+        'misses': int(counters.get('serper_cache.misses', 0)),
+        'evictions': int(counters.get('serper_cache.evictions', 0)),
+        'plan_hits': int(counters.get('serper_cache.plan_hits', 0)),
+        'entries': total_entries
+    }
+
+def reset_cache_stats():
+    reset_counters('serper_cache.')
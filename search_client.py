@@ -0,0 +1,310 @@
+import os
+import json
+import atexit
+import asyncio
+import threading
+import aiohttp
+from dotenv import load_dotenv
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+from search_cache import get_cached_response, set_cached_response, get_cache_key, get_planned_response
+from search_single_flight import single_flight_search, is_single_flight_enabled, claim_searches, release_search, finish_searches, wait_for_claimed_search
+from shared_state import increment_counter
+from search_rate_limiter import search_rate_limit, report_rate_limited, parse_retry_after
+
+load_dotenv()
+
+# Each process owns one background event loop and one aiohttp session, so the
+# keep-alive pool (and its TLS sessions) survives between synchronous calls.
+_client_state = {
+    'pid': None,
+    'loop': None,
+    'session': None
+}
+
+def get_event_loop():
+    if _client_state['pid'] != os.getpid():
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name='serper-client', daemon=True)
+        thread.start()
+
+        _client_state['pid'] = os.getpid()
+        _client_state['loop'] = loop
+        _client_state['session'] = None
+
+    return _client_state['loop']
+
+def run_sync(coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+async def get_session():
+    if _client_state['session'] is None or _client_state['session'].closed:
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv('SERPER_POOL_SIZE', 10)),
+            keepalive_timeout=int(os.getenv('SERPER_KEEPALIVE_SECONDS', 60)),
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=int(os.getenv('SERPER_TIMEOUT_SECONDS', 60)),
+            sock_connect=int(os.getenv('SERPER_CONNECT_TIMEOUT_SECONDS', 10))
+        )
+        _client_state['session'] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    return _client_state['session']
+
+async def close_session():
+    if _client_state['session'] is not None and not _client_state['session'].closed:
+        await _client_state['session'].close()
+
+@atexit.register
+def shutdown_client():
+    if _client_state['pid'] == os.getpid() and _client_state['session'] is not None:
+        try:
+            run_sync(close_session())
+        except Exception:
+            pass
+
+def get_serper_headers():
+    return {
+        "X-API-KEY": os.getenv('SERPER_API_KEY', ''),
+        "Content-Type": "application/json",
+    }
+
+class SearchAbandoned(Exception):
+    pass
+
+# Whether a page has been sent to Serper, and whether its caller stopped waiting for it, are
+# both decided under this lock, so a page is either sent and paid for or never sent at all.
+_page_state_lock = threading.Lock()
+
+def mark_page_sent(page_state):
+    if page_state is None:
+        return
+
+    with _page_state_lock:
+        if page_state['abandoned']:
+            raise SearchAbandoned()
+
+        page_state['sent'] = True
+
+def abandon_page(page_state):
+    with _page_state_lock:
+        page_state['abandoned'] = True
+        return page_state['sent']
+
+class SerperRateLimitError(Exception):
+    def __init__(self, results):
+        super().__init__('Serper rate limit exceeded')
+        self.results = results
+
+def return_rate_limited_results(retry_state):
+    # Once the retries are used up a 429 is handed back like any other Serper error response.
+    exception = retry_state.outcome.exception()
+
+    if isinstance(exception, SerperRateLimitError):
+        return exception.results
+
+    raise exception
+
+def is_rate_limited(status, results):
+    if status == 429:
+        return True
+
+    if isinstance(results, list):
+        return any(isinstance(result, dict) and result.get('statusCode') == 429 for result in results)
+
+    return isinstance(results, dict) and results.get('statusCode') == 429
+
+@retry(
+    stop=stop_after_attempt(int(os.getenv('SERPER_MAX_RETRIES', 6))),
+    wait=wait_random_exponential(multiplier=1, max=60),
+    retry=retry_if_exception_type((SerperRateLimitError, aiohttp.ClientConnectorError, aiohttp.ServerTimeoutError, asyncio.TimeoutError)),
+    retry_error_callback=return_rate_limited_results
+)
+async def post_search(payload, page_state=None):
+    async with search_rate_limit():
+        session = await get_session()
+        mark_page_sent(page_state)
+
+        async with session.post(os.getenv('SERPER_API_URL'), headers=get_serper_headers(), data=payload) as response:
+            results = await response.json(content_type=None)
+
+            if is_rate_limited(response.status, results):
+                await asyncio.to_thread(report_rate_limited, parse_retry_after(response.headers.get('Retry-After')))
+
+                if isinstance(results, dict) and 'statusCode' not in results:
+                    results = {'statusCode': 429, 'message': 'Too many requests'}
+
+                raise SerperRateLimitError(results)
+
+            return results
+
+def record_search_response(search_query, num_results, page, results, log_file_path='log.txt'):
+    if 'statusCode' in results:
+        if results['statusCode'] != 200:
+            with open(log_file_path, 'a') as f:
+                f.write(f"\n(Serper Error) Error processing search query {search_query}: {results['message']}")
+    else:
+        set_cached_response(search_query, num_results, page, results)
+
+def get_stored_response(search_query, num_results, page):
+    results = get_planned_response(search_query, num_results, page)
+
+    if results is None:
+        results = get_cached_response(search_query, num_results, page)
+
+    return results
+
+async def send_search_page(search_query, num_results, page, log_file_path='log.txt', page_state=None):
+    payload = json.dumps({"q": search_query, "num": num_results, "page": page})
+    results = await post_search(payload, page_state)
+    record_search_response(search_query, num_results, page, results, log_file_path)
+
+    return results
+
+async def fetch_search_page(search_query, num_results, page, log_file_path='log.txt', page_state=None):
+    results = get_stored_response(search_query, num_results, page)
+
+    if results is not None:
+        return results
+
+    return await single_flight_search(
+        search_query, num_results, page, lambda: send_search_page(search_query, num_results, page, log_file_path, page_state)
+    )
+
+def submit_search_page(search_query, num_results, page, log_file_path='log.txt'):
+    page_state = {'sent': False, 'abandoned': False}
+    future = asyncio.run_coroutine_threadsafe(fetch_search_page(search_query, num_results, page, log_file_path, page_state), get_event_loop())
+    future.page_state = page_state
+
+    return future
+
+def count_search_credits(usage, results):
+    if usage is not None and "organic" in results and results["organic"]:
+        usage['serper_credits'] += results['credits']
+
+def settle_search_futures(futures, usage=None):
+    # Pages already sent to Serper are paid for even if nobody reads them, so they are left to
+    # finish, counted and cached; pages that were not sent yet are cancelled.
+    for future in futures:
+        if not future.done() and not abandon_page(future.page_state):
+            future.cancel()
+
+    for future in futures:
+        if future.cancelled():
+            continue
+
+        try:
+            results = future.result()
+        except Exception:
+            continue
+
+        count_search_credits(usage, results)
+
+def iter_search_pages(search_query, num_results, num_pages=1, log_file_path='log.txt', usage=None):
+    # Page 1 is requested on its own, so a query with no results costs a single credit. Once it
+    # has results every later page is requested at once and handed back in order as soon as it
+    # arrives, so the caller can work on page 1 while the later pages are still in flight.
+    futures = [submit_search_page(search_query, num_results, 1, log_file_path)]
+    received = 0
+
+    try:
+        while received < len(futures):
+            results = futures[received].result()
+            received += 1
+            count_search_credits(usage, results)
+
+            # Serper returns nothing past the last page, so there is no point asking for the later ones.
+            if not ("organic" in results and results["organic"]):
+                yield results
+                break
+
+            if received == 1:
+                futures.extend(
+                    submit_search_page(search_query, num_results, page, log_file_path)
+                    for page in range(2, num_pages + 1)
+                )
+
+            yield results
+    finally:
+        settle_search_futures(futures[received:], usage)
+
+async def fetch_search_batch(page_requests, log_file_path='log.txt'):
+    responses = [None] * len(page_requests)
+    pending = {}
+
+    for index, (search_query, num_results, page) in enumerate(page_requests):
+        cached = get_stored_response(search_query, num_results, page)
+
+        if cached is not None:
+            responses[index] = cached
+        else:
+            pending.setdefault(get_cache_key(search_query, num_results, page), []).append(index)
+
+    pending_keys = list(pending.keys())
+
+    # Pages another process is already fetching are waited for instead of being sent again.
+    if is_single_flight_enabled():
+        claimed_keys = await asyncio.to_thread(claim_searches, pending_keys)
+        await asyncio.to_thread(increment_counter, 'single_flight.http_calls', len(claimed_keys))
+    else:
+        claimed_keys = pending_keys
+
+    claimed = set(claimed_keys)
+    held_keys = [cache_key for cache_key in pending_keys if cache_key not in claimed]
+    batch_size = int(os.getenv('SERPER_BATCH_SIZE', 100))
+    batches = [claimed_keys[i:i + batch_size] for i in range(0, len(claimed_keys), batch_size)]
+
+    def set_responses(cache_key, results):
+        indices = pending[cache_key]
+        responses[indices[0]] = results
+        # Duplicates within the batch share the single request that was sent for them.
+        for index in indices[1:]:
+            responses[index] = dict(results, credits=0)
+
+    async def send_batch(batch):
+        payload = []
+        for cache_key in batch:
+            search_query, num_results, page = page_requests[pending[cache_key][0]]
+            payload.append({"q": search_query, "num": num_results, "page": page})
+
+        try:
+            batch_results = await post_search(json.dumps(payload))
+        except BaseException:
+            if is_single_flight_enabled():
+                for cache_key in batch:
+                    release_search(cache_key)
+            raise
+
+        # An error for the whole batch comes back as a single object rather than a list.
+        if isinstance(batch_results, dict):
+            batch_results = [batch_results] * len(batch)
+        elif not isinstance(batch_results, list):
+            batch_results = []
+
+        # A query Serper left out of a short batch response gets an error response, which is not cached.
+        batch_results = batch_results[:len(batch)] + [
+            {'statusCode': 502, 'message': 'No response for this query in the Serper batch response'}
+        ] * (len(batch) - len(batch_results))
+
+        for cache_key, results in zip(batch, batch_results):
+            search_query, num_results, page = page_requests[pending[cache_key][0]]
+            record_search_response(search_query, num_results, page, results, log_file_path)
+            set_responses(cache_key, results)
+
+        if is_single_flight_enabled():
+            await asyncio.to_thread(finish_searches, list(zip(batch, batch_results)))
+
+    async def wait_for_held(cache_key):
+        search_query, num_results, page = page_requests[pending[cache_key][0]]
+        results = await wait_for_claimed_search(cache_key, lambda: send_search_page(search_query, num_results, page, log_file_path))
+        set_responses(cache_key, results)
+
+    await asyncio.gather(*[send_batch(batch) for batch in batches], *[wait_for_held(cache_key) for cache_key in held_keys])
+
+    return responses
+
+def search_page(search_query, num_results, page, log_file_path='log.txt'):
+    return run_sync(fetch_search_page(search_query, num_results, page, log_file_path))
+
+def search_batch(page_requests, log_file_path='log.txt'):
+    return run_sync(fetch_search_batch(page_requests, log_file_path))
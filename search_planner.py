@@ -0,0 +1,75 @@
+import os
+import uuid
+from tools import search_many
+from search_cache import normalize_query, set_planned_response, clear_planned_responses
+
+# A run-wide search plan. Stages register the queries they are about to send, the plan
+# drops the ones that normalize to a query already planned (in this wave or an earlier
+# one) and sends the rest as one Serper batch. The plan keeps every page it fetched
+# until the run closes it, and the stages' own searches are served from there.
+
+def create_search_plan():
+    plan_id = uuid.uuid4().hex
+    # Pool workers started from here on inherit the id and are served this plan's pages.
+    os.environ['SEARCH_PLAN_ID'] = plan_id
+
+    return {
+        'plan_id': plan_id,
+        'scheduled': {},
+        'executed': set(),
+        'requested': 0,
+        'requested_by_stage': {},
+        'serper_credits': 0
+    }
+
+def add_planned_search(plan, stage, search_query, num_results, num_pages=1):
+    plan_key = (normalize_query(search_query), num_results)
+
+    plan['requested'] += 1
+    plan['requested_by_stage'][stage] = plan['requested_by_stage'].get(stage, 0) + 1
+
+    if plan_key in plan['executed']:
+        return
+
+    if plan_key in plan['scheduled']:
+        scheduled_query, scheduled_num_results, scheduled_num_pages = plan['scheduled'][plan_key]
+        plan['scheduled'][plan_key] = (scheduled_query, scheduled_num_results, max(scheduled_num_pages, num_pages))
+    else:
+        plan['scheduled'][plan_key] = (search_query, num_results, num_pages)
+
+def execute_search_plan(plan, log_file_path='log.txt'):
+    plan_keys = list(plan['scheduled'].keys())
+
+    if len(plan_keys) == 0:
+        return 0
+
+    def keep_response(search_query, num_results, page, response):
+        # Error responses are not kept, so the stage sends that query itself.
+        if 'statusCode' not in response:
+            set_planned_response(plan['plan_id'], search_query, num_results, page, response)
+
+    results = search_many([plan['scheduled'][plan_key] for plan_key in plan_keys], log_file_path, keep_response)
+    wave_credits = sum(result['serper_credits'] for result in results)
+
+    plan['executed'].update(plan_keys)
+    plan['scheduled'] = {}
+    plan['serper_credits'] += wave_credits
+
+    return wave_credits
+
+def get_search_plan_report(plan):
+    sent = len(plan['executed'])
+
+    return {
+        'requested': plan['requested'],
+        'sent': sent,
+        'eliminated': plan['requested'] - sent,
+        'requested_by_stage': dict(plan['requested_by_stage']),
+        'serper_credits': plan['serper_credits']
+    }
+
+def close_search_plan(plan):
+    if os.environ.get('SEARCH_PLAN_ID') == plan['plan_id']:
+        del os.environ['SEARCH_PLAN_ID']
+
+    clear_planned_responses(plan['plan_id'])
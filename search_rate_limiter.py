@@ -0,0 +1,169 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import email.utils
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+
+load_dotenv()
+
+# A token bucket and a set of concurrency leases per Serper API key, kept in the shared
+# sqlite state so that every pool process draws from the same budget.
+
+def get_max_requests_per_second():
+    return float(os.getenv('SERPER_MAX_RPS', 10))
+
+def get_max_burst():
+    return float(os.getenv('SERPER_MAX_BURST', get_max_requests_per_second()))
+
+def get_max_concurrent_requests():
+    return int(os.getenv('SERPER_MAX_CONCURRENT', 10))
+
+def get_lease_seconds():
+    return int(os.getenv('SERPER_TIMEOUT_SECONDS', 60)) * 2
+
+def get_api_key_id():
+    return hashlib.sha256(os.getenv('SERPER_API_KEY', '').encode('utf-8')).hexdigest()[:16]
+
+def _get_rate_limiter_connection():
+    conn = get_connection()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_rate_limits (
+            api_key_id TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            blocked_until REAL NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_rate_limit_leases (
+            lease_id TEXT PRIMARY KEY,
+            api_key_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def try_acquire_search_slot(api_key_id, lease_id):
+    """
+    Takes one token and one concurrency lease if both are available.
+
+    Returns:
+        float: 0 when the slot was acquired, otherwise the number of seconds to wait before trying again.
+    """
+    conn = _get_rate_limiter_connection()
+    now = time.time()
+    rate = get_max_requests_per_second()
+    burst = get_max_burst()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT tokens, updated_at, blocked_until FROM search_rate_limits WHERE api_key_id = ?', (api_key_id,)).fetchone()
+
+        if row is None:
+            tokens, blocked_until = burst, 0
+        else:
+            tokens = min(burst, row[0] + (now - row[1]) * rate)
+            blocked_until = row[2]
+
+        conn.execute('DELETE FROM search_rate_limit_leases WHERE expires_at < ?', (now,))
+        active_requests = conn.execute('SELECT COUNT(*) FROM search_rate_limit_leases WHERE api_key_id = ?', (api_key_id,)).fetchone()[0]
+
+        if blocked_until > now:
+            wait_seconds = blocked_until - now
+        elif tokens < 1:
+            wait_seconds = (1 - tokens) / rate
+        elif active_requests >= get_max_concurrent_requests():
+            wait_seconds = 0.1
+        else:
+            tokens -= 1
+            wait_seconds = 0
+            conn.execute('INSERT INTO search_rate_limit_leases (lease_id, api_key_id, expires_at) VALUES (?, ?, ?)', (lease_id, api_key_id, now + get_lease_seconds()))
+
+        conn.execute(
+            'INSERT OR REPLACE INTO search_rate_limits (api_key_id, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)',
+            (api_key_id, tokens, now, blocked_until)
+        )
+    finally:
+        conn.execute('COMMIT')
+
+    return wait_seconds
+
+def release_search_slot(lease_id):
+    conn = _get_rate_limiter_connection()
+    conn.execute('DELETE FROM search_rate_limit_leases WHERE lease_id = ?', (lease_id,))
+
+@asynccontextmanager
+async def search_rate_limit():
+    api_key_id = get_api_key_id()
+    lease_id = uuid.uuid4().hex
+    waited = False
+
+    while True:
+        # Off the event loop, so waiting on the limiter's lock does not stall responses already in flight.
+        wait_seconds = await asyncio.to_thread(try_acquire_search_slot, api_key_id, lease_id)
+
+        if wait_seconds == 0:
+            break
+
+        waited = True
+        # A little jitter keeps the 20 workers of a pool from retrying in lockstep.
+        await asyncio.sleep(wait_seconds + random.uniform(0, 0.05))
+
+    if waited:
+        await asyncio.to_thread(increment_counter, 'search_rate_limit.throttled_requests')
+
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(release_search_slot, lease_id)
+
+def parse_retry_after(retry_after):
+    if not retry_after:
+        return None
+
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+
+    # A malformed date is treated like a missing header, so the caller falls back to its default pause.
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0) if retry_at else None
+
+def report_rate_limited(retry_after_seconds=None):
+    # Pause every process on this key, not just the one that was rejected.
+    pause_seconds = retry_after_seconds if retry_after_seconds is not None else float(os.getenv('SERPER_RATE_LIMIT_PAUSE_SECONDS', 1))
+    conn = _get_rate_limiter_connection()
+    now = time.time()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(
+            'INSERT INTO search_rate_limits (api_key_id, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?) '
+            'ON CONFLICT(api_key_id) DO UPDATE SET tokens = 0, updated_at = excluded.updated_at, blocked_until = MAX(blocked_until, excluded.blocked_until)',
+            (get_api_key_id(), now, now + pause_seconds)
+        )
+    finally:
+        conn.execute('COMMIT')
+
+    increment_counter('search_rate_limit.rate_limited_responses')
+
+def get_rate_limit_stats():
+    counters = get_counters('search_rate_limit.')
+
+    return {
+        'throttled_requests': int(counters.get('search_rate_limit.throttled_requests', 0)),
+        'rate_limited_responses': int(counters.get('search_rate_limit.rate_limited_responses', 0))
+    }
+
+def reset_rate_limit_stats():
+    reset_counters('search_rate_limit.')
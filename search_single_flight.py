@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import asyncio
+from dotenv import load_dotenv
+from shared_state import get_connection, increment_counter, get_counters, reset_counters
+from search_cache import get_cache_key
+
+load_dotenv()
+
+# Every pool process talks to the same sqlite table. The first process to claim a query
+# performs the HTTP call and publishes the response; the others poll for it instead of
+# sending a duplicate request.
+
+def is_single_flight_enabled():
+    return os.getenv('SERPER_SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+
+def get_stale_claim_seconds():
+    return int(os.getenv('SERPER_SINGLE_FLIGHT_STALE_SECONDS', 180))
+
+def get_result_ttl():
+    return int(os.getenv('SERPER_SINGLE_FLIGHT_RESULT_TTL_SECONDS', 30))
+
+def _get_single_flight_connection():
+    conn = get_connection()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_in_flight (
+            cache_key TEXT PRIMARY KEY,
+            owner_pid INTEGER NOT NULL,
+            started_at REAL NOT NULL,
+            response TEXT,
+            finished_at REAL
+        )
+    """)
+    return conn
+
+def claim_search(cache_key):
+    conn = _get_single_flight_connection()
+    now = time.time()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT started_at, finished_at FROM search_in_flight WHERE cache_key = ?', (cache_key,)).fetchone()
+
+        is_free = (
+            row is None
+            or (row[1] is None and now - row[0] > get_stale_claim_seconds())
+            or (row[1] is not None and now - row[1] > get_result_ttl())
+        )
+
+        if is_free:
+            conn.execute(
+                'INSERT OR REPLACE INTO search_in_flight (cache_key, owner_pid, started_at, response, finished_at) VALUES (?, ?, ?, NULL, NULL)',
+                (cache_key, os.getpid(), now)
+            )
+            conn.execute('DELETE FROM search_in_flight WHERE finished_at IS NOT NULL AND finished_at < ?', (now - get_result_ttl(),))
+    finally:
+        conn.execute('COMMIT')
+
+    return is_free
+
+def publish_search(cache_key, response):
+    conn = _get_single_flight_connection()
+    conn.execute(
+        'UPDATE search_in_flight SET response = ?, finished_at = ? WHERE cache_key = ? AND owner_pid = ?',
+        (json.dumps(response), time.time(), cache_key, os.getpid())
+    )
+
+def release_search(cache_key):
+    conn = _get_single_flight_connection()
+    conn.execute('DELETE FROM search_in_flight WHERE cache_key = ? AND owner_pid = ? AND finished_at IS NULL', (cache_key, os.getpid()))
+
+def get_search_row(cache_key):
+    conn = _get_single_flight_connection()
+    return conn.execute('SELECT response FROM search_in_flight WHERE cache_key = ?', (cache_key,)).fetchone()
+
+async def wait_for_search(cache_key):
+    deadline = time.time() + get_stale_claim_seconds()
+
+    while time.time() < deadline:
+        row = await asyncio.to_thread(get_search_row, cache_key)
+
+        # The owner gave up without a response, so the caller has to send the query itself.
+        if row is None:
+            return None
+
+        if row[0] is not None:
+            return json.loads(row[0])
+
+        await asyncio.sleep(0.2)
+
+    return None
+
+def claim_searches(cache_keys):
+    return [cache_key for cache_key in cache_keys if claim_search(cache_key)]
+
+def finish_search(cache_key, response):
+    # Error bodies (a 429 once the retries are used up, a bad key) are not shared, so the
+    # waiters send the query themselves instead of all getting the error.
+    if 'statusCode' in response:
+        release_search(cache_key)
+    else:
+        publish_search(cache_key, response)
+
+def finish_searches(cache_key_responses):
+    for cache_key, response in cache_key_responses:
+        finish_search(cache_key, response)
+
+async def wait_for_claimed_search(cache_key, fetch):
+    """
+    Returns the response the process holding cache_key publishes, or what fetch() returns if it gives up without one.
+    """
+    response = await wait_for_search(cache_key)
+
+    if response is None:
+        await asyncio.to_thread(increment_counter, 'single_flight.http_calls')
+        return await fetch()
+
+    await asyncio.to_thread(increment_counter, 'single_flight.saved_calls')
+    # The owner already paid for this page, so the coalesced copy costs nothing.
+    response['credits'] = 0
+
+    return response
+
+async def single_flight_search(search_query, num_results, page, fetch):
+    # The sqlite calls run off the event loop, so waiting on a busy database stalls only this
+    # caller and not every other Serper page in flight on the same loop.
+    if not is_single_flight_enabled():
+        return await fetch()
+
+    cache_key = get_cache_key(search_query, num_results, page)
+
+    if await asyncio.to_thread(claim_search, cache_key):
+        await asyncio.to_thread(increment_counter, 'single_flight.http_calls')
+        try:
+            response = await fetch()
+        except BaseException:
+            # Released in place: a cancelled task may not get to await anything more.
+            release_search(cache_key)
+            raise
+
+        await asyncio.to_thread(finish_search, cache_key, response)
+        return response
+
+    return await wait_for_claimed_search(cache_key, fetch)
+
+def get_single_flight_stats():
+    counters = get_counters('single_flight.')
+
+    return {
+        'http_calls': int(counters.get('single_flight.http_calls', 0)),
+        'saved_calls': int(counters.get('single_flight.saved_calls', 0))
+    }
+
+def reset_single_flight_stats():
+    reset_counters('single_flight.')
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from search_cache import normalize_query
+
+load_dotenv()
+
+# Local stand-in for SERPER_API_URL so the search path can be exercised offline:
+#   python serper_stub_server.py --port 8900
+#   SERPER_API_URL=http://127.0.0.1:8900/search
+#
+# Modes:
+#   synthetic  deterministic generated results (default)
+#   record     forwards to the real Serper API and stores every response as a fixture
+#   replay     serves stored fixtures only, so a pipeline run is fully reproducible
+
+def build_synthetic_response(search_query, num_results, page, max_pages):
+    if page > max_pages:
+        return {
+            'searchParameters': {'q': search_query, 'num': num_results, 'page': page},
+            'organic': [],
+            'credits': 1
+        }
+
+    seed = hashlib.sha256(search_query.encode('utf-8')).hexdigest()[:8]
+    organic = []
+
+    for position in range(1, num_results + 1):
+        rank = (page - 1) * num_results + position
+        organic.append({
+            'title': f"{search_query} result {rank}",
+            'link': f"https://www.stub-{seed}-{rank}.com/",
+            'snippet': f"Synthetic result {rank} for {search_query}.",
+            'position': rank
+        })
+
+    return {
+        'searchParameters': {'q': search_query, 'num': num_results, 'page': page},
+        'organic': organic,
+        'credits': 1
+    }
+
+def get_fixture_key(search_request):
+    fixture_request = {
+        'q': normalize_query(search_request.get('q', '')),
+        'num': int(search_request.get('num', 10)),
+        'page': int(search_request.get('page', 1))
+    }
+    return hashlib.sha256(json.dumps(fixture_request, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_fixture_path(fixtures_directory, search_request):
+    return os.path.join(fixtures_directory, f"{get_fixture_key(search_request)}.json")
+
+def load_fixture(fixtures_directory, search_request):
+    fixture_path = get_fixture_path(fixtures_directory, search_request)
+
+    if not os.path.exists(fixture_path):
+        return None
+
+    with open(fixture_path, 'r') as f:
+        return json.load(f)['response']
+
+def save_fixture(fixtures_directory, search_request, response):
+    os.makedirs(fixtures_directory, exist_ok=True)
+    fixture_path = get_fixture_path(fixtures_directory, search_request)
+
+    with open(f"{fixture_path}.tmp", 'w') as f:
+        json.dump({'request': search_request, 'response': response}, f, indent=4)
+    os.replace(f"{fixture_path}.tmp", fixture_path)
+
+class SerperStubHandler(BaseHTTPRequestHandler):
+    mode = 'synthetic'
+    max_pages = 2
+    fixtures_directory = 'fixtures/serper'
+    upstream_url = None
+    upstream_api_key = None
+    latency_ms = 0
+    latency_jitter_ms = 0
+    error_rate = 0.0
+    random_generator = random.Random(0)
+    random_lock = threading.Lock()
+
+    def build_response(self, search_request):
+        if self.mode == 'replay':
+            response = load_fixture(self.fixtures_directory, search_request)
+
+            if response is None:
+                return {'statusCode': 404, 'message': f"No recorded fixture for search query {search_request.get('q', '')}"}
+
+            return response
+
+        return build_synthetic_response(
+            search_request.get('q', ''),
+            int(search_request.get('num', 10)),
+            int(search_request.get('page', 1)),
+            self.max_pages
+        )
+
+    def forward_to_upstream(self, payload):
+        response = requests.post(
+            self.upstream_url,
+            headers={"X-API-KEY": self.upstream_api_key, "Content-Type": "application/json"},
+            data=json.dumps(payload),
+            timeout=60
+        )
+        results = response.json()
+
+        if response.status_code == 200:
+            search_requests = payload if isinstance(payload, list) else [payload]
+            search_results = results if isinstance(results, list) else [results]
+
+            for search_request, search_result in zip(search_requests, search_results):
+                if 'statusCode' not in search_result:
+                    save_fixture(self.fixtures_directory, search_request, search_result)
+
+        return response.status_code, results
+
+    def inject_faults(self):
+        with self.random_lock:
+            latency = self.latency_ms + self.random_generator.uniform(0, self.latency_jitter_ms)
+            fail = self.random_generator.random() < self.error_rate
+            rate_limited = self.random_generator.random() < 0.5
+
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+        if not fail:
+            return False
+
+        if rate_limited:
+            self.send_json(429, {'statusCode': 429, 'message': 'Too many requests (injected)'}, {'Retry-After': '1'})
+        else:
+            self.send_json(500, {'statusCode': 500, 'message': 'Internal server error (injected)'})
+
+        return True
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(content_length) or b'{}')
+
+        if self.inject_faults():
+            return
+
+        if self.mode == 'record':
+            status, response = self.forward_to_upstream(payload)
+            self.send_json(status, response)
+            return
+
+        # Serper's batch format is a JSON array of search objects answered by an array in the same order.
+        if isinstance(payload, list):
+            response = [self.build_response(search_request) for search_request in payload]
+        else:
+            response = self.build_response(payload)
+
+        self.send_json(200, response)
+
+    def send_json(self, status, response, headers=None):
+        body = json.dumps(response).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run_stub_server(host='127.0.0.1', port=8900, max_pages=2, mode='synthetic', fixtures_directory='fixtures/serper',
+                    upstream_url=None, latency_ms=0, latency_jitter_ms=0, error_rate=0.0, seed=0):
+    if mode == 'record' and not upstream_url:
+        raise ValueError('Record mode needs an upstream Serper URL (--upstream-url or SERPER_STUB_UPSTREAM_URL).')
+
+    SerperStubHandler.mode = mode
+    SerperStubHandler.max_pages = max_pages
+    SerperStubHandler.fixtures_directory = fixtures_directory
+    SerperStubHandler.upstream_url = upstream_url
+    SerperStubHandler.upstream_api_key = os.getenv('SERPER_API_KEY')
+    SerperStubHandler.latency_ms = latency_ms
+    SerperStubHandler.latency_jitter_ms = latency_jitter_ms
+    SerperStubHandler.error_rate = error_rate
+    SerperStubHandler.random_generator = random.Random(seed)
+
+    server = ThreadingHTTPServer((host, port), SerperStubHandler)
+    print(f"Serper stub server ({mode}) listening on http://{host}:{port}/search")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Serper search API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERPER_STUB_PORT', 8900)))
+    parser.add_argument('--mode', choices=['synthetic', 'record', 'replay'], default=os.getenv('SERPER_STUB_MODE', 'synthetic'))
+    parser.add_argument('--fixtures-directory', default=os.getenv('SERPER_STUB_FIXTURES_DIRECTORY', 'fixtures/serper'))
+    parser.add_argument('--upstream-url', default=os.getenv('SERPER_STUB_UPSTREAM_URL'), help='Real Serper endpoint used in record mode.')
+    parser.add_argument('--max-pages', type=int, default=2, help='Pages with results per query before an empty page is returned (synthetic mode).')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency added to every response.')
+    parser.add_argument('--latency-jitter-ms', type=float, default=0, help='Random extra latency of up to this many milliseconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with an injected 429 or 500.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for injected latency and errors.')
+    args = parser.parse_args()
+
+    run_stub_server(
+        args.host, args.port, args.max_pages, args.mode, args.fixtures_directory, args.upstream_url,
+        args.latency_ms, args.latency_jitter_ms, args.error_rate, args.seed
+    )
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connections are opened lazily per process and thread so that pool workers forked from
+# the streamlit process never reuse the parent's sqlite handle.
+_connections = {}
+
+def get_cache_directory():
+    cache_directory = os.getenv('CACHE_DIRECTORY')
+
+    if not cache_directory:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        cache_directory = os.path.join(script_dir, 'cache')
+
+    os.makedirs(cache_directory, exist_ok=True)
+
+    return cache_directory
+
+def get_connection(db_name='shared_state.db'):
+    db_path = os.path.join(get_cache_directory(), db_name)
+    key = (os.getpid(), threading.get_ident(), db_path)
+
+    if key not in _connections:
+        conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=60000')
+        _connections[key] = conn
+
+    return _connections[key]
+
+def _get_counters_connection():
+    conn = get_connection()
+    conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL DEFAULT 0)')
+    return conn
+
+def increment_counter(name, amount=1):
+    conn = _get_counters_connection()
+    conn.execute(
+        'INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+        (name, amount)
+    )
+
+def get_counters(prefix=''):
+    conn = _get_counters_connection()
+    rows = conn.execute('SELECT name, value FROM counters WHERE substr(name, 1, ?) = ?', (len(prefix), prefix)).fetchall()
+
+    return {name: value for name, value in rows}
+
+def reset_counters(prefix=''):
+    conn = _get_counters_connection()
+    conn.execute('DELETE FROM counters WHERE substr(name, 1, ?) = ?', (len(prefix), prefix))
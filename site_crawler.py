@@ -0,0 +1,155 @@
+import os
+import heapq
+import asyncio
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Brand and subsidiary links tend to sit on /about, /brands, /our-companies or the legal pages
+# rather than on the homepage, so the crawler follows same-site links a few levels deep, keyword
+# matches first, within a page budget. Fetching is left to the caller so the crawl runs on the
+# same static HTTP and browser paths as a single-page grab.
+
+skipped_extensions = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.css', '.js', '.json', '.xml', '.zip',
+    '.mp4', '.mp3', '.mov', '.avi', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.rss', '.woff', '.woff2'
+)
+
+def is_link_crawler_enabled():
+    return os.getenv('LINK_CRAWLER_ENABLED', 'false').lower() == 'true'
+
+def get_crawler_config():
+    return {
+        'max_depth': int(os.getenv('LINK_CRAWLER_MAX_DEPTH', 2)),
+        'max_pages': int(os.getenv('LINK_CRAWLER_MAX_PAGES', 10)),
+        'concurrency': int(os.getenv('LINK_CRAWLER_CONCURRENCY', 4)),
+        'keywords': [
+            keyword.strip().lower() for keyword in os.getenv(
+                'LINK_CRAWLER_KEYWORDS',
+                'about,brand,compan,subsidiar,portfolio,group,business,who-we-are,our-,family,legal,imprint,impressum,investor,corporate,footer'
+            ).split(',') if keyword.strip()
+        ]
+    }
+
+def normalize_crawl_url(url):
+    # Queries and fragments are dropped so faceted listings and anchors do not eat the page budget.
+    parsed_url = urllib.parse.urlparse(url)
+    path = parsed_url.path.rstrip('/') or '/'
+    return urllib.parse.urlunparse((parsed_url.scheme.lower(), parsed_url.netloc.lower(), path, '', '', ''))
+
+def get_crawl_priority(url, keywords):
+    path = urllib.parse.urlparse(url).path.lower()
+    return -sum(1 for keyword in keywords if keyword in path)
+
+def is_crawlable(url):
+    parsed_url = urllib.parse.urlparse(url)
+    return parsed_url.scheme in ('http', 'https') and not parsed_url.path.lower().endswith(skipped_extensions)
+
+def create_crawl_state(start_url, get_site_key, crawler_config=None):
+    return {
+        'config': crawler_config or get_crawler_config(),
+        'get_site_key': get_site_key,
+        'site_key': get_site_key(start_url),
+        'frontier': [(0, 0, 0, start_url)],
+        'sequence': 0,
+        'visited': {normalize_crawl_url(start_url)},
+        'links': {},
+        'pages': 0
+    }
+
+def can_schedule_crawl_page(state, in_flight_count):
+    return bool(state['frontier']) and in_flight_count < state['config']['concurrency'] and state['pages'] < state['config']['max_pages']
+
+def next_crawl_page(state):
+    _, depth, _, url = heapq.heappop(state['frontier'])
+    state['pages'] += 1
+    return url, depth
+
+def add_crawled_page(state, depth, page_links):
+    for link in page_links or []:
+        if not isinstance(link, str):
+            continue
+
+        state['links'].setdefault(link, None)
+
+        if depth >= state['config']['max_depth'] or not is_crawlable(link):
+            continue
+
+        normalized_link = normalize_crawl_url(link)
+
+        if normalized_link in state['visited'] or state['get_site_key'](link) != state['site_key']:
+            continue
+
+        state['visited'].add(normalized_link)
+        state['sequence'] += 1
+        heapq.heappush(state['frontier'], (get_crawl_priority(link, state['config']['keywords']), depth + 1, state['sequence'], link))
+
+def get_crawl_result(state):
+    return {
+        'links': list(state['links'].keys()),
+        'pages': state['pages']
+    }
+
+async def crawl_site_links(start_url, fetch_page_links, get_site_key, crawler_config=None):
+    """
+    Crawls the site of start_url and returns every link found on the pages visited.
+
+    Args:
+        fetch_page_links (callable): Coroutine function taking a URL and returning its absolute links, or None on failure.
+        get_site_key (callable): Maps a URL to the site it belongs to; only links on the start URL's site are followed.
+
+    Returns:
+        dict: 'links' (every link seen, duplicates removed) and 'pages' (number of pages fetched).
+    """
+    state = create_crawl_state(start_url, get_site_key, crawler_config)
+    in_flight = {}
+
+    while state['frontier'] or in_flight:
+        while can_schedule_crawl_page(state, len(in_flight)):
+            url, depth = next_crawl_page(state)
+            in_flight[asyncio.ensure_future(fetch_page_links(url))] = depth
+
+        if not in_flight:
+            break
+
+        done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            depth = in_flight.pop(task)
+            # A page that failed to fetch only ends its own branch of the crawl.
+            add_crawled_page(state, depth, task.result() if task.exception() is None else None)
+
+    return get_crawl_result(state)
+
+def crawl_site_links_sync(start_url, fetch_static_links, fetch_browser_links, get_site_key, crawler_config=None):
+    """
+    Thread-based counterpart of crawl_site_links for callers on the sync Playwright API, which cannot run
+    inside an event loop. Static fetches run concurrently in worker threads; pages that need the browser
+    are fetched on the calling thread, which owns the pooled browser.
+    """
+    state = create_crawl_state(start_url, get_site_key, crawler_config)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=state['config']['concurrency']) as executor:
+        while state['frontier'] or in_flight:
+            while can_schedule_crawl_page(state, len(in_flight)):
+                url, depth = next_crawl_page(state)
+                in_flight[executor.submit(fetch_static_links, url)] = (url, depth)
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                url, depth = in_flight.pop(future)
+                page_links = future.result() if future.exception() is None else None
+
+                if page_links is None:
+                    page_links = fetch_browser_links(url)
+
+                add_crawled_page(state, depth, page_links)
+
+    return get_crawl_result(state)
@@ -0,0 +1,133 @@
+import os
+import urllib.parse
+import requests
+from lxml import etree
+from dotenv import load_dotenv
+from http_check import get_http_session, get_escalation_reason
+from page_snapshots import get_fresh_page_snapshot, save_page_snapshot
+from shared_state import increment_counter, get_counters, reset_counters
+from host_politeness import host_slot, report_throttled_response
+
+load_dotenv()
+
+# Server-rendered sites carry all of their hrefs in the raw HTML, so the anchors are read
+# straight off the response with a streaming parser and the browser is kept for the pages
+# that only build their links in JavaScript.
+
+def is_static_link_extraction_enabled():
+    return os.getenv('STATIC_LINK_EXTRACTION_ENABLED', 'true').lower() == 'true'
+
+def get_static_links_min_links():
+    return int(os.getenv('STATIC_LINKS_MIN_LINKS', 10))
+
+def read_hrefs(parser, hrefs, base_url):
+    # Drains the parser's pending events into hrefs and returns the base URL in effect.
+    for event, element in parser.read_events():
+        if event == 'end':
+            # Attributes were read on 'start'; dropping finished elements keeps memory flat on large pages.
+            element.clear(keep_tail=True)
+            continue
+
+        href = element.get('href')
+
+        if href is None:
+            continue
+
+        if element.tag == 'base':
+            base_url = urllib.parse.urljoin(base_url, href.strip())
+        else:
+            hrefs.append(href.strip())
+
+    return base_url
+
+def get_snapshot_links(snapshot):
+    hrefs = []
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    html = snapshot['html'].encode('utf-8')
+    base_url = snapshot['final_url']
+
+    for start in range(0, len(html), 65536):
+        parser.feed(html[start:start + 65536])
+        base_url = read_hrefs(parser, hrefs, base_url)
+
+    return [urllib.parse.urljoin(base_url, href) for href in hrefs]
+
+def extract_static_links(url):
+    """
+    Collects every href in the document at url, resolved against the final URL (or <base href>). A fresh page
+    snapshot is used when there is one; otherwise the page is fetched over HTTP and stored as a snapshot.
+
+    Returns:
+        dict: 'links' (list of absolute URLs), 'final_url' and 'fallback_reason', which is None when the links
+            can be trusted and otherwise says why the browser should be used instead.
+    """
+    snapshot = get_fresh_page_snapshot(url)
+
+    if snapshot is not None:
+        # Only rendered pages and static pages that passed the checks below are ever stored.
+        return {'links': get_snapshot_links(snapshot), 'final_url': snapshot['final_url'], 'fallback_reason': None}
+
+    timeout = float(os.getenv('HTTP_CHECK_TIMEOUT_SECONDS', 15))
+    max_bytes = int(os.getenv('STATIC_LINKS_MAX_BYTES', 2097152))
+    head_bytes = int(os.getenv('HTTP_CHECK_MAX_BYTES', 262144))
+
+    hrefs = []
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+
+    try:
+        with host_slot(url), get_http_session().get(url, timeout=timeout, allow_redirects=True, stream=True) as response:
+            report_throttled_response(response.url, response.status_code, response.headers.get('Retry-After'))
+            content_type = response.headers.get('Content-Type', 'text/html').lower()
+
+            if 'html' not in content_type:
+                return {'links': [], 'final_url': response.url, 'fallback_reason': 'not html'}
+
+            base_url = response.url
+            body = b''
+
+            for chunk in response.iter_content(chunk_size=16384):
+                parser.feed(chunk)
+                body += chunk
+                base_url = read_hrefs(parser, hrefs, base_url)
+
+                if len(body) >= max_bytes:
+                    break
+
+            encoding = response.encoding if 'charset' in content_type else 'utf-8'
+            escalation_reason = get_escalation_reason(response, body[:head_bytes].decode(encoding or 'utf-8', errors='ignore'))
+            final_url = response.url
+            status = response.status_code
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    except requests.exceptions.RequestException as e:
+        return {'links': [], 'final_url': url, 'fallback_reason': f"request error: {e}"}
+    except etree.LxmlError as e:
+        return {'links': [], 'final_url': url, 'fallback_reason': f"parse error: {e}"}
+
+    if escalation_reason is not None:
+        return {'links': [], 'final_url': final_url, 'fallback_reason': escalation_reason}
+
+    if len(hrefs) < get_static_links_min_links():
+        return {'links': [], 'final_url': final_url, 'fallback_reason': f"only {len(hrefs)} links"}
+
+    save_page_snapshot(url, final_url, status, body.decode(encoding or 'utf-8', errors='ignore'), False, etag, last_modified)
+
+    return {
+        'links': [urllib.parse.urljoin(base_url, href) for href in hrefs],
+        'final_url': final_url,
+        'fallback_reason': None
+    }
+
+def record_link_extraction(path):
+    increment_counter(f'link_extraction.{path}')
+
+def get_link_extraction_stats():
+    counters = get_counters('link_extraction.')
+
+    return {
+        'static': int(counters.get('link_extraction.static', 0)),
+        'browser': int(counters.get('link_extraction.browser', 0))
+    }
+
+def reset_link_extraction_stats():
+    reset_counters('link_extraction.')
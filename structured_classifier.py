@@ -0,0 +1,47 @@
+import os
+from typing import List, Literal
+from pydantic import BaseModel, Field
+from langchain_core.messages import SystemMessage, HumanMessage
+from llm_usage import llm_usage_scope
+
+# Single-shot yes/no classifications sent as one chat completion whose answer comes back through a
+# function call, and is validated into a typed record, instead of a one-agent, one-task crew per
+# item. Function calling rather than a json_schema response format, because the API version the
+# deployments are pinned to predates structured outputs. CLASSIFIER_ENGINE=crewai puts the crews back.
+
+def get_classifier_engine():
+    return 'crewai' if os.getenv('CLASSIFIER_ENGINE', 'direct').lower() == 'crewai' else 'direct'
+
+def is_direct_classifier_enabled():
+    return get_classifier_engine() == 'direct'
+
+class DomainValidation(BaseModel):
+    """Whether a domain is officially associated with the company."""
+    is_associated: Literal['Yes', 'No'] = Field(description="'Yes' if the search results show the domain is associated with the company, otherwise 'No'.")
+    reason: str = Field(description='Short reason for the decision, based only on the search results.')
+
+class CompanyStructureValidation(BaseModel):
+    """Whether a company is related to the main company."""
+    is_related: Literal['Yes', 'No', 'N/A'] = Field(description="'Yes' if related, 'No' if not, 'N/A' if the search results are not conclusive.")
+    source: str = Field(description="URL of the search result that confirms the decision, or 'N/A'.")
+
+class SubsidiaryWebsites(BaseModel):
+    """Official websites of a company."""
+    websites: List[str] = Field(description='Every possible official website of the company, as full URLs.')
+
+def classify(llm, instructions, prompt, schema, stage):
+    """
+    Asks llm for one record of the schema.
+
+    Returns:
+        tuple: (record, llm_usage) with llm_usage as yielded by llm_usage_scope(stage).
+    """
+    structured_llm = llm.with_structured_output(schema, method='function_calling')
+
+    with llm_usage_scope(stage) as llm_usage:
+        record = structured_llm.invoke([SystemMessage(content=instructions), HumanMessage(content=prompt)])
+
+    if record is None:
+        raise ValueError(f"No {schema.__name__} returned by the model.")
+
+    return record, llm_usage
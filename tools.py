@@ -1,40 +1,164 @@
 import os
 import requests
 import json
+from typing import NamedTuple
 from dotenv import load_dotenv
-from helpers import make_request
+from search_client import iter_search_pages, submit_search_page, count_search_credits, settle_search_futures, search_batch
+from helpers import extract_domain_name
 
 load_dotenv()
 
+class SearchHit(NamedTuple):
+    # The only parts of a Serper organic result the pipeline reads. Tuple-backed so that the
+    # results pool workers send back pickle small and whole stages of them stay cheap to hold.
+    link: str
+    title: str = ''
+    snippet: str = ''
+    sitelinks: tuple = ()
+
+    @classmethod
+    def from_result(cls, result):
+        return cls(
+            result.get('link', ''),
+            result.get('title', ''),
+            result.get('snippet', ''),
+            tuple(sitelink['link'] for sitelink in result.get('sitelinks', []) if 'link' in sitelink)
+        )
+
+    def to_dict(self):
+        hit = {'title': self.title, 'link': self.link, 'snippet': self.snippet}
+
+        if self.sitelinks:
+            hit['sitelinks'] = list(self.sitelinks)
+
+        return hit
+
+def search_hits_to_dicts(hits):
+    return [hit.to_dict() for hit in hits]
+
 def search_multiple_page(
-    search_query: str, num_results: int, num_pages: int = 1, log_file_path = 'log.txt'
+    search_query: str, num_results: int, num_pages: int = 1, log_file_path = 'log.txt', adaptive: bool = False, min_yield: float = None, seen_domains: set = None
 ) -> str:
-    credits = 0
-    url = os.getenv('SERPER_API_URL')
-    headers = {
-        "X-API-KEY": os.getenv('SERPER_API_KEY'),
-        "Content-Type": "application/json",
+    usage = {'serper_credits': 0}
+    all_results = list(iter_search_results(search_query, num_results, num_pages, log_file_path, usage, adaptive, min_yield, seen_domains))
+
+    return {
+        'serper_credits': usage['serper_credits'],
+        'all_results': all_results
     }
 
-    all_results = []
+def iter_search_results(search_query, num_results, num_pages=1, log_file_path='log.txt', usage=None, adaptive=False, min_yield=None, seen_domains=None):
+    """
+    Yields a SearchHit per organic result (sitelinks included) page by page as the pages arrive instead of collecting them first.
 
-    for page in range(1, num_pages + 1):
-        payload = json.dumps({"q": search_query, "num": num_results, "page": page})
-        search_results = make_request(url, headers, payload)
-        results = search_results.json()
+    Args:
+        usage (dict): Optional {'serper_credits': int} that is increased by the credits of every page fetched,
+            including pages that were already sent when the caller stopped iterating. Pages not sent yet are cancelled.
+    """
+    if adaptive:
+        pages = iter_search_pages_adaptive(search_query, num_results, num_pages, log_file_path, usage, min_yield, seen_domains)
+    else:
+        pages = iter_search_pages(search_query, num_results, num_pages, log_file_path, usage)
 
-        if 'statusCode' in results:
-            if results['statusCode'] != 200:
-                with open(log_file_path, 'a') as f:
-                    f.write(f"\n(Serper Error) Error processing search query {search_query}: {results['message']}")
+    try:
+        for results in pages:
+            if not ("organic" in results and results["organic"]):
+                break
 
-        if "organic" in results and results["organic"]:
-            all_results.extend(results["organic"])
-            credits += results['credits']
-        else:
-            break
+            for result in results["organic"]:
+                yield SearchHit.from_result(result)
+    finally:
+        pages.close()
 
-    return {
-        'serper_credits': credits,
-        'all_results': all_results
-    }
\ No newline at end of file
+def get_result_domains(hit):
+    domains = set()
+
+    if hit.link:
+        domains.add(extract_domain_name(hit.link))
+
+    for sitelink in hit.sitelinks:
+        domains.add(extract_domain_name(sitelink))
+
+    return domains
+
+def iter_search_pages_adaptive(search_query, num_results, num_pages=1, log_file_path='log.txt', usage=None, min_yield=None, seen_domains=None):
+    # Pages are fetched one at a time and the sweep stops as soon as a page stops turning up
+    # registrable domains that this sweep has not seen yet. The next page is requested before
+    # the current one is handed back, so the caller's processing overlaps with that request.
+    if min_yield is None:
+        min_yield = float(os.getenv('SERPER_ADAPTIVE_MIN_YIELD', 0.05))
+
+    if seen_domains is None:
+        seen_domains = set()
+
+    page_yields = []
+    page = 1
+    future = submit_search_page(search_query, num_results, page, log_file_path)
+
+    try:
+        while future is not None:
+            results = future.result()
+            future = None
+            count_search_credits(usage, results)
+
+            if not ("organic" in results and results["organic"]):
+                yield results
+                break
+
+            page_domains = set()
+            for result in results["organic"]:
+                page_domains.update(get_result_domains(SearchHit.from_result(result)))
+
+            new_domains = page_domains - seen_domains
+            seen_domains.update(new_domains)
+
+            page_yield = len(new_domains) / len(results["organic"])
+            page_yields.append(f"page {page}: {len(results['organic'])} results, {len(new_domains)} new domains, yield {page_yield:.2f}")
+
+            if page < num_pages and page_yield >= min_yield:
+                page += 1
+                future = submit_search_page(search_query, num_results, page, log_file_path)
+
+            yield results
+    finally:
+        if future is not None:
+            settle_search_futures([future], usage)
+
+        with open(log_file_path, 'a') as f:
+            f.write(f"\n(Serper Yield) {search_query} (min yield {min_yield}): {'; '.join(page_yields) if page_yields else 'no results'}")
+
+def search_many(queries, log_file_path='log.txt', on_response=None):
+    """
+    Runs many searches through the Serper batch endpoint, one round trip per page depth.
+
+    Args:
+        queries (list): (search_query, num_results, num_pages) tuples.
+        log_file_path (str): Log file for Serper errors.
+        on_response (callable): Optional on_response(search_query, num_results, page, response), called for every page response.
+
+    Returns:
+        list: One {'serper_credits', 'all_results'} dict of SearchHits per query, in the same order as search_multiple_page returns them.
+    """
+    results = [{'serper_credits': 0, 'all_results': []} for _ in queries]
+    pending = list(range(len(queries)))
+    page = 1
+
+    while pending:
+        page_requests = [(queries[index][0], queries[index][1], page) for index in pending]
+        next_pending = []
+
+        for (search_query, num_results, _), index, response in zip(page_requests, pending, search_batch(page_requests, log_file_path)):
+            if on_response is not None:
+                on_response(search_query, num_results, page, response)
+
+            if "organic" in response and response["organic"]:
+                results[index]['all_results'].extend(SearchHit.from_result(result) for result in response["organic"])
+                results[index]['serper_credits'] += response['credits']
+
+                if page < queries[index][2]:
+                    next_pending.append(index)
+
+        pending = next_pending
+        page += 1
+
+    return results